@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+import weakref
+from datetime import date
+import numpy as np
+from database import db
+from snapshots import get_snapshot, load_tables
+
+# Admin reports computed in NumPy. Every booking (archived ones included),
+# departure and tour is loaded once into column arrays, memory-mapped from
+# the current snapshot when there is one and otherwise read in chunks off
+# the live database, and each report is a few vectorized group-bys over them.
+# A frame is kept per process until a new snapshot is published, or for a
+# short TTL when it came from the live database, so paging through reports
+# costs one load.
+
+CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 60))
+# Lead-time histogram edges, in days between booking and departure
+LEAD_TIME_BINS = (0, 7, 14, 30, 60, 90, 180, 365)
+PERCENTILES = (10, 25, 50, 75, 90)
+# SQLite julianday() of 1970-01-01
+UNIX_EPOCH_JULIAN = 2440587.5
+# The columns a frame is built from (kinds in columnar.TABLES)
+TABLES = {
+    'tour': ('id', 'name'),
+    'tour_date': ('id', 'tour_id', 'departure_date', 'available_seats'),
+    'booking': ('tour_date_id', 'number_of_participants', 'total_price', 'booking_status', 'created_at'),
+}
+
+_lock = threading.Lock()
+# engine -> (snapshot name or None, expires, BookingFrame)
+_frames = weakref.WeakKeyDictionary()
+
+
+def _by_id(columns, names):
+    """
+    The named columns of a table, sorted by its id column
+    """
+    ids = columns['id']
+    order = np.argsort(ids, kind='stable')
+    return [np.asarray(columns[name])[order] for name in names]
+
+
+class BookingFrame:
+    """
+    Column arrays of bookings, departures and tours. Departures are sorted by
+    id and bookings point at them by position (date_index).
+    """
+
+    def __init__(self, tables, snapshot=None):
+        self.source = snapshot.name if snapshot else 'live'
+        self.loaded_at = snapshot.built_at.timestamp() if snapshot else time.time()
+        tour_dates, tours, bookings = tables['tour_date'], tables['tour'], tables['booking']
+        self.date_ids, self.date_tours, self.date_departures, self.date_seats_left = _by_id(
+            tour_dates, ('id', 'tour_id', 'departure_date', 'available_seats')
+        )
+        self.tour_ids, tour_names = _by_id(tours, ('id', 'name'))
+        self.tour_names = tours.decode('name', tour_names)
+
+        tour_date_ids = bookings['tour_date_id']
+        self.participants = bookings['number_of_participants']
+        self.revenue = bookings['total_price']
+        self.cancelled = bookings.equals('booking_status', 'cancelled')
+        self.created = bookings['created_at']
+        self.date_index = np.searchsorted(self.date_ids, tour_date_ids)
+        # Bookings of departures that no longer exist have nothing to report on
+        known = self.date_index < len(self.date_ids)
+        known[known] = self.date_ids[self.date_index[known]] == tour_date_ids[known]
+        if not known.all():
+            self.date_index, self.participants, self.revenue, self.cancelled, self.created = (
+                column[known] for column in (self.date_index, self.participants, self.revenue, self.cancelled, self.created)
+            )
+        self.tours = self.date_tours[self.date_index]
+        self.tour_index = np.searchsorted(self.tour_ids, self.tours)
+        self.departures = self.date_departures[self.date_index]
+
+    def mask(self, departure_from=None, departure_to=None, tour_id=None):
+        """
+        Select the bookings departing in [departure_from, departure_to] of a tour
+        """
+        return self._select(self.departures, self.tours, departure_from, departure_to, tour_id)
+
+    def date_mask(self, departure_from=None, departure_to=None, tour_id=None):
+        return self._select(self.date_departures, self.date_tours, departure_from, departure_to, tour_id)
+
+    @staticmethod
+    def _select(departures, tours, departure_from, departure_to, tour_id):
+        selected = np.ones(len(departures), dtype=bool)
+        if departure_from is not None:
+            selected &= departures >= _julian(departure_from)
+        if departure_to is not None:
+            selected &= departures < _julian(departure_to) + 1
+        if tour_id is not None:
+            selected &= tours == tour_id
+        return selected
+
+
+def _julian(day):
+    return (day - date(1970, 1, 1)).days + UNIX_EPOCH_JULIAN
+
+
+def _to_dates(julian):
+    return ((julian - UNIX_EPOCH_JULIAN) * 86400).astype('datetime64[s]').astype('datetime64[D]')
+
+
+def get_frame(refresh=False, live=False):
+    """
+    This process's BookingFrame: of the current snapshot until another is
+    published or, when live or there is none, of the live database until
+    older than CACHE_TTL
+    """
+    engine = db.engine
+    now = time.monotonic()
+    snapshot = None if live else get_snapshot()
+    source = snapshot.name if snapshot else None
+    cached = _frames.get(engine)
+    if cached and not refresh and cached[0] == source and (snapshot or cached[1] > now):
+        return cached[2]
+    if snapshot:
+        tables = {name: snapshot.table(name) for name in TABLES}
+    else:
+        tables, _ = load_tables(TABLES, live=True)
+    frame = BookingFrame(tables, snapshot)
+    with _lock:
+        _frames[engine] = (source, now + CACHE_TTL, frame)
+    return frame
+
+
+def reset_analytics_cache():
+    with _lock:
+        _frames.clear()
+
+
+def load_factor(frame, **filters):
+    """
+    Booked seats over capacity for every departure. Seats are taken off
+    available_seats as they are booked, so capacity is what is left plus
+    what active bookings hold.
+    """
+    active = ~frame.cancelled
+    booked = np.bincount(frame.date_index[active], weights=frame.participants[active],
+                         minlength=len(frame.date_ids)).astype(np.int64)
+    capacity = booked + frame.date_seats_left
+    factor = np.divide(booked, capacity, out=np.zeros(len(booked)), where=capacity > 0)
+
+    selected = np.flatnonzero(frame.date_mask(**filters))
+    selected = selected[np.argsort(frame.date_departures[selected], kind='stable')]
+    departures = _to_dates(frame.date_departures[selected]).astype(str)
+    tour_positions = np.searchsorted(frame.tour_ids, frame.date_tours[selected])
+    total_capacity = int(capacity[selected].sum())
+    return {
+        'departures': [{
+            'tour_date_id': tour_date_id,
+            'tour_id': tour_id,
+            'tour_name': frame.tour_names[position],
+            'departure_date': departure,
+            'booked_seats': seats,
+            'capacity': cap,
+            'load_factor': round(value, 4)
+        } for tour_date_id, tour_id, position, departure, seats, cap, value in zip(
+            frame.date_ids[selected].tolist(), frame.date_tours[selected].tolist(), tour_positions.tolist(),
+            departures.tolist(), booked[selected].tolist(), capacity[selected].tolist(), factor[selected].tolist()
+        )],
+        'overall_load_factor': round(int(booked[selected].sum()) / total_capacity, 4) if total_capacity else 0.0
+    }
+
+
+def lead_time(frame, **filters):
+    """
+    Distribution of days between booking and departure for active bookings
+    """
+    selected = frame.mask(**filters) & ~frame.cancelled
+    days = frame.departures[selected] - frame.created[selected]
+    edges = np.array(LEAD_TIME_BINS + (np.inf,))
+    counts, _ = np.histogram(np.clip(days, 0, None), bins=edges)
+    return {
+        'bookings': int(selected.sum()),
+        'mean_days': round(float(days.mean()), 2) if len(days) else None,
+        'percentiles': {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(days, PERCENTILES))}
+        if len(days) else {},
+        'histogram': [{
+            'min_days': low,
+            'max_days': None if high == np.inf else int(high),
+            'bookings': count
+        } for low, high, count in zip(LEAD_TIME_BINS, edges[1:], counts.tolist())]
+    }
+
+
+def cancellations(frame, **filters):
+    """
+    Cancellation rate of each tour
+    """
+    selected = frame.mask(**filters)
+    tours = frame.tour_index[selected]
+    bookings = np.bincount(tours, minlength=len(frame.tour_ids))
+    cancelled = np.bincount(tours, weights=frame.cancelled[selected], minlength=len(frame.tour_ids)).astype(np.int64)
+    rate = np.divide(cancelled, bookings, out=np.zeros(len(bookings)), where=bookings > 0)
+    order = np.flatnonzero(bookings)
+    order = order[np.argsort(-rate[order], kind='stable')]
+    total = int(bookings.sum())
+    return {
+        'tours': [{
+            'tour_id': tour_id,
+            'tour_name': frame.tour_names[position],
+            'bookings': count,
+            'cancellations': cancelled_count,
+            'cancellation_rate': round(value, 4)
+        } for position, tour_id, count, cancelled_count, value in zip(
+            order.tolist(), frame.tour_ids[order].tolist(), bookings[order].tolist(),
+            cancelled[order].tolist(), rate[order].tolist()
+        )],
+        'overall_cancellation_rate': round(int(cancelled.sum()) / total, 4) if total else 0.0
+    }
+
+
+def revenue_by_month(frame, by='departure', **filters):
+    """
+    Active bookings' revenue, participants and count per month of departure
+    (or of booking, by='booking')
+    """
+    selected = frame.mask(**filters) & ~frame.cancelled
+    when = frame.departures if by == 'departure' else frame.created
+    # Months as consecutive integers, so grouping is a bincount, not a sort
+    months = _to_dates(when[selected]).astype('datetime64[M]').astype(np.int64)
+    first = months.min() if len(months) else 0
+    index = months - first
+    revenue = np.bincount(index, weights=frame.revenue[selected])
+    participants = np.bincount(index, weights=frame.participants[selected]).astype(np.int64)
+    bookings = np.bincount(index)
+    present = np.flatnonzero(bookings)
+    months = (present + first).astype('datetime64[M]')
+    revenue, participants, bookings = revenue[present], participants[present], bookings[present]
+    return {
+        'by': by,
+        'months': [{
+            'month': month,
+            'bookings': count,
+            'participants': people,
+            'revenue': round(amount, 2)
+        } for month, count, people, amount in zip(
+            months.astype(str).tolist(), bookings.tolist(), participants.tolist(), revenue.tolist()
+        )]
+    }
+
+
+REPORTS = {
+    'load-factor': load_factor,
+    'lead-time': lead_time,
+    'cancellations': cancellations,
+    'revenue': revenue_by_month,
+}
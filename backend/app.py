@@ -1,50 +1,153 @@
-from flask import Flask
-from flask_cors import CORS
-from database import db
-from routes.auth_routes import auth_bp
-from routes.database_routes import database_bp
-from routes.tour_routes import tour_bp
-from routes.booking_routes import booking_bp
-from routes.destination_routes import destination_bp
-from routes.vehicle_routes import vehicle_bp
-from routes.vehicle_booking_routes import vehicle_booking_bp
+import importlib
 import os
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
-
-app = Flask(__name__)
-CORS(app)
-
-# Ensure instance directory exists
-instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
-if not os.path.exists(instance_path):
-    os.makedirs(instance_path)
-
-# Database configuration
-db_path = os.path.join(instance_path, 'auth.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-
-# Initialize extensions
-db.init_app(app)
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(database_bp, url_prefix='/api/database')
-app.register_blueprint(tour_bp, url_prefix='/api/tours')
-app.register_blueprint(booking_bp, url_prefix='/api/bookings')
-app.register_blueprint(destination_bp, url_prefix='/api/destinations')
-app.register_blueprint(vehicle_bp, url_prefix='/api/vehicles')
-app.register_blueprint(vehicle_booking_bp, url_prefix='/api/vehicle-bookings')
-
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+from flask import Flask
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Blueprints and where they are mounted; modules are only imported when the
+# blueprint is actually registered
+BLUEPRINTS = {
+    'auth': ('routes.auth_routes', 'auth_bp', '/api/auth'),
+    'database': ('routes.database_routes', 'database_bp', '/api/database'),
+    'tours': ('routes.tour_routes', 'tour_bp', '/api/tours'),
+    'bookings': ('routes.booking_routes', 'booking_bp', '/api/bookings'),
+    'destinations': ('routes.destination_routes', 'destination_bp', '/api/destinations'),
+    'vehicles': ('routes.vehicle_routes', 'vehicle_bp', '/api/vehicles'),
+    'vehicle_bookings': ('routes.vehicle_booking_routes', 'vehicle_booking_bp', '/api/vehicle-bookings'),
+    'images': ('routes.image_routes', 'image_bp', '/api/images'),
+    'jobs': ('routes.job_routes', 'job_bp', '/api/jobs'),
+    'analytics': ('routes.analytics_routes', 'analytics_bp', '/api/analytics'),
+    'batch': ('routes.batch_routes', 'batch_bp', '/api/batch'),
+    'events': ('routes.event_routes', 'event_bp', '/api/events'),
+}
+
+# For scripts that only need models and a database session: no HTTP routes
+# and no request instrumentation
+CLI_CONFIG = {
+    'API_BLUEPRINTS': (),
+    'CORS_ENABLED': False,
+    'SQL_INSTRUMENTATION': False,
+    'SLOW_QUERY_LOG': False,
+    'METRICS_ENABLED': False,
+    'PROFILING_ENABLED': False,
+    'RATE_LIMITS_ENABLED': False,
+}
+
+
+def _default_config(instance_path):
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.environ.get(
+            'DATABASE_URL', f'sqlite:///{os.path.join(instance_path, "auth.db")}'
+        ),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-here'),
+        # Werkzeug hash spec for new passwords; tests use a cheap one
+        'PASSWORD_HASH_METHOD': 'scrypt',
+        # Serve tour/destination/vehicle listings from the per-process catalog cache
+        'CATALOG_CACHE': True,
+        # Password-reset codes older than this are rejected and purged by archival.py
+        'OTP_TTL_MINUTES': 15,
+        'API_BLUEPRINTS': tuple(BLUEPRINTS),
+        # Threads per process for POST /api/batch requests with "parallel": true
+        'BATCH_WORKERS': int(os.environ.get('BATCH_WORKERS', 4)),
+        # A booking event stream served by Flask holds a worker thread, so it
+        # ends after this long and the client reconnects from its last event,
+        # and each process serves at most EVENTS_WSGI_STREAMS at once (503
+        # beyond that). asgi.py serves streams without either limit.
+        'EVENTS_STREAM_SECONDS': int(os.environ.get('EVENTS_STREAM_SECONDS', 25)),
+        'EVENTS_WSGI_STREAMS': int(os.environ.get('EVENTS_WSGI_STREAMS', 2)),
+        'CORS_ENABLED': True,
+    }
+
+
+def create_app(config=None):
+    """
+    Build a configured app. config is a mapping (or object) applied over the
+    defaults; see CLI_CONFIG for a lightweight app for scripts.
+    """
+    app = Flask(__name__, instance_path=os.path.join(BACKEND_DIR, 'instance'))
+    app.config.from_mapping(_default_config(app.instance_path))
+    if config is not None:
+        if isinstance(config, dict):
+            app.config.from_mapping(config)
+        else:
+            app.config.from_object(config)
+
+    # Ensure instance directory exists when the database lives in it
+    if app.instance_path in app.config['SQLALCHEMY_DATABASE_URI']:
+        os.makedirs(app.instance_path, exist_ok=True)
+
+    from database import db
+    import models  # Registers every table on db.metadata for create_all()
+    import catalog_cache  # Catalog invalidation must see writes from every app, scripts included
+    import vehicle_slots  # Likewise for the vehicle availability index
+    import user_bookings  # ...and for the per-user booking pages
+    import pricing  # ...and for the price book behind quotes
+    db.init_app(app)
+
+    if app.config['CORS_ENABLED']:
+        from flask_cors import CORS
+        CORS(app)
+
+    from images import init_images
+    init_images(app)
+
+    from snapshots import init_snapshots
+    init_snapshots(app)
+
+    # Background jobs; the thread itself is started per worker (start_scheduler)
+    from scheduler import init_scheduler
+    init_scheduler(app)
+
+    # Request instrumentation; each one is skipped entirely when disabled
+    if app.config.get('SQL_INSTRUMENTATION', True):
+        from sql_instrumentation import init_sql_instrumentation
+        init_sql_instrumentation(app)
+    if app.config.get('SLOW_QUERY_LOG', True):
+        from slow_queries import init_slow_query_log
+        init_slow_query_log(app)
+    if app.config.get('METRICS_ENABLED', True):
+        from metrics import init_metrics
+        init_metrics(app)
+    if app.config.get('PROFILING_ENABLED', True):
+        from profiling import init_profiling
+        init_profiling(app)
+
+    # After the instrumentation, so requests turned away are still measured
+    if app.config.get('RATE_LIMITS_ENABLED', True):
+        from rate_limits import init_rate_limits
+        init_rate_limits(app)
+
+    # Register blueprints
+    for name in app.config['API_BLUEPRINTS']:
+        module_name, blueprint_name, url_prefix = BLUEPRINTS[name]
+        blueprint = getattr(importlib.import_module(module_name), blueprint_name)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # `from app import app` still works, but the default app is only built
+    # the first time something asks for it
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 if __name__ == '__main__':
+    app = create_app()
+    from database import db
     with app.app_context():
         db.create_all()
+    from scheduler import start_scheduler
+    # The reloader runs the app in a child process; start the jobs there only
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_scheduler(app)
     app.run(debug=True)
@@ -0,0 +1,141 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, false, func, insert, literal, or_, select, true, union_all
+from database import db
+from models import Booking, BookingArchive, OTPToken, Tour, TourDate, VehicleBooking, VehicleBookingArchive
+
+# Bookings that can no longer change are moved out of the hot tables in small
+# batches, one short transaction each, so the writer lock is never held long
+# and user/admin queries only scan live rows. Readers that need history ask
+# for it explicitly (include_archived) and get both tables.
+
+ARCHIVES = {Booking: BookingArchive, VehicleBooking: VehicleBookingArchive}
+BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+# Cancelled, rejected and expired bookings stay live this long after they were made
+GRACE_DAYS = int(os.environ.get('ARCHIVE_GRACE_DAYS', 30))
+
+
+def union_with_archive(model, include_archived=True, columns=None):
+    """
+    The model's rows (plus its archive's when include_archived) as a subquery
+    with the hot table's columns (or just the named ones) and an 'archived' flag
+    """
+    hot = model.__table__
+    names = list(columns) if columns else [column.name for column in hot.columns]
+    rows = select(*[hot.c[name] for name in names], false().label('archived'))
+    if include_archived:
+        archive = ARCHIVES[model].__table__
+        rows = union_all(rows, select(*[archive.c[name] for name in names], true().label('archived')))
+    return rows.subquery(f'{hot.name}_rows')
+
+
+def query_with_archive(model, include_archived=False, **filters):
+    """
+    Load model rows matching filter_by(**filters), followed by the matching
+    archived rows when include_archived. Archived objects expose the same
+    attributes and relationships as live ones.
+    """
+    rows = model.query.filter_by(**filters).all()
+    if include_archived:
+        rows += ARCHIVES[model].query.filter_by(**filters).all()
+    return rows
+
+
+def is_archived(obj):
+    return isinstance(obj, tuple(ARCHIVES.values()))
+
+
+def _archivable(model, today, cutoff):
+    """
+    Select the ids of rows that can no longer change: trips that have ended,
+    and cancelled/rejected/expired bookings past the grace period. The newest row is
+    always kept so SQLite never reissues an archived id.
+    """
+    newest = select(func.max(model.id)).scalar_subquery()
+    if model is Booking:
+        trip_end = func.julianday(TourDate.departure_date) + Tour.duration_days
+        return (
+            select(Booking.id)
+            .join(TourDate, Booking.tour_date_id == TourDate.id)
+            .join(Tour, Booking.tour_id == Tour.id)
+            .where(
+                or_(trip_end < func.julianday(today),
+                    (Booking.booking_status == 'cancelled') & (Booking.created_at < cutoff)),
+                Booking.id < newest
+            )
+        )
+    return select(VehicleBooking.id).where(
+        or_(func.coalesce(VehicleBooking.to_date, VehicleBooking.from_date) < today,
+            VehicleBooking.status.in_(['cancelled', 'rejected', 'expired']) & (VehicleBooking.created_at < cutoff)),
+        VehicleBooking.id < newest
+    )
+
+
+def _move_batch(model, ids, now):
+    from user_bookings import bump_bookings_version
+
+    hot = model.__table__
+    names = [column.name for column in hot.columns]
+    user_ids = db.session.scalars(select(hot.c.user_id).where(hot.c.id.in_(ids)).distinct()).all()
+    db.session.execute(insert(ARCHIVES[model].__table__).from_select(
+        names + ['archived_at'],
+        select(*[hot.c[name] for name in names], literal(now)).where(hot.c.id.in_(ids))
+    ))
+    # Vehicle slot rows go with their bookings (ON DELETE CASCADE)
+    db.session.execute(delete(hot).where(hot.c.id.in_(ids)))
+    if model is Booking:
+        # Live "my bookings" pages no longer list these
+        bump_bookings_version(*user_ids)
+    db.session.commit()
+
+
+def archive_bookings(batch_size=None, max_batches=None, today=None):
+    """
+    Move every archivable booking and vehicle booking to the archive tables
+    and purge expired password-reset tokens, batch_size rows per transaction.
+    Returns the number of rows handled per table.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    now = datetime.utcnow()
+    today = today or now.date()
+    cutoff = now - timedelta(days=GRACE_DAYS)
+    moved = {}
+    for model in ARCHIVES:
+        moved[model.__tablename__] = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = db.session.scalars(_archivable(model, today, cutoff).limit(batch_size)).all()
+            if not ids:
+                break
+            _move_batch(model, ids, now)
+            moved[model.__tablename__] += len(ids)
+            batches += 1
+    moved[OTPToken.__tablename__] = purge_expired_otps(batch_size, now)
+    return moved
+
+
+def purge_expired_otps(batch_size=None, now=None):
+    """
+    Delete password-reset tokens older than OTP_TTL_MINUTES, in batches
+    """
+    batch_size = batch_size or BATCH_SIZE
+    expired_before = (now or datetime.utcnow()) - timedelta(minutes=current_app.config['OTP_TTL_MINUTES'])
+    purged = 0
+    while True:
+        ids = select(OTPToken.id).where(OTPToken.created_at < expired_before).limit(batch_size)
+        count = db.session.execute(delete(OTPToken).where(OTPToken.id.in_(ids))).rowcount
+        db.session.commit()
+        purged += count
+        if count < batch_size:
+            return purged
+
+
+if __name__ == '__main__':
+    # python archival.py [batch_size]
+    from app import create_app, CLI_CONFIG
+    with create_app(CLI_CONFIG).app_context():
+        batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else None
+        for table, count in archive_bookings(batch_size).items():
+            print(f'{table}: {count}')
@@ -0,0 +1,453 @@
+"""
+Optional async serving mode.
+
+    uvicorn asgi:application --workers 4
+
+The catalog reads and the forgot-password flow run as coroutines on the
+event loop, using an async SQLAlchemy engine (sqlite+aiosqlite) when
+aiosqlite is installed and a thread pool over the regular engine otherwise.
+The booking event stream is served on the loop too, so an idle stream is a
+suspended coroutine rather than a busy thread.
+Every other request is handed to the unchanged Flask app in a thread, so the
+API behaves exactly as under gunicorn. Async routes skip the Flask request
+hooks (metrics, Server-Timing, profiling) except the rate limits, which are
+applied to them here.
+"""
+import asyncio
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from sqlalchemy import func, insert, select
+from app import create_app
+from booking_events import (
+    HEARTBEAT_SECONDS, PAGE_SIZE, RETRY_MS, events_after, format_event, get_hub, open_stream
+)
+import rate_limits
+from database import db
+from images import get_variant_map, listing_images
+from models import Destination, OTPToken, Tour, TourDate, User
+from pricing import listed_prices
+from scheduler import start_scheduler, stop_scheduler
+
+try:
+    import aiosqlite  # noqa: F401  (driver for sqlite+aiosqlite)
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    create_async_engine = None
+
+
+class AsyncDatabase:
+    """
+    Runs a function taking a SQLAlchemy Connection without blocking the
+    event loop: natively on an aiosqlite engine when available, otherwise on
+    the sync engine in a worker thread. Each call is one transaction.
+    """
+
+    def __init__(self, sync_engine, executor):
+        self.sync_engine = sync_engine
+        self.executor = executor
+        self.engine = None
+        if create_async_engine is not None and sync_engine.dialect.name == 'sqlite':
+            self.engine = create_async_engine(sync_engine.url.set(drivername='sqlite+aiosqlite'))
+
+    async def run(self, fn, *args):
+        if self.engine is not None:
+            async with self.engine.begin() as conn:
+                return await conn.run_sync(fn, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._run_sync, fn, args)
+
+    def _run_sync(self, fn, args):
+        with self.sync_engine.begin() as conn:
+            return fn(conn, *args)
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+# Queries behind the async routes. Each builds the same payload as the
+# matching Flask view, with one query per table instead of lazy loads.
+
+def _list_destinations(conn, filters=()):
+    rows = conn.execute(
+        select(
+            Destination.id, Destination.name, Destination.description, Destination.image_url,
+            Destination.country, Destination.state, Destination.city,
+            func.count(Tour.id).label('tour_count')
+        )
+        .outerjoin(Tour, Tour.destination_id == Destination.id)
+        .where(*filters)
+        .group_by(Destination.id)
+        .order_by(Destination.id)
+    ).mappings()
+    variants = get_variant_map(conn)
+    return [dict(row, **listing_images(row['image_url'], variants)) for row in rows]
+
+
+def _list_tours(conn):
+    dates = {}
+    for date in conn.execute(
+        select(TourDate.id, TourDate.tour_id, TourDate.departure_date, TourDate.available_seats)
+        .where(TourDate.available_seats > 0)
+        .order_by(TourDate.id)
+    ):
+        dates.setdefault(date.tour_id, []).append(date)
+
+    tours = conn.execute(
+        select(Tour.id, Tour.name, Tour.description, Tour.duration_days, Tour.price, Tour.image_url,
+               Destination.id.label('destination_id'), Destination.name.label('destination_name'),
+               Destination.country)
+        .join(Destination, Tour.destination_id == Destination.id)
+        .order_by(Tour.id)
+    )
+    variants = get_variant_map(conn)
+    return [{
+        'id': tour.id,
+        'name': tour.name,
+        'description': tour.description,
+        'destination': {
+            'id': tour.destination_id,
+            'name': tour.destination_name,
+            'country': tour.country
+        },
+        'duration_days': tour.duration_days,
+        'price': tour.price,
+        'image_url': tour.image_url,
+        **listing_images(tour.image_url, variants),
+        'available_dates': [{
+            'id': date.id,
+            'departure_date': date.departure_date.isoformat(),
+            'available_seats': date.available_seats
+        } for date in dates.get(tour.id, [])]
+    } for tour in tours]
+
+
+def _create_reset_token(conn, email):
+    user_email = conn.execute(select(User.email).where(User.email == email)).scalar()
+    if user_email is None:
+        return False
+    otp = ''.join([str(random.randint(0, 9)) for _ in range(6)])
+    conn.execute(insert(OTPToken).values(email=user_email, token=otp))
+    return True
+
+
+async def get_tours(app, request):
+    tours = await app.db.run(_list_tours)
+    # Priced like the Flask catalog, from this process's price book
+
+    def price_in_context():
+        with app.flask_app.app_context():
+            return listed_prices(date['id'] for tour in tours for date in tour['available_dates'])
+
+    prices = await asyncio.get_running_loop().run_in_executor(app.executor, price_in_context)
+    for tour in tours:
+        for date in tour['available_dates']:
+            date['price'] = prices[date['id']]
+    return 200, {'status': 'success', 'tours': tours}
+
+
+async def get_destinations(app, request):
+    return 200, {'status': 'success', 'destinations': await app.db.run(_list_destinations)}
+
+
+async def search_destinations(app, request):
+    query = request.args.get('q', '').lower()
+    country = request.args.get('country')
+    filters = []
+    if query:
+        filters.append(
+            (func.lower(Destination.name).contains(query)) |
+            (func.lower(Destination.description).contains(query)) |
+            (func.lower(Destination.city).contains(query))
+        )
+    if country:
+        filters.append(Destination.country == country)
+    return 200, {'status': 'success', 'destinations': await app.db.run(_list_destinations, filters)}
+
+
+async def forgot_password(app, request):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        # Let Flask produce its own error for malformed bodies
+        return None
+    if 'email' not in data:
+        return 400, {'message': 'Email is required'}
+    if not await app.db.run(_create_reset_token, data['email']):
+        return 404, {'message': 'Email not found'}
+    return 200, {'message': 'Password reset instructions sent to email'}
+
+
+ASYNC_ROUTES = {
+    ('GET', '/api/tours'): get_tours,
+    ('GET', '/api/destinations'): get_destinations,
+    ('GET', '/api/destinations/search'): search_destinations,
+    ('POST', '/api/auth/forgot-password'): forgot_password,
+}
+
+
+async def stream_booking_events(app, scope, receive, send):
+    # Same stream as the Flask view (routes/event_routes.py), without its
+    # time limit: waiting here holds no thread
+    loop = asyncio.get_running_loop()
+    environ = _build_environ(scope, b'')
+    flask_app = app.flask_app
+
+    def open_in_context():
+        with flask_app.request_context(environ):
+            return open_stream()
+
+    def catch_up(cursor):
+        with flask_app.app_context():
+            return events_after(cursor)
+
+    opened = await loop.run_in_executor(app.executor, open_in_context)
+    request = flask_app.request_class(environ, populate_request=False)
+    if not callable(opened[1]):
+        await app._send_json(send, request, *opened)
+        return
+    cursor, visible = opened
+    hub = get_hub(flask_app)
+    headers = [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+               (b'x-accel-buffering', b'no')] + app._cors_headers(request)
+    disconnected = asyncio.ensure_future(receive())
+    hub.subscribe()
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode(), 'more_body': True})
+        while True:
+            buffered = hub.buffered_after(cursor)
+            if buffered is None:
+                events = await loop.run_in_executor(app.executor, catch_up, cursor)
+                next_cursor = events[-1]['id'] if events else cursor
+            else:
+                events, next_cursor = buffered
+            cursor = next_cursor
+            chunk = ''.join(format_event(e) for e in events if visible(e))
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            if buffered is None and len(events) == PAGE_SIZE:
+                continue
+            waiting = asyncio.ensure_future(hub.wait_async(cursor, HEARTBEAT_SECONDS))
+            await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                waiting.cancel()
+                return
+            if not waiting.result():
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    finally:
+        hub.unsubscribe()
+        disconnected.cancel()
+
+
+# Routes that write their own (streamed) response
+STREAM_ROUTES = {
+    ('GET', '/api/events/stream'): stream_booking_events,
+}
+
+
+class AsyncApp:
+    """
+    ASGI application: serves ASYNC_ROUTES on the event loop and bridges all
+    other HTTP requests to the Flask (WSGI) app on a bounded thread pool
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(
+            flask_app.config['ASYNC_WSGI_THREADS'], thread_name_prefix='wsgi'
+        )
+        with flask_app.app_context():
+            self.db = AsyncDatabase(db.engine, self.executor)
+        self.routes = dict(ASYNC_ROUTES) if flask_app.config['ASYNC_ROUTES_ENABLED'] else {}
+        self.stream_routes = dict(STREAM_ROUTES) if flask_app.config['ASYNC_ROUTES_ENABLED'] else {}
+        # Async routes whose Flask endpoint is in a rate-limited route class
+        adapter = flask_app.url_map.bind('localhost')
+        self.rate_limited = {
+            (method, path) for method, path in self.routes
+            if rate_limits.get_store(flask_app) is not None and
+            adapter.match(path, method)[0] in flask_app.config['RATE_LIMIT_ROUTES']
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]!r}')
+
+        body = await _read_body(receive)
+        route = (scope['method'], scope['path'].rstrip('/'))
+        if route in self.stream_routes:
+            await self.stream_routes[route](self, scope, receive, send)
+            return
+        handler = self.routes.get(route)
+        if handler is None:
+            await self._call_wsgi(_build_environ(scope, body), send)
+            return
+        request = self.flask_app.request_class(_build_environ(scope, body), populate_request=False)
+        held = None
+        if route in self.rate_limited:
+            rejection, held = await self._admit(_build_environ(scope, body))
+            if rejection is not None:
+                await self._send_json(send, request, *rejection)
+                return
+        try:
+            try:
+                result = await handler(self, request)
+            except Exception as e:
+                result = 500, {'status': 'error', 'message': str(e)}
+            if result is not None:
+                await self._send_json(send, request, *result)
+                return
+            environ = _build_environ(scope, body)
+            if route in self.rate_limited:
+                environ[rate_limits.ADMITTED] = True
+            await self._call_wsgi(environ, send)
+        finally:
+            if held is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, rate_limits.release, held, self.flask_app
+                )
+
+    async def _admit(self, environ):
+        """
+        Apply the rate limits to an async route, as the Flask before_request
+        hook would. Returns (status, payload, headers) to send instead, or
+        None, and the route class whose concurrency slot the request holds.
+        """
+        def admit_in_context():
+            with self.flask_app.request_context(environ):
+                rejection, held = rate_limits.admit()
+                if rejection is None:
+                    return None, held
+                return (rejection.status_code, rejection.get_json(),
+                        [(b'retry-after', rejection.headers['Retry-After'].encode())]), held
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, admit_in_context)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_scheduler(self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                stop_scheduler(timeout=5)
+                await self.db.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send_json(self, send, request, status, payload, extra_headers=()):
+        # Same serialization (and CORS headers) as jsonify in the Flask views
+        provider = self.flask_app.json
+        indent = (provider.compact is None and self.flask_app.debug) or provider.compact is False
+        dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+        body = f'{provider.dumps(payload, **dump_args)}\n'.encode()
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        headers += list(extra_headers) + self._cors_headers(request)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _cors_headers(self, request):
+        if not self.flask_app.config['CORS_ENABLED']:
+            return []
+        origin = request.headers.get('Origin')
+        if origin:
+            return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+        return [(b'access-control-allow-origin', b'*')]
+
+    async def _call_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+        result = await loop.run_in_executor(self.executor, self.flask_app.wsgi_app, environ, start_response)
+        chunks = iter(result)
+        try:
+            # Pull the body chunk by chunk so streamed responses are not buffered
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _build_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def create_asgi_app(config=None):
+    """
+    Build the ASGI app around a Flask app created from config. ASYNC_ROUTES_ENABLED
+    = False serves everything through Flask (useful for comparisons).
+    """
+    flask_app = create_app(config)
+    flask_app.config.setdefault('ASYNC_ROUTES_ENABLED', True)
+    flask_app.config.setdefault('ASYNC_WSGI_THREADS', int(os.environ.get('ASYNC_WSGI_THREADS', 32)))
+    return AsyncApp(flask_app)
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # uvicorn asgi:application builds the default app on first access
+    global _default_app
+    if name == 'application':
+        if _default_app is None:
+            _default_app = create_asgi_app()
+        return _default_app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
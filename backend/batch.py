@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, request
+from werkzeug.test import EnvironBuilder
+from database import db
+from routes.auth_routes import AUTHENTICATED_USER, load_token_user
+
+# Several API calls in one HTTP request (POST /api/batch). Each sub-request
+# goes through the app's full dispatch (before/after-request hooks, error
+# handlers) in its own app and request context, exactly as if it had been
+# sent on its own, except that the bearer token is verified once for the
+# whole batch; each sub-request still loads the user fresh, so it sees what
+# earlier ones changed. Batches of GETs may run on a small
+# per-process thread pool.
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+READ_METHODS = ('GET',)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def validate(requests):
+    """
+    Error message for a malformed list of sub-requests, or None
+    """
+    if not isinstance(requests, list) or not requests:
+        return 'requests must be a non-empty list'
+    if len(requests) > MAX_REQUESTS:
+        return f'At most {MAX_REQUESTS} requests per batch'
+    for i, sub_request in enumerate(requests):
+        if not isinstance(sub_request, dict) or not isinstance(sub_request.get('path'), str):
+            return f'requests[{i}] must be an object with a path'
+        if sub_request.get('method', 'GET').upper() not in METHODS:
+            return f'requests[{i}].method must be one of {", ".join(METHODS)}'
+        path = sub_request['path']
+        if not path.startswith('/api/') or path.split('?')[0].rstrip('/') == request.path.rstrip('/'):
+            return f'requests[{i}].path must be an API path other than the batch endpoint'
+    return None
+
+
+def _authenticated_user():
+    """
+    (token, user id) for the batch's bearer token, or None when there is no
+    valid one (sub-requests then fail authentication on their own)
+    """
+    header = request.headers.get('Authorization', '')
+    token = header.split(' ')[1] if len(header.split(' ')) == 2 else None
+    if not token:
+        return None
+    try:
+        user = load_token_user(token)
+    except Exception:
+        return None
+    return (token, user.id) if user else None
+
+
+def _dispatch(app, sub_request, headers, base_url, environ_base):
+    """
+    Run one sub-request through the app; returns its id, status and body
+    """
+    builder = EnvironBuilder(
+        path=sub_request['path'],
+        base_url=base_url,
+        method=sub_request.get('method', 'GET').upper(),
+        headers=headers,
+        json=sub_request.get('body'),
+        environ_base=environ_base
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    # A fresh app context each, so per-request state on g and the database
+    # session are not shared with the batch or with other sub-requests
+    with app.app_context(), app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            logger.exception('Batch sub-request %s %s failed', environ['REQUEST_METHOD'], sub_request['path'])
+            return {'id': sub_request.get('id'), 'status': 500, 'body': {'status': 'error', 'message': str(e)}}
+        return {
+            'id': sub_request.get('id'),
+            'status': response.status_code,
+            # Only JSON bodies are returned; files and streams are not batched
+            'body': response.get_json() if response.is_json else None
+        }
+
+
+def run_batch(requests, parallel=False):
+    """
+    Dispatch the sub-requests in order (concurrently when parallel and all
+    are reads) and return their responses in the same order
+    """
+    app = current_app._get_current_object()
+    # X-Forwarded-For too, so a sub-request is rate limited as the batch's
+    # client rather than as the proxy in front of it
+    headers = {name: value for name, value in request.headers
+               if name in ('Authorization', 'Accept-Language', 'X-Forwarded-For')}
+    authenticated = _authenticated_user()
+    # Sub-requests use sessions of their own; the batch's must not hold a
+    # transaction open around theirs. Under test it would be a savepoint
+    # enclosing theirs, and rolling it back would undo their commits.
+    db.session.close()
+    environ_base = {
+        'REMOTE_ADDR': request.remote_addr,
+        **({AUTHENTICATED_USER: authenticated} if authenticated else {})
+    }
+    args = (headers, request.host_url, environ_base)
+
+    workers = app.config['BATCH_WORKERS']
+    if not (parallel and workers > 1 and len(requests) > 1 and
+            all(sub_request.get('method', 'GET').upper() in READ_METHODS for sub_request in requests)):
+        return [_dispatch(app, sub_request, *args) for sub_request in requests]
+    global _executor
+    with _executor_lock:
+        # Created lazily so no thread exists before gunicorn forks
+        if _executor is None:
+            _executor = ThreadPoolExecutor(workers, thread_name_prefix='batch')
+    return list(_executor.map(lambda sub_request: _dispatch(app, sub_request, *args), requests))
@@ -0,0 +1,64 @@
+"""
+Analytics benchmark: times the chunked extraction of bookings into NumPy
+arrays from the live database, building a columnar snapshot, loading the
+same arrays from it, and each admin report over them. The database is
+generated with benchmarks.datagen (sized so it holds --bookings bookings)
+unless it exists; the snapshot goes to a temporary directory.
+
+    python -m benchmarks.analytics --bookings 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the NumPy booking reports')
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench_analytics.db'))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    database = os.path.abspath(args.database)
+    if not os.path.exists(database):
+        datagen.main(['--rows', str(int(args.bookings / datagen.PROPORTIONS['booking'])), '--database', database])
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, CLI_CONFIG
+    from analytics import REPORTS, get_frame
+    from snapshots import build_snapshot
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        app = create_app(dict(CLI_CONFIG, SQLALCHEMY_DATABASE_URI=f'sqlite:///{database}', SNAPSHOT_DIR=snapshot_dir))
+        with app.app_context():
+            started = time.perf_counter()
+            frame = get_frame(refresh=True, live=True)
+            print(f'live extract   {(time.perf_counter() - started) * 1000:8.1f} ms  '
+                  f'({len(frame.date_index):,} bookings, {len(frame.date_ids):,} departures)')
+            started = time.perf_counter()
+            manifest = build_snapshot()
+            print(f'snapshot build {(time.perf_counter() - started) * 1000:8.1f} ms  '
+                  f'({sum(info["rows"] for info in manifest["tables"].values()):,} rows)')
+            started = time.perf_counter()
+            frame = get_frame(refresh=True)
+            print(f'snapshot load  {(time.perf_counter() - started) * 1000:8.1f} ms')
+            for name, report in REPORTS.items():
+                print(f'{name:<14} {_timed(lambda: report(frame), args.runs):8.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+High-concurrency benchmark: holds hundreds of keep-alive connections open
+against a server and reports requests/sec and latency. Compares the async
+serving mode (uvicorn + asgi.py) with the gunicorn sync workers.
+
+    python -m benchmarks.datagen --rows 100000
+    python -m benchmarks.concurrency --server asgi --connections 500
+    python -m benchmarks.concurrency --server wsgi --connections 500
+    python -m benchmarks.concurrency --url http://127.0.0.1:5000 --connections 500
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.loadtest import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = ('/api/tours', '/api/destinations', '/api/destinations/search?q=a')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, workers, database):
+    """
+    Launch uvicorn (asgi) or gunicorn (wsgi) on a free port and wait until it
+    accepts connections. Returns (process, base_url).
+    """
+    port = _free_port()
+    if kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                   '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+                   '--backlog', '4096']
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                   '--backlog', '4096', '--log-level', 'warning', 'app:create_app()']
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.abspath(database)}')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f'{kind} server exited with status {process.returncode}')
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start within 30s')
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split(b' ', 2)[1])
+    length, chunked, keep_alive = 0, False, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection' and value == 'close':
+            keep_alive = False
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _connection(host, port, paths, index, stop_at, measure_from, samples, errors):
+    reader = writer = None
+    request_number = index
+    while time.monotonic() < stop_at:
+        path = paths[request_number % len(paths)]
+        request_number += 1
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            if started >= measure_from:
+                errors.append(path)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+            continue
+        if started >= measure_from:
+            samples.append((path, status, time.monotonic() - started))
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, connections, duration, warmup, paths):
+    parts = urlsplit(url)
+    samples, errors = [], []
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+    await asyncio.gather(*(
+        _connection(parts.hostname, parts.port or 80, paths, index, stop_at, measure_from, samples, errors)
+        for index in range(connections)
+    ))
+    return samples, errors
+
+
+def report(samples, errors, duration):
+    latencies = sorted(latency for _, _, latency in samples)
+    failed = sum(1 for _, status, _ in samples if status >= 400)
+    if not latencies:
+        print(f'no completed requests ({len(errors)} connection errors)')
+        return
+    print(f'requests/sec {len(samples) / duration:10.1f}')
+    print(f'completed    {len(samples):10d}   http errors {failed}   connection errors {len(errors)}')
+    print(f'latency ms   p50 {percentile(latencies, 50) * 1000:.1f}   p95 {percentile(latencies, 95) * 1000:.1f}'
+          f'   p99 {percentile(latencies, 99) * 1000:.1f}   max {latencies[-1] * 1000:.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the API under many concurrent connections')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--server', choices=('asgi', 'wsgi'), help='start a local server of this kind')
+    target.add_argument('--url', help='benchmark an already running server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench.db'))
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--path', action='append', dest='paths', help='request path (repeatable)')
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if args.server:
+        process, url = start_server(args.server, args.workers, args.database)
+    try:
+        samples, errors = asyncio.run(
+            run(url, args.connections, args.duration, args.warmup, args.paths or DEFAULT_PATHS)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    label = f'{args.server} ({args.workers} workers)' if args.server else url
+    print(f'{label}: {args.connections} connections, {args.duration:.0f}s measured after {args.warmup:.0f}s warmup')
+    report(samples, errors, args.duration)
+
+
+if __name__ == '__main__':
+    main()
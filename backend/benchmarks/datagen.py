@@ -0,0 +1,266 @@
+"""
+Synthetic dataset generator for load tests and benchmarks.
+
+Builds a fresh SQLite database with users, destinations, tours, departure
+dates, bookings, reviews, vehicles and vehicle bookings, using chunked bulk
+inserts so that scales from 10k to 10M rows finish in reasonable time.
+
+    python -m benchmarks.datagen --rows 100000 --database instance/bench.db
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, time as time_of_day, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 10000
+BENCH_PASSWORD = 'bench123'
+
+# Share of the requested total row count given to each table
+PROPORTIONS = {
+    'user': 0.08,
+    'destination': 0.0005,
+    'tour': 0.002,
+    'booking': 0.6,
+    'review': 0.08,
+    'vehicle_booking': 0.2
+}
+DATES_PER_TOUR = 12
+VEHICLE_BOOKINGS_PER_VEHICLE = 150
+
+COUNTRIES = ['India', 'Nepal', 'Sri Lanka', 'Bhutan', 'Maldives', 'Thailand']
+WORDS = ['Palace', 'Backwaters', 'Hills', 'Fort', 'Temple', 'Beach', 'Valley', 'Lake', 'Heritage', 'Safari']
+VEHICLE_TYPES = ['car', 'suv', 'van', 'bus']
+
+
+def plan(rows):
+    """
+    Split a total row count into per-table counts
+    """
+    counts = {table: max(int(rows * share), 3) for table, share in PROPORTIONS.items()}
+    counts['tour_date'] = counts['tour'] * DATES_PER_TOUR
+    counts['vehicle'] = max(-(-counts['vehicle_booking'] // VEHICLE_BOOKINGS_PER_VEHICLE), 3)
+    return counts
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(conn, table, rows, total):
+    started = time.perf_counter()
+    inserted = 0
+    for chunk in _chunks(rows):
+        conn.execute(table.insert(), chunk)
+        inserted += len(chunk)
+    elapsed = time.perf_counter() - started
+    print(f'  {table.name:<16} {inserted:>10,} rows  {elapsed:6.2f}s  ({inserted / max(elapsed, 1e-9):,.0f} rows/s)')
+    return inserted
+
+
+def generate(rows, seed=42, now=None):
+    """
+    Populate the current app's database. Must run inside an app context on an
+    empty schema. Returns the per-table row counts.
+    """
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import text
+    from database import db
+    from models import User, Destination, Tour, TourDate, Booking, Review, Vehicle, VehicleBooking
+    from booking_summaries import rebuild_summaries
+    from vehicle_slots import rebuild_slots
+
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    counts = plan(rows)
+    # Hashing is deliberately slow, so every synthetic user shares one hash
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    with db.engine.begin() as conn:
+        conn.execute(text('PRAGMA synchronous=OFF'))
+
+        _insert(conn, User.__table__, ({
+            'id': i,
+            'name': f'Bench User {i}',
+            'email': f'user{i}@bench.test',
+            'password_hash': password_hash,
+            'created_at': now - timedelta(days=rng.randint(0, 1000)),
+            'is_admin': i == 1
+        } for i in range(1, counts['user'] + 1)), counts['user'])
+
+        _insert(conn, Destination.__table__, ({
+            'id': i,
+            'name': f'{rng.choice(WORDS)} {i}',
+            'description': f'Synthetic destination {i} with {rng.choice(WORDS).lower()} views',
+            'country': rng.choice(COUNTRIES),
+            'state': f'State {i % 50}',
+            'city': f'City {i}',
+            'image_url': f'https://example.com/destinations/{i}.jpg',
+            'created_at': now
+        } for i in range(1, counts['destination'] + 1)), counts['destination'])
+
+        tour_prices = {i: round(rng.uniform(99, 999), 2) for i in range(1, counts['tour'] + 1)}
+        _insert(conn, Tour.__table__, ({
+            'id': i,
+            'name': f'{rng.choice(WORDS)} Tour {i}',
+            'description': f'Synthetic tour {i}',
+            'destination_id': rng.randint(1, counts['destination']),
+            'duration_days': rng.randint(1, 10),
+            'price': price,
+            'image_url': f'https://example.com/tours/{i}.jpg',
+            'included_services': json.dumps(['Hotel', 'Guide']),
+            'itinerary': json.dumps(['Day 1: Arrival']),
+            'max_participants': 40,
+            'created_at': now
+        } for i, price in tour_prices.items()), counts['tour'])
+
+        # Departures spread from a year ago to a year ahead
+        tour_dates = []
+        for i in range(counts['tour_date']):
+            tour_dates.append((
+                i + 1,
+                i // DATES_PER_TOUR + 1,
+                now + timedelta(days=rng.randint(-365, 365)),
+                rng.choice((1.0, 1.0, 1.2, 0.9))
+            ))
+
+        _insert(conn, TourDate.__table__, ({
+            'id': date_id,
+            'tour_id': tour_id,
+            'departure_date': departure,
+            # Remaining seats; those held by the generated bookings are already taken
+            'available_seats': rng.randint(0, 20),
+            'price_modifier': modifier,
+            'created_at': now - timedelta(days=400)
+        } for date_id, tour_id, departure, modifier in tour_dates), counts['tour_date'])
+
+        def bookings():
+            for i in range(1, counts['booking'] + 1):
+                date_id, tour_id, departure, modifier = tour_dates[rng.randrange(len(tour_dates))]
+                participants = rng.randint(1, 5)
+                roll = rng.random()
+                status, payment = ('confirmed', 'paid') if roll < 0.7 else \
+                    ('pending', 'pending') if roll < 0.85 else ('cancelled', 'refunded')
+                yield {
+                    'id': i,
+                    'user_id': rng.randint(1, counts['user']),
+                    'tour_id': tour_id,
+                    'tour_date_id': date_id,
+                    'number_of_participants': participants,
+                    'total_price': round(tour_prices[tour_id] * modifier * participants, 2),
+                    'booking_status': status,
+                    'payment_status': payment,
+                    'created_at': departure - timedelta(days=rng.randint(1, 180), minutes=rng.randint(0, 1440)),
+                    'special_requests': ''
+                }
+        _insert(conn, Booking.__table__, bookings(), counts['booking'])
+
+        _insert(conn, Review.__table__, ({
+            'id': i,
+            'user_id': rng.randint(1, counts['user']),
+            'tour_id': rng.randint(1, counts['tour']),
+            'rating': rng.randint(1, 5),
+            'comment': 'Synthetic review',
+            'created_at': now - timedelta(days=rng.randint(0, 365))
+        } for i in range(1, counts['review'] + 1)), counts['review'])
+
+        _insert(conn, Vehicle.__table__, ({
+            'id': i,
+            'name': f'Vehicle {i}',
+            'type': rng.choice(VEHICLE_TYPES),
+            'description': 'Synthetic vehicle',
+            'created_at': now - timedelta(days=800)
+        } for i in range(1, counts['vehicle'] + 1)), counts['vehicle'])
+
+        def vehicle_bookings():
+            # Walk each vehicle's calendar so approved bookings never overlap
+            per_vehicle = -(-counts['vehicle_booking'] // counts['vehicle'])
+            booking_id = 0
+            for vehicle_id in range(1, counts['vehicle'] + 1):
+                cursor = (now - timedelta(days=per_vehicle * 3)).date()
+                for _ in range(per_vehicle):
+                    booking_id += 1
+                    if booking_id > counts['vehicle_booking']:
+                        return
+                    from_date = cursor + timedelta(days=rng.randint(0, 3))
+                    to_date = from_date + timedelta(days=rng.randint(0, 4))
+                    roll = rng.random()
+                    status = 'approved' if roll < 0.5 else 'pending' if roll < 0.7 else \
+                        'rejected' if roll < 0.9 else 'cancelled'
+                    if status == 'approved':
+                        cursor = to_date + timedelta(days=1)
+                    # Single-day trips have a start and end time, as the
+                    # request form sends; longer ones take whole days
+                    start_time = end_time = None
+                    if to_date == from_date:
+                        start_hour = rng.randint(6, 20)
+                        start_time = time_of_day(start_hour)
+                        end_time = time_of_day(min(start_hour + rng.randint(1, 3), 23))
+                    yield {
+                        'id': booking_id,
+                        'user_id': rng.randint(1, counts['user']),
+                        'vehicle_id': vehicle_id,
+                        'from_date': from_date,
+                        'to_date': to_date,
+                        'time': start_time.strftime('%H:%M') if start_time else None,
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'status': status,
+                        'from_place': f'City {rng.randint(1, 100)}',
+                        'to_place': f'City {rng.randint(1, 100)}',
+                        'travel_details': '',
+                        'created_at': datetime.combine(from_date, datetime.min.time()) - timedelta(days=rng.randint(1, 60))
+                    }
+        _insert(conn, VehicleBooking.__table__, vehicle_bookings(), counts['vehicle_booking'])
+
+    started = time.perf_counter()
+    rebuild_summaries()
+    print(f'  {"summaries":<16} rebuilt in {time.perf_counter() - started:.2f}s')
+    # The Core inserts above bypass the flush hook that maintains the
+    # vehicle availability index
+    started = time.perf_counter()
+    rebuild_slots()
+    print(f'  {"vehicle_slot":<16} rebuilt in {time.perf_counter() - started:.2f}s')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic benchmark database')
+    parser.add_argument('--rows', type=int, default=10000, help='approximate total row count (10k-10M)')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench.db'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help='overwrite an existing database file')
+    args = parser.parse_args(argv)
+
+    database = os.path.abspath(args.database)
+    if os.path.exists(database):
+        if not args.force:
+            parser.error(f'{database} already exists, pass --force to overwrite it')
+        os.remove(database)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, CLI_CONFIG
+    from database import db
+    app = create_app(dict(CLI_CONFIG, SQLALCHEMY_DATABASE_URI=f'sqlite:///{database}'))
+
+    print(f'Generating ~{args.rows:,} rows into {database}')
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        counts = generate(args.rows, seed=args.seed)
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    print(f'Done: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
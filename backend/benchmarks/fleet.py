@@ -0,0 +1,45 @@
+"""
+Fleet utilization benchmark: times the interval-sweep report over the whole
+fleet for a date range, on a database built by benchmarks.datagen.
+
+    python -m benchmarks.datagen --rows 1000000
+    python -m benchmarks.fleet --days 365
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the fleet utilization report')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench.db'))
+    parser.add_argument('--days', type=int, default=365, help='length of the range, ending today')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, CLI_CONFIG
+    from fleet_utilization import fleet_utilization
+    app = create_app(dict(CLI_CONFIG, SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.abspath(args.database)}'))
+
+    last_day = date.today()
+    first_day = last_day - timedelta(days=args.days - 1)
+    samples = []
+    with app.app_context():
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            report = fleet_utilization(first_day, last_day)
+            samples.append((time.perf_counter() - started) * 1000)
+    fleet = report['fleet']
+    print(f'{fleet["vehicles"]:,} vehicles, {fleet["booked_days"]:,} booked days over {args.days} days: '
+          f'median {statistics.median(samples):.1f} ms (min {min(samples):.1f} ms)')
+    print(f'utilization {fleet["utilization"]:.1%}, peak {fleet["peak_concurrent"]} vehicles on {fleet["peak_date"]}')
+
+
+if __name__ == '__main__':
+    main()
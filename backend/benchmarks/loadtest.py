@@ -0,0 +1,287 @@
+"""
+Concurrent load test for the API blueprints.
+
+Drives a weighted mix of catalog reads, per-user reads, bookings and admin
+endpoints from many client threads, then reports throughput and
+p50/p95/p99 latency per endpoint. Runs in-process against the real Flask app
+(default) or over HTTP against a running server (--url).
+
+    python -m benchmarks.datagen --rows 100000
+    python -m benchmarks.loadtest --clients 16 --duration 30 --save before
+    python -m benchmarks.loadtest --clients 16 --duration 30 --compare before
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+class Scenario:
+    def __init__(self, name, weight, method, path, auth=None, body=None):
+        self.name = name
+        self.weight = weight
+        self.method = method
+        self.path = path
+        self.auth = auth
+        self.body = body
+
+
+def _future_date(rng):
+    return (datetime.utcnow() + timedelta(days=rng.randint(400, 2000))).strftime('%Y-%m-%d')
+
+
+SCENARIOS = [
+    Scenario('GET /api/tours', 10, 'GET', lambda rng, ids: '/api/tours'),
+    Scenario('GET /api/tours/<id>', 15, 'GET', lambda rng, ids: f'/api/tours/{rng.randint(1, ids["tour"])}'),
+    Scenario('GET /api/destinations', 5, 'GET', lambda rng, ids: '/api/destinations'),
+    Scenario('GET /api/destinations/<id>', 5, 'GET',
+             lambda rng, ids: f'/api/destinations/{rng.randint(1, ids["destination"])}'),
+    Scenario('GET /api/destinations/search', 5, 'GET',
+             lambda rng, ids: f'/api/destinations/search?q={rng.choice(["palace", "beach", "fort", "lake"])}'),
+    Scenario('GET /api/vehicles', 5, 'GET', lambda rng, ids: '/api/vehicles'),
+    Scenario('GET /api/bookings', 15, 'GET', lambda rng, ids: '/api/bookings', auth='user'),
+    Scenario('GET /api/vehicle-bookings', 10, 'GET', lambda rng, ids: '/api/vehicle-bookings', auth='user'),
+    Scenario('POST /api/bookings', 5, 'POST', lambda rng, ids: '/api/bookings', auth='user',
+             body=lambda rng, ids: {'tour_date_id': rng.randint(1, ids['tour_date']), 'number_of_participants': 1}),
+    Scenario('POST /api/vehicle-bookings', 3, 'POST', lambda rng, ids: '/api/vehicle-bookings', auth='user',
+             body=lambda rng, ids: {'vehicle_id': rng.randint(1, ids['vehicle']), 'from_date': _future_date(rng),
+                                    'from_place': 'Bench A', 'to_place': 'Bench B'}),
+    Scenario('POST /api/auth/login', 2, 'POST', lambda rng, ids: '/api/auth/login',
+             body=lambda rng, ids: {'email': f'user{rng.randint(2, ids["user"])}@bench.test', 'password': 'bench123'}),
+    Scenario('GET /api/database/info', 2, 'GET', lambda rng, ids: '/api/database/info'),
+    Scenario('GET /api/bookings/admin/summary', 2, 'GET', lambda rng, ids: '/api/bookings/admin/summary', auth='admin'),
+]
+
+
+def load_id_ranges(database):
+    conn = sqlite3.connect(database)
+    try:
+        ids = {}
+        for table in ('user', 'destination', 'tour', 'tour_date', 'vehicle'):
+            ids[table] = conn.execute(f'SELECT MAX(id) FROM "{table}"').fetchone()[0] or 1
+        return ids
+    finally:
+        conn.close()
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.conn = None
+
+    def request(self, method, path, body, headers):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = None
+            raise
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    by_endpoint = {}
+    for name, status, latency in samples:
+        by_endpoint.setdefault(name, []).append((status, latency))
+
+    endpoints = {}
+    for name, results in sorted(by_endpoint.items()):
+        latencies = sorted(latency for _, latency in results)
+        endpoints[name] = {
+            'requests': len(results),
+            'errors': sum(1 for status, _ in results if status is None or status >= 500),
+            'client_errors': sum(1 for status, _ in results if status is not None and 400 <= status < 500),
+            'throughput': round(len(results) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+        }
+    return {
+        'total_requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 2),
+        'endpoints': endpoints
+    }
+
+
+def run(make_client, ids, clients, duration, warmup, secret_key, seed=0, scenarios=SCENARIOS):
+    weights = [scenario.weight for scenario in scenarios]
+    samples = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+    admin_token = jwt.encode({'user_id': 1, 'exp': datetime.utcnow() + timedelta(days=1)}, secret_key)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = make_client()
+        user_token = jwt.encode({
+            'user_id': rng.randint(2, max(ids['user'], 2)),
+            'exp': datetime.utcnow() + timedelta(days=1)
+        }, secret_key)
+        local = []
+        start_barrier.wait()
+        record_after = time.perf_counter() + warmup
+        deadline = record_after + duration
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            scenario = rng.choices(scenarios, weights)[0]
+            headers = {}
+            if scenario.auth:
+                headers['Authorization'] = f'Bearer {admin_token if scenario.auth == "admin" else user_token}'
+            body = scenario.body(rng, ids) if scenario.body else None
+            started = time.perf_counter()
+            try:
+                status = client.request(scenario.method, scenario.path(rng, ids), body, headers)
+            except Exception:
+                status = None
+            finished = time.perf_counter()
+            if started >= record_after:
+                local.append((scenario.name, status, finished - started))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, duration)
+
+
+def print_report(result, baseline=None):
+    header = f'{"endpoint":<36} {"reqs":>7} {"err":>5} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}'
+    print(header)
+    print('-' * len(header))
+    for name, stats in result['endpoints'].items():
+        line = (f'{name:<36} {stats["requests"]:>7} {stats["errors"]:>5} {stats["throughput"]:>9.1f} '
+                f'{stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} {stats["p99_ms"]:>9.2f}')
+        previous = (baseline or {}).get('endpoints', {}).get(name)
+        if previous:
+            line += '   ' + '  '.join(
+                f'{key.split("_")[0]} {_delta(previous[key], stats[key])}' for key in ('p50_ms', 'p95_ms', 'p99_ms')
+            )
+        print(line)
+    print('-' * len(header))
+    total = f'{"total":<36} {result["total_requests"]:>7} {"":>5} {result["throughput"]:>9.1f}'
+    if baseline:
+        total += f'   throughput {_delta(baseline["throughput"], result["throughput"])}'
+    print(total)
+
+
+def _delta(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def _baseline_path(name):
+    if os.path.sep in name or name.endswith('.json'):
+        return name
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the API with concurrent clients')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench.db'),
+                        help='database generated by benchmarks.datagen (also used to pick valid ids)')
+    parser.add_argument('--url', help='test a running server instead of the in-process app')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds before recording')
+    parser.add_argument('--only', action='append', help='only run endpoints containing this text')
+    parser.add_argument('--save', metavar='NAME', help='save results as a baseline')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a saved baseline')
+    args = parser.parse_args(argv)
+
+    database = os.path.abspath(args.database)
+    if not os.path.exists(database):
+        parser.error(f'{database} does not exist, run python -m benchmarks.datagen first')
+    secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+    ids = load_id_ranges(database)
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        sys.path.insert(0, BACKEND_DIR)
+        from app import create_app
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+        make_client = lambda: InProcessClient(app)
+
+    scenarios = SCENARIOS
+    if args.only:
+        scenarios = [s for s in SCENARIOS if any(text in s.name for text in args.only)]
+        if not scenarios:
+            parser.error('no endpoints match --only')
+
+    baseline = None
+    if args.compare:
+        with open(_baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+
+    print(f'{args.clients} clients, {args.duration:.0f}s measured after {args.warmup:.0f}s warmup, '
+          f'{"HTTP " + args.url if args.url else "in-process"}')
+    result = run(make_client, ids, args.clients, args.duration, args.warmup, secret_key, scenarios=scenarios)
+    print_report(result, baseline)
+
+    if args.save:
+        result['meta'] = {
+            'clients': args.clients,
+            'duration': args.duration,
+            'target': args.url or 'in-process',
+            'max_ids': ids,
+            'python': platform.python_version(),
+            'recorded_at': datetime.utcnow().isoformat()
+        }
+        path = _baseline_path(args.save)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Saved baseline to {path}')
+
+
+if __name__ == '__main__':
+    main()
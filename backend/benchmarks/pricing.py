@@ -0,0 +1,81 @@
+"""
+Quote engine benchmark: prices batches of random (departure, participants)
+pairs with the vectorized PriceBook and, for comparison, one at a time the
+way a per-date request loop would.
+
+    python -m benchmarks.pricing --dates 5000 --rules 40 --quotes 1000 10000 100000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from pricing import KINDS, PriceBook
+
+
+def build_book(dates, rules, seed=42):
+    rng = random.Random(seed)
+    first = date(2030, 1, 1)
+    departures = [
+        (i + 1, i // 12 + 1, first + timedelta(days=rng.randrange(365)), rng.uniform(200, 2000), rng.choice([1.0, 1.2]))
+        for i in range(dates)
+    ]
+    tours = departures[-1][1]
+    pricing_rules = []
+    for i in range(rules):
+        start = first + timedelta(days=rng.randrange(300))
+        pricing_rules.append(SimpleNamespace(
+            id=i + 1,
+            kind=KINDS[i % len(KINDS)],
+            tour_id=rng.choice([None, rng.randint(1, tours)]),
+            modifier=rng.uniform(0.8, 1.3),
+            start_date=start,
+            end_date=start + timedelta(days=rng.randrange(10, 90)),
+            min_participants=rng.randint(2, 8),
+            min_days_before=rng.choice([30, 60, 90, 180])
+        ))
+    return PriceBook(departures, pricing_rules)
+
+
+def measure(book, quotes, runs, seed=42):
+    rng = np.random.default_rng(seed)
+    tour_date_ids = rng.choice(book.date_ids, quotes)
+    participants = rng.integers(1, 10, quotes)
+    booked_on = date(2029, 11, 1)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        book.quote(tour_date_ids, participants, booked_on)
+        samples.append((time.perf_counter() - started) * 1000)
+    # One quote per call, as with a request per date
+    looped = min(quotes, 1000)
+    started = time.perf_counter()
+    for tour_date_id, count in zip(tour_date_ids[:looped], participants[:looped]):
+        book.quote([tour_date_id], [count], booked_on)
+    per_quote_ms = (time.perf_counter() - started) * 1000 / looped
+    return {
+        'batch_ms': round(statistics.median(samples), 2),
+        'per_quote_us': round(statistics.median(samples) * 1000 / quotes, 3),
+        'one_by_one_ms': round(per_quote_ms * quotes, 1)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure batch price quoting')
+    parser.add_argument('--dates', type=int, default=5000, help='departures in the price book')
+    parser.add_argument('--rules', type=int, default=40)
+    parser.add_argument('--quotes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+    book = build_book(args.dates, args.rules)
+    for quotes in args.quotes:
+        result = measure(book, quotes, args.runs)
+        print(f'{quotes:>7} quotes  ' + '  '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Cold-start benchmark: measures, in fresh interpreter processes, how long it
+takes to import the app module, build an app, and serve a first request.
+With --gunicorn it instead starts the shipped gunicorn profile with and
+without preload and compares time-to-ready, first-request latency across
+workers and per-worker memory (RSS, PSS and private pages).
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.datagen --rows 100000
+    python -m benchmarks.startup --gunicorn --workers 4
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.concurrency import _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside a fresh interpreter; prints one JSON line of timings in ms
+PROBE = r'''
+import json, os, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+mode = sys.argv[1]
+if hasattr(app_module, 'create_app'):
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}
+    if mode == 'cli':
+        config.update(app_module.CLI_CONFIG)
+    application = app_module.create_app(config)
+else:
+    application = app_module.app
+created = time.perf_counter()
+first_request = None
+if mode == 'web':
+    from database import db
+    with application.app_context():
+        db.create_all()
+    client = application.test_client()
+    client.get('/api/tours')
+    first_request = (time.perf_counter() - created) * 1000
+import resource
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': first_request,
+    'modules': len(sys.modules),
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+}))
+'''
+
+
+def measure(mode, runs):
+    samples = []
+    for _ in range(runs):
+        env = dict(os.environ, DATABASE_URL='sqlite:///:memory:')
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, mode], cwd=BACKEND_DIR, env=env,
+            check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples if sample[key] is not None]
+        result[key] = round(statistics.median(values), 1) if values else None
+    return result
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[name] = int(rest.split()[0])
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'private': values['Private_Clean'] + values['Private_Dirty']
+    }
+
+
+def _children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        started = time.perf_counter()
+        conn.request('GET', path, headers={'Connection': 'close'})
+        response = conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def measure_gunicorn(preload, workers, database, requests):
+    port = _free_port()
+    env = dict(
+        os.environ, DATABASE_URL=f'sqlite:///{os.path.abspath(database)}', WEB_CONCURRENCY=str(workers),
+        GUNICORN_PRELOAD='1' if preload else '0', GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_ACCESS_LOG='', GUNICORN_LOG_LEVEL='warning', METRICS_MULTIPROC_DIR=''
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application'], cwd=BACKEND_DIR, env=env
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+            if time.perf_counter() - started > 60:
+                raise RuntimeError('gunicorn did not serve /api/vehicles within 60s')
+            try:
+                if _get(port, '/api/vehicles')[0] == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.05)
+        ready_ms = (time.perf_counter() - started) * 1000
+        while len(_children(process.pid)) < workers:
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        # Fresh connections spread over the workers; without preload each
+        # worker pays for building every catalog on its first hits
+        latencies = []
+        for index in range(requests):
+            path = ('/api/tours', '/api/destinations', '/api/vehicles')[index % 3]
+            latencies.append(_get(port, path)[1] * 1000)
+        memory = [_memory_kb(pid) for pid in _children(process.pid)]
+        master = _memory_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies.sort()
+    return {
+        'ready_ms': round(ready_ms, 1),
+        'first_requests_mean_ms': round(statistics.mean(latencies), 1),
+        'first_requests_max_ms': round(latencies[-1], 1),
+        'worker_rss_mb': round(statistics.mean(m['rss'] for m in memory) / 1024, 1),
+        'worker_pss_mb': round(statistics.mean(m['pss'] for m in memory) / 1024, 1),
+        'worker_private_mb': round(statistics.mean(m['private'] for m in memory) / 1024, 1),
+        'total_pss_mb': round((sum(m['pss'] for m in memory) + master['pss']) / 1024, 1)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure app import and cold-start time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--gunicorn', action='store_true', help='compare gunicorn with and without preload')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=60, help='requests sent right after startup')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'instance', 'bench.db'))
+    args = parser.parse_args(argv)
+    if args.gunicorn:
+        for preload in (False, True):
+            result = measure_gunicorn(preload, args.workers, args.database, args.requests)
+            label = 'preload' if preload else 'no-preload'
+            print(f'{label:<10} ' + '  '.join(f'{key}={value}' for key, value in result.items()))
+        return
+    for mode in ('web', 'cli'):
+        result = measure(mode, args.runs)
+        print(f'{mode:<4} ' + '  '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Vehicle booking stress test: many client threads request, approve and
+batch-approve overlapping trips on one vehicle at once, then the approved
+bookings are checked for overlaps. Reports throughput and p50/p95 latency
+per operation, and exits non-zero if any two approved trips overlap.
+test_backend.py runs a short version of the same scenario.
+
+    python -m benchmarks.vehicle_contention --clients 16 --duration 10
+    python -m benchmarks.vehicle_contention --unlocked   # without lock_vehicles, for comparison
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import jwt
+
+from benchmarks.loadtest import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def overlapping_pairs(bookings):
+    """
+    Pairs of booking ids whose windows overlap, from a sweep over each day
+    """
+    from vehicle_slots import windows_for
+    by_day = {}
+    for booking in bookings:
+        for day, start, end in windows_for(booking):
+            by_day.setdefault(day, []).append((start, end, booking.id))
+    pairs = set()
+    for windows in by_day.values():
+        windows.sort()
+        for i, (start, end, booking_id) in enumerate(windows):
+            for other_start, _, other_id in windows[i + 1:]:
+                if other_start >= end:
+                    break
+                pairs.add(tuple(sorted((booking_id, other_id))))
+    return pairs
+
+
+def create_contention_app(database, clients):
+    """
+    An app on a new database at path database, with an admin, clients users
+    and one vehicle. Returns the app, the vehicle's id and a token per user
+    (the admin's first).
+    """
+    from app import create_app
+    from database import db
+    from models import User, Vehicle
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+        'SCHEDULER_ENABLED': False,
+        'IMAGE_BACKGROUND_PROCESSING': False,
+        'METRICS_ENABLED': False,
+        'SQL_INSTRUMENTATION': False,
+        'SLOW_QUERY_LOG': False,
+        'PROFILING_ENABLED': False,
+        'RATE_LIMITS_ENABLED': False,
+        'SNAPSHOT_DIR': None,
+    })
+    with app.app_context():
+        db.create_all()
+        users = [User(name=f'user{i}', email=f'user{i}@example.com', password_hash='-', is_admin=i == 0)
+                 for i in range(clients + 1)]
+        vehicle = Vehicle(name='Contended van', type='van')
+        db.session.add_all(users + [vehicle])
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        vehicle_id = vehicle.id
+
+    secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+    expires = datetime.utcnow() + timedelta(hours=1)
+    return app, vehicle_id, [jwt.encode({'user_id': user_id, 'exp': expires}, secret_key) for user_id in user_ids]
+
+
+def hammer(app, vehicle_id, tokens, clients, duration, days=3, seed=0):
+    """
+    Run clients threads of requests, approvals and batch approvals on the
+    vehicle for duration seconds. Returns [(operation, status, seconds)].
+    """
+    first_day = date.today() + timedelta(days=30)
+    requested = []
+    samples = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        user_headers = {'Authorization': f'Bearer {tokens[index + 1]}'}
+        admin_headers = {'Authorization': f'Bearer {tokens[0]}'}
+        local = []
+        start_barrier.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            operation = rng.choices(['request', 'approve', 'batch'], [4, 4, 1])[0]
+            with lock:
+                ids = list(requested)
+            if operation != 'request' and not ids:
+                operation = 'request'
+            started = time.perf_counter()
+            if operation == 'request':
+                start = rng.randint(0, 20)
+                response = client.post('/api/vehicle-bookings', json={
+                    'vehicle_id': vehicle_id,
+                    'from_date': (first_day + timedelta(days=rng.randrange(days))).isoformat(),
+                    'start_time': f'{start:02d}:00',
+                    'end_time': f'{start + rng.randint(1, 3):02d}:00',
+                    'from_place': 'Depot',
+                    'to_place': 'Airport'
+                }, headers=user_headers)
+                if response.status_code == 201:
+                    with lock:
+                        requested.append(response.json['booking_id'])
+            elif operation == 'approve':
+                response = client.patch(f'/api/vehicle-bookings/{rng.choice(ids)}', json={'status': 'approved'},
+                                        headers=admin_headers)
+            else:
+                response = client.patch('/api/vehicle-bookings/batch', json={
+                    'updates': [{'id': booking_id, 'status': 'approved'}
+                                for booking_id in rng.sample(ids, min(3, len(ids)))]
+                }, headers=admin_headers)
+            local.append((operation, response.status_code, time.perf_counter() - started))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def approved_overlaps(app, vehicle_id):
+    """
+    The number of approved trips of the vehicle and the pairs of them that overlap
+    """
+    from models import VehicleBooking
+    with app.app_context():
+        approved = VehicleBooking.query.filter_by(vehicle_id=vehicle_id, status='approved').all()
+        return len(approved), overlapping_pairs(approved)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hammer one vehicle with concurrent requests and approvals')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--days', type=int, default=3, help='trips fall on this many days, so most collide')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--unlocked', action='store_true', help='skip the per-vehicle lock (shows the race)')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_DIR)
+    import routes.vehicle_booking_routes as vehicle_booking_routes
+    if args.unlocked:
+        vehicle_booking_routes.lock_vehicles = lambda vehicle_ids: None
+
+    directory = tempfile.mkdtemp(prefix='vehicle-contention-')
+    app, vehicle_id, tokens = create_contention_app(os.path.join(directory, 'contention.db'), args.clients)
+    samples = hammer(app, vehicle_id, tokens, args.clients, args.duration, args.days, args.seed)
+
+    print(f'{"operation":<10} {"reqs":>7} {"2xx":>7} {"4xx":>7} {"5xx":>5} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9}')
+    for operation in ('request', 'approve', 'batch'):
+        rows = [(status, latency) for name, status, latency in samples if name == operation]
+        latencies = sorted(latency * 1000 for _, latency in rows)
+        counts = [sum(1 for status, _ in rows if low <= status < low + 100) for low in (200, 400, 500)]
+        print(f'{operation:<10} {len(rows):>7} {counts[0]:>7} {counts[1]:>7} {counts[2]:>5} '
+              f'{len(rows) / args.duration:>9.1f} {percentile(latencies, 50) or 0:>9.1f} '
+              f'{percentile(latencies, 95) or 0:>9.1f}')
+    print(f'total {len(samples)} operations, {len(samples) / args.duration:.1f}/s with {args.clients} clients')
+
+    approved, pairs = approved_overlaps(app, vehicle_id)
+    print(f'{approved} approved trips, {len(pairs)} overlapping pairs')
+    if pairs:
+        print(f'double-booked: {sorted(pairs)[:10]}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from datetime import datetime
+from flask import current_app, has_app_context, request
+from sqlalchemy import event, func, insert, select
+from database import db
+from models import BookingEvent, VehicleBooking
+from routes.auth_routes import load_token_user
+
+# Booking lifecycle events for the SSE stream (GET /api/events/stream).
+# Views record an event in the same transaction as the change, so an event
+# exists exactly when its change was committed. Each process runs one hub: a
+# single thread polls for events newer than the last it saw, keeps the most
+# recent ones in memory and wakes every open stream, so idle streams cost no
+# queries and the database sees one poll per process, however many clients
+# are connected. Commits made in this process wake the poller at once; those
+# of other workers are picked up within POLL_SECONDS.
+#
+# SQLite runs one write transaction at a time, so events commit in id order
+# and a cursor (the last id a client saw) never skips an event committed later.
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', 1.0))
+HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 1000))
+PAGE_SIZE = 500
+RETENTION_DAYS = int(os.environ.get('EVENTS_RETENTION_DAYS', 7))
+# Client reconnect delay sent with every stream, in milliseconds
+RETRY_MS = 3000
+
+_hubs = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+
+
+def _booking_type(booking):
+    return 'vehicle' if isinstance(booking, VehicleBooking) else 'tour'
+
+
+def record_event(booking, event_name):
+    """
+    Add a lifecycle event for a tour or vehicle booking to the current
+    transaction
+    """
+    if booking.id is None:
+        db.session.flush()
+    vehicle = isinstance(booking, VehicleBooking)
+    db.session.add(BookingEvent(
+        user_id=booking.user_id,
+        booking_type=_booking_type(booking),
+        booking_id=booking.id,
+        event=event_name,
+        status=booking.status if vehicle else booking.booking_status,
+        payment_status=None if vehicle else booking.payment_status
+    ))
+    db.session.info['booking_events'] = True
+
+
+def record_events(rows):
+    """
+    Add many events at once, as dicts of BookingEvent columns (for bulk
+    updates that never load the bookings)
+    """
+    if rows:
+        now = datetime.utcnow()
+        db.session.execute(insert(BookingEvent), [dict(row, created_at=now) for row in rows])
+        db.session.info['booking_events'] = True
+
+
+def serialize_event(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'booking_type': row.booking_type,
+        'booking_id': row.booking_id,
+        'event': row.event,
+        'status': row.status,
+        'payment_status': row.payment_status,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+
+
+def latest_event_id():
+    return db.session.execute(select(func.max(BookingEvent.id))).scalar() or 0
+
+
+def events_after(cursor, limit=PAGE_SIZE):
+    """
+    Up to limit events with an id above cursor, oldest first, from the database
+    """
+    rows = db.session.execute(
+        select(BookingEvent).where(BookingEvent.id > cursor).order_by(BookingEvent.id).limit(limit)
+    ).scalars()
+    return [serialize_event(row) for row in rows]
+
+
+def visible_to(user_id, is_admin):
+    """
+    Filter for the events a user may see: their own bookings', or all for admins
+    """
+    return (lambda e: True) if is_admin else (lambda e: e['user_id'] == user_id)
+
+
+def format_event(e):
+    return f'id: {e["id"]}\nevent: booking\ndata: {json.dumps(e)}\n\n'
+
+
+def open_stream():
+    """
+    Authenticate a stream request and find where it resumes. Returns
+    (cursor, visible), or (status, payload) of an error response. Needs a
+    request context.
+    """
+    # EventSource cannot set headers, so the token may come as ?token=
+    header = request.headers.get('Authorization', '')
+    token = header.split(' ')[1] if len(header.split(' ')) == 2 else request.args.get('token')
+    if not token:
+        return 401, {'message': 'Token is missing'}
+    try:
+        user = load_token_user(token)
+    except Exception:
+        user = None
+    if not user:
+        return 401, {'message': 'Invalid token'}
+    # Browsers resend the last id they saw as Last-Event-ID on reconnect
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('after')
+    if cursor is None:
+        cursor = latest_event_id()
+    elif not str(cursor).isdigit():
+        return 400, {'status': 'error', 'message': 'The cursor must be an event id'}
+    return int(cursor), visible_to(user.id, user.is_admin)
+
+
+class EventHub:
+    """
+    This process's view of the event log: the latest BUFFER_SIZE events and
+    the id of the newest one, kept current by a poller thread that runs
+    while at least one stream is open
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._condition = threading.Condition()
+        self._events = []
+        self._ids = []
+        # Cursors at or above this are fully served from _events
+        self._floor = None
+        self.last_id = None
+        self._subscribers = 0
+        # Streams served by Flask, each holding a request thread
+        self.threaded_streams = 0
+        self._thread = None
+        self._wake = threading.Event()
+        # (loop, future) of coroutines waiting for events
+        self._waiters = set()
+
+    def refresh(self):
+        """
+        Load events newer than the last seen and wake the streams. Needs an
+        app context.
+        """
+        if self.last_id is None:
+            head = latest_event_id()
+            with self._condition:
+                self._floor = self.last_id = head
+            return
+        new = events_after(self.last_id, BUFFER_SIZE)
+        if not new:
+            return
+        with self._condition:
+            self._events.extend(new)
+            self._ids.extend(e['id'] for e in new)
+            if len(self._events) > BUFFER_SIZE:
+                self._floor = self._ids[-BUFFER_SIZE - 1]
+                del self._events[:-BUFFER_SIZE], self._ids[:-BUFFER_SIZE]
+            self.last_id = new[-1]['id']
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def buffered_after(self, cursor):
+        """
+        The buffered events above cursor and the cursor after them, or None
+        when the buffer does not reach back to cursor (read the database)
+        """
+        with self._condition:
+            if self._floor is None or cursor < self._floor:
+                return None
+            return self._events[bisect.bisect_right(self._ids, cursor):], max(cursor, self.last_id)
+
+    def wait(self, cursor, timeout):
+        """
+        Block until an event above cursor arrives or timeout passes; True if
+        one did
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.last_id is not None and self.last_id > cursor, timeout)
+
+    async def wait_async(self, cursor, timeout):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            if self.last_id is not None and self.last_id > cursor:
+                return True
+            self._waiters.add((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._waiters.discard((loop, future))
+
+    def wake(self):
+        self._wake.set()
+
+    def claim_thread(self, limit):
+        """
+        Count a stream served on a request thread, unless limit are already
+        open in this process
+        """
+        with self._condition:
+            if self.threaded_streams >= limit:
+                return False
+            self.threaded_streams += 1
+            return True
+
+    def release_thread(self):
+        with self._condition:
+            self.threaded_streams -= 1
+
+    def subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='booking-events', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._subscribers <= 0:
+                    # Nobody listening: stop, and forget what may go stale
+                    self._thread = None
+                    self._events, self._ids, self._floor, self.last_id = [], [], None, None
+                    return
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception('Polling booking events failed')
+                finally:
+                    db.session.remove()
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+def get_hub(app):
+    with _hubs_lock:
+        if app not in _hubs:
+            _hubs[app] = EventHub(app)
+        return _hubs[app]
+
+
+def stream_events(hub, cursor, visible, duration):
+    """
+    Generate the SSE stream: events above cursor that pass visible as they
+    arrive, with heartbeats, for duration seconds. Runs in a request context
+    (stream_with_context).
+    """
+    yield f'retry: {RETRY_MS}\n\n'
+    deadline = time.monotonic() + duration
+    if duration > 0:
+        hub.subscribe()
+    try:
+        while True:
+            buffered = hub.buffered_after(cursor)
+            if buffered is None:
+                # Too far behind the buffer (or no poller): catch up from the log
+                events = events_after(cursor)
+                db.session.remove()
+                next_cursor = events[-1]['id'] if events else cursor
+            else:
+                events, next_cursor = buffered
+            for e in events:
+                if visible(e):
+                    yield format_event(e)
+            cursor = next_cursor
+            if buffered is None and len(events) == PAGE_SIZE:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not hub.wait(cursor, min(HEARTBEAT_SECONDS, remaining)):
+                # Comment line: keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+    finally:
+        if duration > 0:
+            hub.unsubscribe()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_hub(session):
+    if session.info.pop('booking_events', None) and has_app_context():
+        hub = _hubs.get(current_app._get_current_object())
+        if hub is not None:
+            hub.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_events(session, previous_transaction):
+    session.info.pop('booking_events', None)
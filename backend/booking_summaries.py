@@ -0,0 +1,166 @@
+from datetime import datetime
+from sqlalchemy import func, case
+from sqlalchemy.dialects.sqlite import insert
+from archival import union_with_archive
+from database import db
+from models import Booking, Tour, TourDate, TourSummary, TourDateSummary, MonthlySummary
+
+COUNTERS = ('bookings', 'participants', 'revenue', 'cancellations')
+
+
+def booking_snapshot(booking):
+    """
+    Capture the fields that feed the summaries before a booking is changed
+    """
+    return (booking.booking_status or 'pending', booking.number_of_participants, booking.total_price)
+
+
+def _contribution(status, participants, total_price):
+    if status == 'cancelled':
+        return (0, 0, 0.0, 1)
+    return (1, participants or 0, total_price or 0.0, 0)
+
+
+def _upsert(model, keys, delta, extra=None):
+    values = dict(keys, **(extra or {}))
+    values.update(zip(COUNTERS, delta))
+    values['updated_at'] = datetime.utcnow()
+    stmt = insert(model).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_=dict(
+            {name: getattr(model, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+            updated_at=stmt.excluded.updated_at
+        )
+    )
+    db.session.execute(stmt)
+
+
+def apply_summary_delta(tour_id, tour_date_id, departure_date, delta):
+    """
+    Add a (bookings, participants, revenue, cancellations) delta to the per-tour,
+    per-departure and per-month summaries in the current transaction
+    """
+    if not any(delta):
+        return
+    _upsert(TourSummary, {'tour_id': tour_id}, delta)
+    _upsert(TourDateSummary, {'tour_date_id': tour_date_id}, delta, extra={'tour_id': tour_id})
+    _upsert(MonthlySummary, {'month': departure_date.strftime('%Y-%m')}, delta)
+
+
+def record_booking_change(booking, before=None, tour_date=None):
+    """
+    Update the summaries for a created (before=None) or changed booking.
+    Must be called before the booking's transaction is committed.
+    """
+    after = _contribution(*booking_snapshot(booking))
+    previous = _contribution(*before) if before else (0, 0, 0.0, 0)
+    delta = tuple(a - b for a, b in zip(after, previous))
+    tour_date = tour_date or booking.tour_date
+    apply_summary_delta(booking.tour_id, tour_date.id, tour_date.departure_date, delta)
+
+
+def rebuild_summaries():
+    """
+    Recompute every summary table from the booking table and its archive
+    (backfill/repair)
+    """
+    bookings = union_with_archive(Booking)
+    active = bookings.c.booking_status != 'cancelled'
+    totals = (
+        func.sum(case((active, 1), else_=0)),
+        func.sum(case((active, bookings.c.number_of_participants), else_=0)),
+        func.sum(case((active, bookings.c.total_price), else_=0.0)),
+        func.sum(case((active, 0), else_=1))
+    )
+    month = func.strftime('%Y-%m', TourDate.departure_date)
+    now = datetime.utcnow()
+
+    db.session.query(TourSummary).delete()
+    db.session.query(TourDateSummary).delete()
+    db.session.query(MonthlySummary).delete()
+
+    # Archived bookings can outlive their tour or departure; the joins skip those
+    rows = db.session.query(bookings.c.tour_id, *totals).join(Tour, bookings.c.tour_id == Tour.id) \
+        .group_by(bookings.c.tour_id).all()
+    if rows:
+        db.session.execute(insert(TourSummary), [
+            dict(zip(('tour_id',) + COUNTERS, row), updated_at=now) for row in rows
+        ])
+
+    rows = db.session.query(bookings.c.tour_date_id, bookings.c.tour_id, *totals) \
+        .join(TourDate, bookings.c.tour_date_id == TourDate.id).group_by(bookings.c.tour_date_id).all()
+    if rows:
+        db.session.execute(insert(TourDateSummary), [
+            dict(zip(('tour_date_id', 'tour_id') + COUNTERS, row), updated_at=now) for row in rows
+        ])
+
+    rows = db.session.query(month, *totals).select_from(bookings) \
+        .join(TourDate, bookings.c.tour_date_id == TourDate.id).group_by(month).all()
+    if rows:
+        db.session.execute(insert(MonthlySummary), [
+            dict(zip(('month',) + COUNTERS, row), updated_at=now) for row in rows
+        ])
+
+    db.session.commit()
+
+
+def _with_load_factor(row, capacity):
+    row['capacity'] = capacity
+    row['load_factor'] = round(row['participants'] / capacity, 4) if capacity else None
+    return row
+
+
+def _counters(summary):
+    return {name: getattr(summary, name) for name in COUNTERS}
+
+
+def get_summaries(scope):
+    """
+    Read one summary table. Capacity is the remaining seat pool plus the seats
+    held by active bookings, so the cost is proportional to the number of
+    groups rather than the number of bookings.
+    """
+    if scope == 'tour':
+        seats = dict(
+            db.session.query(TourDate.tour_id, func.sum(TourDate.available_seats)).group_by(TourDate.tour_id).all()
+        )
+        rows = db.session.query(TourSummary, Tour.name).join(Tour, Tour.id == TourSummary.tour_id).all()
+        return [_with_load_factor(
+            dict(tour_id=summary.tour_id, tour_name=name, **_counters(summary)),
+            (seats.get(summary.tour_id) or 0) + summary.participants
+        ) for summary, name in rows]
+
+    if scope == 'tour_date':
+        rows = db.session.query(TourDateSummary, TourDate.departure_date, TourDate.available_seats).join(
+            TourDate, TourDate.id == TourDateSummary.tour_date_id
+        ).order_by(TourDate.departure_date).all()
+        return [_with_load_factor(
+            dict(tour_date_id=summary.tour_date_id, tour_id=summary.tour_id,
+                 departure_date=departure_date.isoformat(), **_counters(summary)),
+            available_seats + summary.participants
+        ) for summary, departure_date, available_seats in rows]
+
+    if scope == 'month':
+        month = func.strftime('%Y-%m', TourDate.departure_date)
+        seats = dict(db.session.query(month, func.sum(TourDate.available_seats)).group_by(month).all())
+        rows = MonthlySummary.query.order_by(MonthlySummary.month).all()
+        return [_with_load_factor(
+            dict(month=summary.month, **_counters(summary)),
+            (seats.get(summary.month) or 0) + summary.participants
+        ) for summary in rows]
+
+    raise ValueError(f'Unknown summary scope: {scope}')
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app, CLI_CONFIG
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+        with create_app(CLI_CONFIG).app_context():
+            db.create_all()
+            rebuild_summaries()
+            print('Booking summaries rebuilt.')
+    else:
+        print('Usage: python booking_summaries.py rebuild')
@@ -0,0 +1,151 @@
+import logging
+import threading
+import weakref
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import CatalogVersion, Destination, Tour, TourDate, Vehicle
+
+logger = logging.getLogger(__name__)
+
+# Read-mostly listings (tour catalog, destinations, vehicle list) are cached per
+# process as ready-to-send JSON bytes. A single bytes object per catalog is
+# cheap to serve and, when built in the gunicorn master before fork, stays
+# shared copy-on-write because serving it never touches per-object refcounts.
+#
+# Each catalog has a version row in catalog_version that is bumped in the same
+# transaction as any change to its data, so every worker notices a stale copy
+# on its next read with one primary-key lookup.
+
+# Which catalogs a change to each model invalidates
+INVALIDATES = {
+    Tour: ('tours', 'destinations'),          # destinations carry tour_count
+    TourDate: ('tours',),
+    Destination: ('destinations', 'tours'),   # tours embed their destination
+    Vehicle: ('vehicles',),
+}
+
+_builders = {}
+# Catalogs whose payload depends on the (UTC) date, e.g. early-bird prices
+_daily = set()
+_lock = threading.Lock()
+# Keyed by engine so isolated apps never share cached catalogs
+_entries = weakref.WeakKeyDictionary()
+# engine -> whether its database has the catalog_version table
+_has_version_table = weakref.WeakKeyDictionary()
+
+
+def _versioned(bind):
+    # Databases created before catalog_version existed serve listings uncached
+    # until `python migrations.py` adds the table and workers restart
+    engine = bind.engine
+    exists = _has_version_table.get(engine)
+    if exists is None:
+        exists = _has_version_table[engine] = inspect(bind).has_table(CatalogVersion.__tablename__)
+        if not exists:
+            logger.warning('catalog_version table missing; catalog cache disabled until migrations run')
+    return exists
+
+
+def catalog(name, daily=False):
+    """
+    Register the decorated function as the payload builder for a catalog.
+    A daily catalog is also rebuilt when the date changes.
+    """
+    def decorator(fn):
+        _builders[name] = fn
+        if daily:
+            _daily.add(name)
+        return fn
+    return decorator
+
+
+def _current_version(name):
+    return db.session.execute(
+        select(CatalogVersion.version).where(CatalogVersion.name == name)
+    ).scalar() or 0
+
+
+def catalog_version(name):
+    """
+    Current version of a name's data, or None when versions are not tracked
+    (cache disabled, or the catalog_version table is missing)
+    """
+    if not current_app.config.get('CATALOG_CACHE', True) or not _versioned(db.engine):
+        return None
+    return _current_version(name)
+
+
+def get_catalog(name):
+    """
+    Return the catalog's JSON body, rebuilding it if another worker (or this
+    one) changed the underlying data since it was cached
+    """
+    engine = db.engine
+    if not current_app.config.get('CATALOG_CACHE', True) or not _versioned(engine):
+        return current_app.json.response(_builders[name]()).get_data()
+
+    version = _current_version(name)
+    if name in _daily:
+        version = (version, datetime.utcnow().date())
+    entry = _entries.get(engine, {}).get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    body = current_app.json.response(_builders[name]()).get_data()
+    with _lock:
+        _entries.setdefault(engine, {})[name] = (version, body)
+    return body
+
+
+def catalog_response(name):
+    return current_app.response_class(get_catalog(name), mimetype=current_app.json.mimetype)
+
+
+def bump_catalog_version(*names, connection=None):
+    """
+    Invalidate catalogs in every worker. Runs in the caller's transaction;
+    call it after bulk statements that bypass the ORM unit of work.
+    """
+    connection = connection or db.session.connection()
+    if not _versioned(connection):
+        return
+    for name in names:
+        stmt = insert(CatalogVersion).values(name=name, version=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['name'], set_={'version': CatalogVersion.version + 1}
+        ))
+
+
+def reset_catalog_cache():
+    with _lock:
+        _entries.clear()
+        _has_version_table.clear()
+
+
+def warm_catalogs(app):
+    """
+    Build every registered catalog. Called before workers fork; the engine's
+    pooled connections are disposed so no SQLite handle crosses the fork.
+    """
+    with app.app_context():
+        for name in _builders:
+            try:
+                get_catalog(name)
+            except Exception as e:
+                logger.warning('Could not warm catalog %s: %s', name, e)
+            finally:
+                db.session.rollback()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_changed_catalogs(session, flush_context):
+    names = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        names.update(INVALIDATES.get(type(obj), ()))
+    if names:
+        bump_catalog_version(*sorted(names), connection=session.connection())
@@ -0,0 +1,181 @@
+import os
+import numpy as np
+from sqlalchemy import func, select
+from archival import ARCHIVES, union_with_archive
+from models import Booking, Review, Tour, TourDate, Vehicle, VehicleBooking
+
+# Column arrays of the reporting tables, read in chunks straight off the
+# cursor. Every column has a kind that fixes its encoding, whether it comes
+# from the live database or from a snapshot file:
+#   int   -> int64, NULL as -1
+#   float -> float64, NULL as NaN
+#   bool  -> bool
+#   time  -> float64 julian day (SQLite julianday()), NULL as NaN
+#   str   -> int32 codes into a per-column dictionary of values, NULL as -1
+# Tables with an archive also get an 'archived' bool column, and their
+# archived rows are included.
+
+CHUNK_SIZE = int(os.environ.get('ANALYTICS_CHUNK_SIZE', 50000))
+
+DTYPES = {'int': np.int64, 'float': np.float64, 'bool': np.bool_, 'time': np.float64, 'str': np.int32}
+
+TABLES = {
+    'booking': (Booking, {
+        'id': 'int', 'user_id': 'int', 'tour_id': 'int', 'tour_date_id': 'int', 'number_of_participants': 'int',
+        'total_price': 'float', 'booking_status': 'str', 'payment_status': 'str', 'created_at': 'time'
+    }),
+    'tour': (Tour, {'id': 'int', 'name': 'str', 'price': 'float', 'duration_days': 'int'}),
+    'tour_date': (TourDate, {
+        'id': 'int', 'tour_id': 'int', 'departure_date': 'time', 'available_seats': 'int', 'price_modifier': 'float'
+    }),
+    'vehicle': (Vehicle, {'id': 'int', 'name': 'str', 'type': 'str', 'created_at': 'time'}),
+    'vehicle_booking': (VehicleBooking, {
+        'id': 'int', 'user_id': 'int', 'vehicle_id': 'int', 'from_date': 'time', 'to_date': 'time',
+        'status': 'str', 'created_at': 'time'
+    }),
+    'review': (Review, {'id': 'int', 'user_id': 'int', 'tour_id': 'int', 'rating': 'int', 'created_at': 'time'}),
+}
+
+
+def _fetch(conn, stmt):
+    """
+    Run stmt on the DBAPI cursor and yield its rows CHUNK_SIZE at a time
+    """
+    # Building a Row per record would cost more than the query itself at a
+    # million rows
+    compiled = stmt.compile(dialect=conn.dialect)
+    cursor = conn.connection.cursor()
+    try:
+        params = compiled.params
+        if compiled.positional:
+            params = [params[name] for name in compiled.positiontup]
+        cursor.execute(str(compiled), params)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def read_columns(conn, stmt, dtypes):
+    """
+    Run stmt, whose columns are all numeric, and return one array per
+    selected column, filled chunk by chunk
+    """
+    chunks = [np.array(rows, dtype=np.float64).reshape(-1, len(dtypes)) for rows in _fetch(conn, stmt)]
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(dtypes)))
+    return [table[:, i].astype(dtype) for i, dtype in enumerate(dtypes)]
+
+
+class Columns:
+    """
+    One table's column arrays (plain or memory-mapped) and the dictionaries
+    of its str columns
+    """
+
+    def __init__(self, arrays, values):
+        self.arrays = arrays
+        self.values = values
+
+    def __len__(self):
+        return len(next(iter(self.arrays.values()))) if self.arrays else 0
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def equals(self, name, value):
+        """
+        Mask of the rows whose str column name holds value
+        """
+        try:
+            return self.arrays[name] == self.values[name].index(value)
+        except ValueError:
+            return np.zeros(len(self.arrays[name]), dtype=bool)
+
+    def decode(self, name, codes=None):
+        """
+        Values of a str column (or of the given codes of it), None for NULL
+        """
+        codes = self.arrays[name] if codes is None else codes
+        lookup = self.values[name] + [None]
+        return [lookup[code] for code in np.asarray(codes).tolist()]
+
+
+def table_columns(name, columns=None):
+    """
+    {column: kind} of a reporting table, or of just the named columns
+    """
+    model, kinds = TABLES[name]
+    if model in ARCHIVES:
+        kinds = dict(kinds, archived='bool')
+    return {column: kinds[column] for column in columns} if columns else kinds
+
+
+def table_select(name, kinds):
+    """
+    SELECT of the columns of a reporting table, archive included, with times
+    as julian days
+    """
+    model, _ = TABLES[name]
+    names = [column for column in kinds if column != 'archived']
+    # Narrow union: SQLite materializes every selected column of it
+    source = union_with_archive(model, columns=names) if model in ARCHIVES else model.__table__
+    return select(*[
+        func.julianday(source.c[column]) if kind == 'time' else source.c[column] for column, kind in kinds.items()
+    ]).select_from(source)
+
+
+class Dictionary(dict):
+    """
+    value -> code of a str column, handing out the next code to new values
+    """
+
+    def __init__(self):
+        super().__init__({None: -1})
+
+    def __missing__(self, value):
+        code = self[value] = len(self) - 1
+        return code
+
+    def values_by_code(self):
+        return [value for value in self if value is not None]
+
+
+def encode_chunks(conn, name, kinds, values):
+    """
+    Yield the rows of a reporting table as {column: array} chunks, adding
+    the values of its str columns to values ({column: Dictionary})
+    """
+    for rows in _fetch(conn, table_select(name, kinds)):
+        chunk = {}
+        for (column, kind), cells in zip(kinds.items(), zip(*rows)):
+            if kind == 'str':
+                index = values.setdefault(column, Dictionary())
+                chunk[column] = np.fromiter(map(index.__getitem__, cells), dtype=np.int32, count=len(cells))
+            elif kind == 'int':
+                try:
+                    chunk[column] = np.array(cells, dtype=np.int64)
+                except TypeError:
+                    chunk[column] = np.nan_to_num(np.array(cells, dtype=np.float64), nan=-1).astype(np.int64)
+            else:
+                chunk[column] = np.array(cells, dtype=np.float64).astype(DTYPES[kind])
+        yield chunk
+
+
+def read_table(conn, name, columns=None):
+    """
+    A reporting table (or the named columns of it) from the live database
+    """
+    kinds = table_columns(name, columns)
+    values = {}
+    chunks = list(encode_chunks(conn, name, kinds, values))
+    arrays = {
+        column: np.concatenate([chunk[column] for chunk in chunks]) if chunks else np.empty(0, dtype=DTYPES[kind])
+        for column, kind in kinds.items()
+    }
+    return Columns(arrays, {
+        column: values[column].values_by_code() if column in values else []
+        for column, kind in kinds.items() if kind == 'str'
+    })
@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+import weakref
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import OperationalError
+from database import db
+
+# Row counts are served from this cache and refreshed at most once per TTL.
+# Commits made through the ORM session adjust the cached counts in place, so a
+# worker sees its own inserts/deletes immediately without rescanning tables.
+# Bulk INSERT/DELETE statements run through the session (archival, expiry and
+# purge jobs) change an unknown number of rows, so committing one drops the
+# cached counts instead. The schema is cached per engine until SQLite's
+# schema_version changes (a migration or create_all). Reading that takes a
+# connection of its own, so it is only checked once per ROW_COUNT_TTL, on
+# refresh, or after a create_all/drop_all of the app's tables in this process.
+ROW_COUNT_TTL = int(os.environ.get('DB_STATS_ROW_COUNT_TTL', 30))
+# dbstat walks every page of the file, so sizes are refreshed far less often
+SIZE_TTL = int(os.environ.get('DB_STATS_SIZE_TTL', 300))
+
+_lock = threading.Lock()
+# Keyed by engine so isolated apps (e.g. two in-memory databases) never share
+_schemas = weakref.WeakKeyDictionary()
+_row_counts = weakref.WeakKeyDictionary()
+_sizes = weakref.WeakKeyDictionary()
+
+
+def reset_cache():
+    """
+    Drop all cached schema, row count and size information
+    """
+    with _lock:
+        _schemas.clear()
+        _row_counts.clear()
+        _sizes.clear()
+
+
+def _schema_version(engine):
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text('PRAGMA schema_version')).scalar()
+
+
+def get_schema(engine=None, refresh=False):
+    """
+    Reflect the database schema and cache it per engine until it changes
+    """
+    engine = engine or db.engine
+    now = time.monotonic()
+    cached = _schemas.get(engine)
+    if cached is not None and not refresh and cached['expires'] > now:
+        return cached['schema']
+    version = _schema_version(engine)
+    if cached is not None and cached['version'] == version:
+        with _lock:
+            cached['expires'] = now + ROW_COUNT_TTL
+        return cached['schema']
+
+    inspector = inspect(engine)
+    schema = {}
+    for table_name in inspector.get_table_names():
+        primary_keys = set(inspector.get_pk_constraint(table_name).get('constrained_columns') or [])
+        unique_columns = set()
+        for constraint in inspector.get_unique_constraints(table_name):
+            if len(constraint['column_names']) == 1:
+                unique_columns.add(constraint['column_names'][0])
+        schema[table_name] = {
+            'columns': [{
+                'name': column['name'],
+                'type': str(column['type']),
+                'primary_key': column['name'] in primary_keys,
+                'nullable': bool(column['nullable']),
+                'unique': column['name'] in unique_columns
+            } for column in inspector.get_columns(table_name)],
+            'indexes': [index['name'] for index in inspector.get_indexes(table_name)]
+        }
+
+    with _lock:
+        _schemas[engine] = {'version': version, 'schema': schema, 'expires': now + ROW_COUNT_TTL}
+        if cached is not None:
+            # Counts and sizes were taken for the old set of tables
+            _row_counts.pop(engine, None)
+            _sizes.pop(engine, None)
+    return schema
+
+
+def _count_rows(engine, table_names):
+    if not table_names:
+        return {}
+    quote = engine.dialect.identifier_preparer.quote
+    # One round trip for every table instead of one query per table
+    statement = ' UNION ALL '.join(
+        f"SELECT '{name}', COUNT(*) FROM {quote(name)}" for name in table_names
+    )
+    with engine.connect() as conn:
+        return {name: count for name, count in conn.execute(text(statement))}
+
+
+def get_row_counts(engine=None, refresh=False):
+    """
+    Return {table_name: row_count}, served from a short-TTL cache
+    """
+    engine = engine or db.engine
+    now = time.monotonic()
+    cached = _row_counts.get(engine)
+    if cached and not refresh and cached['expires'] > now:
+        return dict(cached['counts'])
+
+    counts = _count_rows(engine, list(get_schema(engine)))
+    with _lock:
+        _row_counts[engine] = {'counts': counts, 'expires': now + ROW_COUNT_TTL}
+    return dict(counts)
+
+
+def _read_sizes(engine):
+    with engine.connect() as conn:
+        page_size = conn.execute(text('PRAGMA page_size')).scalar()
+        page_count = conn.execute(text('PRAGMA page_count')).scalar()
+        freelist_count = conn.execute(text('PRAGMA freelist_count')).scalar()
+        owners = {
+            name: table for name, table in conn.execute(
+                text("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")
+            )
+        }
+        try:
+            pages = conn.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all()
+        except OperationalError:
+            # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+            pages = None
+
+    tables = None
+    if pages is not None:
+        tables = {}
+        for name, size in pages:
+            table = owners.get(name, name)
+            entry = tables.setdefault(table, {'data_bytes': 0, 'index_bytes': 0})
+            if table == name:
+                entry['data_bytes'] += size or 0
+            else:
+                entry['index_bytes'] += size or 0
+
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'database_size': page_size * page_count,
+        'tables': tables
+    }
+
+
+def get_sizes(engine=None, refresh=False):
+    """
+    Return the on-disk size of the database and of each table and its indexes
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return {'database_size': None, 'tables': None}
+    now = time.monotonic()
+    cached = _sizes.get(engine)
+    if cached and not refresh and cached['expires'] > now:
+        return _copy_sizes(cached['sizes'])
+
+    sizes = _read_sizes(engine)
+    with _lock:
+        _sizes[engine] = {'sizes': sizes, 'expires': now + SIZE_TTL}
+    return _copy_sizes(sizes)
+
+
+def _copy_sizes(sizes):
+    # Callers get their own copy; the cached one is shared between requests
+    tables = sizes['tables']
+    if tables is not None:
+        tables = {name: dict(entry) for name, entry in tables.items()}
+    return dict(sizes, tables=tables)
+
+
+def get_database_stats(engine=None, refresh=False):
+    """
+    Get schema, row counts and on-disk sizes for every table in the database
+    """
+    engine = engine or db.engine
+    schema = get_schema(engine, refresh=refresh)
+    counts = get_row_counts(engine, refresh=refresh)
+    sizes = get_sizes(engine, refresh=refresh)
+    table_sizes = sizes.get('tables') or {}
+
+    database_file = engine.url.database
+    last_updated = None
+    if database_file and os.path.exists(database_file):
+        last_updated = datetime.fromtimestamp(os.path.getmtime(database_file)).isoformat()
+
+    return {
+        'database_name': os.path.basename(database_file) if database_file else None,
+        'database_type': 'SQLite' if engine.dialect.name == 'sqlite' else engine.dialect.name,
+        'last_updated': last_updated,
+        'database_size': sizes.get('database_size'),
+        'page_size': sizes.get('page_size'),
+        'page_count': sizes.get('page_count'),
+        'freelist_count': sizes.get('freelist_count'),
+        'tables': {
+            name: {
+                'columns': info['columns'],
+                'indexes': info['indexes'],
+                'row_count': counts.get(name, 0),
+                'size_bytes': table_sizes.get(name, {}).get('data_bytes'),
+                'index_size_bytes': table_sizes.get(name, {}).get('index_bytes')
+            } for name, info in schema.items()
+        }
+    }
+
+
+@event.listens_for(db.metadata, 'after_create')
+@event.listens_for(db.metadata, 'after_drop')
+def _schema_changed(metadata, connection, **kw):
+    # Check schema_version again on the next call instead of waiting out the TTL
+    cached = _schemas.get(connection.engine)
+    if cached is not None:
+        with _lock:
+            cached['expires'] = 0
+
+
+# --- Maintained counters ---
+# Track row inserts/deletes per flush and apply them to the cached counts once
+# the transaction commits. Rolled back work is simply discarded.
+@event.listens_for(db.session, 'after_flush')
+def _collect_row_deltas(session, flush_context):
+    deltas = session.info.setdefault('row_count_deltas', {})
+    for obj in session.new:
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            deltas[table] = deltas.get(table, 0) + 1
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            deltas[table] = deltas.get(table, 0) - 1
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_bulk_statements(orm_execute_state):
+    # Flushes do not pass through here; explicit session.execute() calls,
+    # including Query.delete(), do
+    if orm_execute_state.is_insert or orm_execute_state.is_delete:
+        orm_execute_state.session.info['row_counts_stale'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_row_deltas(session):
+    deltas = session.info.pop('row_count_deltas', None)
+    stale = session.info.pop('row_counts_stale', False)
+    if not deltas and not stale:
+        return
+    # The session may be bound to a Connection rather than the Engine itself
+    engine = session.get_bind().engine
+    if stale:
+        with _lock:
+            _row_counts.pop(engine, None)
+        return
+    cached = _row_counts.get(engine)
+    if not cached:
+        return
+    with _lock:
+        counts = cached['counts']
+        for table, delta in deltas.items():
+            if table in counts:
+                counts[table] = max(counts[table] + delta, 0)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_row_deltas(session, previous_transaction):
+    session.info.pop('row_count_deltas', None)
+    session.info.pop('row_counts_stale', None)
@@ -1,5 +1,6 @@
 from models import User, OTPToken
 from database import db
+from database_stats import get_database_stats
 from datetime import datetime
 import json
 
@@ -31,35 +32,14 @@ def get_formatted_database_info():
                 'created_at': otp.created_at.isoformat() if otp.created_at else None
             })
         
-        # Database schema information
-        schema_info = {
-            'tables': {
-                'user': {
-                    'columns': [
-                        {'name': 'id', 'type': 'INTEGER', 'primary_key': True, 'nullable': False},
-                        {'name': 'name', 'type': 'VARCHAR(120)', 'primary_key': False, 'nullable': False},
-                        {'name': 'email', 'type': 'VARCHAR(120)', 'primary_key': False, 'nullable': False, 'unique': True},
-                        {'name': 'password_hash', 'type': 'VARCHAR(128)', 'primary_key': False, 'nullable': False},
-                        {'name': 'created_at', 'type': 'DATETIME', 'primary_key': False, 'nullable': True}
-                    ],
-                    'row_count': len(users_data)
-                },
-                'otp_token': {
-                    'columns': [
-                        {'name': 'id', 'type': 'INTEGER', 'primary_key': True, 'nullable': False},
-                        {'name': 'email', 'type': 'VARCHAR(120)', 'primary_key': False, 'nullable': False},
-                        {'name': 'token', 'type': 'VARCHAR(6)', 'primary_key': False, 'nullable': False},
-                        {'name': 'created_at', 'type': 'DATETIME', 'primary_key': False, 'nullable': True}
-                    ],
-                    'row_count': len(otp_data)
-                }
-            }
-        }
+        # Database schema information, reflected from the live database
+        stats = get_database_stats()
+        schema_info = {'tables': stats['tables']}
         
         # Compile complete database info
         database_info = {
-            'database_name': 'auth.db',
-            'database_type': 'SQLite',
+            'database_name': stats['database_name'],
+            'database_type': stats['database_type'],
             'last_updated': datetime.now().isoformat(),
             'schema': schema_info,
             'data': {
@@ -67,10 +47,10 @@ def get_formatted_database_info():
                 'otp_tokens': otp_data
             },
             'statistics': {
-                'total_tables': 2,
+                'total_tables': len(stats['tables']),
                 'total_users': len(users_data),
                 'total_otp_tokens': len(otp_data),
-                'database_size': 'N/A'  # Could be calculated if needed
+                'database_size': stats['database_size']
             }
         }
         
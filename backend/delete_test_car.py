@@ -1,25 +1,20 @@
-import sqlite3
+from sqlalchemy import inspect
+from app import create_app, CLI_CONFIG
+from database import db
+from models import Vehicle
 
-# Path to your database
-db_path = r'C:\Users\jayan\Desktop\Suresha Travels\backend\instance\auth.db'
+# Uses the configured database (DATABASE_URL or instance/auth.db)
+app = create_app(CLI_CONFIG)
 
-# Connect to the database
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+with app.app_context():
+    # Check if the vehicles table exists
+    if not inspect(db.engine).has_table('vehicle'):
+        print("No 'vehicles' table found. Please check your database schema.")
+        exit()
 
-# Check if the vehicles table exists
-cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-tables = [row[0] for row in cursor.fetchall()]
-if 'vehicle' not in tables:
-    print("No 'vehicles' table found. Please check your database schema.")
-    conn.close()
-    exit()
-
-# Delete the vehicle named 'Test Car'
-cursor.execute("DELETE FROM vehicle WHERE name = ?", ('Test Car',))
-conn.commit()
+    # Delete the vehicle named 'Test Car' (its bookings cascade)
+    for vehicle in Vehicle.query.filter_by(name='Test Car').all():
+        db.session.delete(vehicle)
+    db.session.commit()
 
 print("Deleted 'Test Car' from vehicle table (if it existed).")
-
-# Close the connection
-conn.close() 
\ No newline at end of file
@@ -9,13 +9,15 @@ def generate_otp(length=6):
     return ''.join(random.choices("0123456789", k=length))
 
 def send_otp(email, otp):
+    # reset_password rejects codes older than this
+    minutes = current_app.config['OTP_TTL_MINUTES']
     # Check if we're in development mode (no email config)
     if not current_app.config.get('MAIL_USERNAME') or os.getenv('FLASK_ENV') == 'development':
         # Development mode: log OTP to console instead of sending email
         print(f"\n{'='*50}")
         print(f"📧 OTP SENT TO: {email}")
         print(f"🔑 OTP CODE: {otp}")
-        print(f"⏰ Valid for 10 minutes")
+        print(f"⏰ Valid for {minutes} minutes")
         print(f"{'='*50}\n")
         return True
     
@@ -24,7 +26,7 @@ def send_otp(email, otp):
         msg = Message("Your OTP Code",
                       sender=current_app.config['MAIL_USERNAME'],
                       recipients=[email])
-        msg.body = f"Your OTP is: {otp}"
+        msg.body = f"Your OTP is: {otp}\nIt is valid for {minutes} minutes."
         mail.send(msg)
         return True
     except Exception as e:
@@ -33,6 +35,6 @@ def send_otp(email, otp):
         print(f"\n{'='*50}")
         print(f"📧 OTP SENT TO: {email}")
         print(f"🔑 OTP CODE: {otp}")
-        print(f"⏰ Valid for 10 minutes")
+        print(f"⏰ Valid for {minutes} minutes")
         print(f"{'='*50}\n")
         return True
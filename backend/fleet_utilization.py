@@ -0,0 +1,221 @@
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+from archival import union_with_archive
+from columnar import read_columns
+from database import db
+from models import Vehicle, VehicleBooking
+from snapshots import get_snapshot
+
+# Fleet utilization over a date range, from the approved vehicle bookings
+# (archived ones included) overlapping it: memory-mapped from the current
+# snapshot when there is one, otherwise one read of the live database. A
+# single sweep over the bookings, sorted by vehicle and first day, merges each
+# vehicle's bookings into busy intervals; booked days, idle streaks and the
+# fleet's concurrent demand all come from those intervals, so the cost grows
+# with the number of bookings, never with the number of days.
+
+MAX_RANGE_DAYS = 3660
+# julianday() of date.fromordinal(0), so julianday - ORDINAL_JULIAN = toordinal()
+ORDINAL_JULIAN = 1721424.5
+
+
+def _ordinal(column):
+    return cast(func.julianday(column) - ORDINAL_JULIAN, Integer)
+
+
+def _to_ordinals(julian):
+    return (julian - ORDINAL_JULIAN).astype(np.int64)
+
+
+def _fleet(vehicle_type, snapshot):
+    """
+    (ids, names, types, created_at day ordinals or -1) of the vehicles,
+    sorted by id
+    """
+    if snapshot:
+        vehicles = snapshot.table('vehicle')
+        selected = vehicles.equals('type', vehicle_type) if vehicle_type else np.ones(len(vehicles), dtype=bool)
+        order = np.flatnonzero(selected)
+        order = order[np.argsort(vehicles['id'][order], kind='stable')]
+        created = vehicles['created_at'][order]
+        return (vehicles['id'][order], vehicles.decode('name', vehicles['name'][order]),
+                vehicles.decode('type', vehicles['type'][order]),
+                np.where(np.isnan(created), -1, _to_ordinals(np.nan_to_num(created, nan=ORDINAL_JULIAN))))
+    query = Vehicle.query.order_by(Vehicle.id)
+    if vehicle_type:
+        query = query.filter_by(type=vehicle_type)
+    fleet = query.all()
+    return (np.array([vehicle.id for vehicle in fleet], dtype=np.int64), [vehicle.name for vehicle in fleet],
+            [vehicle.type for vehicle in fleet],
+            np.array([vehicle.created_at.date().toordinal() if vehicle.created_at else -1 for vehicle in fleet],
+                     dtype=np.int64))
+
+
+def _approved_bookings(first, last, snapshot):
+    """
+    (vehicle, first day, last day) ordinals of the approved bookings
+    overlapping [first, last]
+    """
+    if snapshot:
+        bookings = snapshot.table('vehicle_booking')
+        approved = np.flatnonzero(bookings.equals('status', 'approved'))
+        starts = _to_ordinals(bookings['from_date'][approved])
+        to_dates = bookings['to_date'][approved]
+        ends = np.where(np.isnan(to_dates), starts, _to_ordinals(np.nan_to_num(to_dates, nan=ORDINAL_JULIAN)))
+        overlapping = (starts <= last) & (ends >= first)
+        return bookings['vehicle_id'][approved][overlapping], starts[overlapping], ends[overlapping]
+    bookings = union_with_archive(VehicleBooking, columns=('vehicle_id', 'from_date', 'to_date', 'status'))
+    to_date = func.coalesce(bookings.c.to_date, bookings.c.from_date)
+    return read_columns(
+        db.session.connection(),
+        select(bookings.c.vehicle_id, _ordinal(bookings.c.from_date), _ordinal(to_date))
+        .where(bookings.c.status == 'approved',
+               bookings.c.from_date <= date.fromordinal(last),
+               to_date >= date.fromordinal(first)),
+        (np.int64, np.int64, np.int64)
+    )
+
+
+def _busy_intervals(vehicle_ids, available_from, last, snapshot):
+    """
+    Merge the approved bookings of the vehicles into (vehicle, start, end)
+    arrays of inclusive day ordinals, sorted by vehicle and start, clipped to
+    [available_from of the vehicle, last]
+    """
+    vehicles, starts, ends = _approved_bookings(int(available_from.min(initial=last)), last, snapshot)
+    # Sorting here is cheaper than ORDER BY over the archive union
+    order = np.lexsort((starts, vehicles))
+    vehicles, starts, ends = vehicles[order], starts[order], ends[order]
+    position = np.searchsorted(vehicle_ids, vehicles)
+    known = position < len(vehicle_ids)
+    known[known] = vehicle_ids[position[known]] == vehicles[known]
+    vehicles, position, starts, ends = vehicles[known], position[known], starts[known], ends[known]
+    starts = np.maximum(starts, available_from[position])
+    ends = np.minimum(ends, last)
+    kept = starts <= ends
+    vehicles, starts, ends = vehicles[kept], starts[kept], ends[kept]
+    if not len(vehicles):
+        return vehicles, starts, ends
+
+    # Offsetting each vehicle's days keeps the running max from crossing vehicles
+    offset = (vehicles - vehicles[0]) * (last + 2)
+    reach = np.maximum.accumulate(ends + offset)
+    # A booking opens a new interval unless it overlaps or touches the busy
+    # run before it on the same vehicle
+    opens = np.ones(len(vehicles), dtype=bool)
+    opens[1:] = (vehicles[1:] != vehicles[:-1]) | (starts[1:] + offset[1:] > reach[:-1] + 1)
+    first_rows = np.flatnonzero(opens)
+    return vehicles[first_rows], starts[first_rows], np.maximum.reduceat(ends, first_rows)
+
+
+def _peak(starts, ends):
+    """
+    Most vehicles busy on one day, and the first day it happens
+    """
+    if not len(starts):
+        return 0, None
+    days = np.concatenate([starts, ends + 1])
+    deltas = np.concatenate([np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)])
+    # Releases sort before starts on the same day
+    order = np.lexsort((deltas, days))
+    running = np.cumsum(deltas[order])
+    best = int(running.argmax())
+    return int(running[best]), date.fromordinal(int(days[order][best]))
+
+
+def _ratio(booked, available):
+    return round(booked / available, 4) if available else 0.0
+
+
+def fleet_utilization(first_day, last_day, vehicle_type=None, live=False):
+    """
+    Per-vehicle, per-type and fleet-wide utilization (booked days over days
+    the vehicle existed in the range), peak concurrent bookings and idle
+    streaks between first_day and last_day (inclusive), from the current
+    snapshot unless live
+    """
+    snapshot = None if live else get_snapshot()
+    vehicle_ids, names, types, created = _fleet(vehicle_type, snapshot)
+    first, last = first_day.toordinal(), last_day.toordinal()
+    # Days before a vehicle joined the fleet are not available days
+    available_from = np.maximum(created, first)
+    available = np.maximum(last - available_from + 1, 0)
+    vehicle_count = len(vehicle_ids)
+
+    vehicles, starts, ends = _busy_intervals(vehicle_ids, available_from, last, snapshot)
+    position = np.searchsorted(vehicle_ids, vehicles)
+    booked = np.bincount(position, weights=ends - starts + 1, minlength=vehicle_count).astype(np.int64)
+
+    # Idle streaks: the free days before each interval (since the previous one
+    # or the vehicle's first available day) and after each vehicle's last one
+    first_of_vehicle = np.ones(len(vehicles), dtype=bool)
+    first_of_vehicle[1:] = vehicles[1:] != vehicles[:-1]
+    last_of_vehicle = np.ones(len(vehicles), dtype=bool)
+    last_of_vehicle[:-1] = first_of_vehicle[1:]
+    gap_starts = np.where(first_of_vehicle, available_from[position], np.concatenate([[0], ends[:-1] + 1]))
+    has_bookings = np.zeros(vehicle_count, dtype=bool)
+    has_bookings[position] = True
+    idle = [
+        (position, gap_starts, starts - 1),
+        (position[last_of_vehicle], ends[last_of_vehicle] + 1, np.full(last_of_vehicle.sum(), last)),
+        # Vehicles with no booking are idle for their whole available window
+        (np.flatnonzero(~has_bookings), available_from[~has_bookings], np.full((~has_bookings).sum(), last)),
+    ]
+    idle_owner, idle_starts, idle_ends = (np.concatenate(parts) for parts in zip(*idle))
+    real = idle_starts <= idle_ends
+    idle_owner, idle_starts, idle_ends = idle_owner[real], idle_starts[real], idle_ends[real]
+    streak_counts = np.bincount(idle_owner, minlength=vehicle_count)
+    # Longest streak per vehicle: sort by (vehicle, length) and take each vehicle's last
+    lengths = idle_ends - idle_starts + 1
+    order = np.lexsort((-idle_starts, lengths, idle_owner))
+    longest = {}
+    if len(order):
+        tail = np.ones(len(order), dtype=bool)
+        tail[:-1] = idle_owner[order][1:] != idle_owner[order][:-1]
+        for row in order[tail].tolist():
+            longest[int(idle_owner[row])] = {
+                'days': int(lengths[row]),
+                'from': date.fromordinal(int(idle_starts[row])).isoformat(),
+                'to': date.fromordinal(int(idle_ends[row])).isoformat()
+            }
+
+    def summarize(members):
+        selected = np.isin(position, members)
+        peak, peak_date = _peak(starts[selected], ends[selected])
+        available_days, booked_days = int(available[members].sum()), int(booked[members].sum())
+        return {
+            'vehicles': len(members),
+            'available_days': available_days,
+            'booked_days': booked_days,
+            'utilization': _ratio(booked_days, available_days),
+            'peak_concurrent': peak,
+            'peak_date': peak_date.isoformat() if peak_date else None
+        }
+
+    types = np.array(types, dtype=object)
+    return {
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'source': snapshot.name if snapshot else 'live',
+        'fleet': summarize(np.arange(vehicle_count)),
+        'types': [dict(type=name, **summarize(np.flatnonzero(types == name))) for name in sorted(set(types))],
+        'vehicles': [{
+            'vehicle_id': vehicle_id,
+            'name': names[i],
+            'type': types[i],
+            'available_days': int(available[i]),
+            'booked_days': int(booked[i]),
+            'utilization': _ratio(int(booked[i]), int(available[i])),
+            'idle_streaks': int(streak_counts[i]),
+            'longest_idle_streak': longest.get(i)
+        } for i, vehicle_id in enumerate(vehicle_ids.tolist())]
+    }
+
+
+def default_range(today=None):
+    """
+    The year up to and including today
+    """
+    today = today or date.today()
+    return today - timedelta(days=364), today
@@ -0,0 +1,70 @@
+"""
+Gunicorn settings for the API.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Sizing is derived from the CPU count and can be overridden through the
+environment: WEB_CONCURRENCY (workers), GUNICORN_THREADS, GUNICORN_WORKER_CLASS
+and GUNICORN_PRELOAD=0 to let every worker load the app itself.
+"""
+import gc
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f'0.0.0.0:{os.environ.get("PORT", "5000")}')
+# Requests mostly wait on SQLite and SMTP, so a few threads per worker keep
+# CPUs busy without the memory cost of one process per concurrent request
+workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', min(max(cpus * 2, 2), 8)))
+
+# Import the app and warm its caches once in the master; workers inherit it
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then; with preload a replacement forks warm
+max_requests = 2000
+max_requests_jitter = 200
+
+# Workers share request metrics through per-process files here (see
+# metrics.py); METRICS_MULTIPROC_DIR= (empty) keeps them per worker
+os.environ.setdefault(
+    'METRICS_MULTIPROC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics')
+)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Files left by a previous server's workers would be counted as this one's
+    from metrics import clear_multiproc_dir
+    clear_multiproc_dir()
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is built and before any
+    # worker forks. Moving every live object into the permanent generation
+    # keeps the collector in the workers from writing to (and so copying)
+    # pages that are otherwise shared.
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Every worker runs a scheduler thread; the job leases let only one of
+    # them run each job
+    from scheduler import start_scheduler
+    start_scheduler(worker.wsgi)
+
+
+def child_exit(server, worker):
+    # A worker that died mid-request must not leave in-flight gauges behind,
+    # nor a recycled one a file of its own
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,268 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from database import db
+from models import ImageAsset
+
+logger = logging.getLogger(__name__)
+
+# Accepted upload types, by Pillow format name / mimetype, and their extension
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+MIMETYPES = {'image/jpeg': 'JPEG', 'image/png': 'PNG', 'image/webp': 'WEBP', 'image/gif': 'GIF'}
+
+# Derivatives are written with content-hashed names and never change, so
+# browsers and CDNs may keep them for a year without revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class ImageError(ValueError):
+    pass
+
+
+def _pillow():
+    # Imported lazily: only the derivative worker needs it, and it is optional
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None, None
+    return Image, ImageOps
+
+
+def _write_file(directory, data, extension):
+    """
+    Store data under its content hash and return the file name. Identical
+    content maps to the same, already existing file.
+    """
+    filename = f'{hashlib.sha256(data).hexdigest()[:20]}.{extension}'
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return filename
+
+
+def _url(filename):
+    return f'{current_app.config["IMAGE_URL_PATH"]}/{filename}'
+
+
+def _path(url):
+    return os.path.join(current_app.config['IMAGE_DIR'], url.rsplit('/', 1)[-1])
+
+
+def store_upload(data, mimetype=None):
+    """
+    Save an uploaded original and return (asset, created). Re-uploading the
+    same bytes returns the existing asset.
+    """
+    if not data:
+        raise ImageError('Empty file')
+    if len(data) > current_app.config['IMAGE_MAX_UPLOAD_BYTES']:
+        raise ImageError('Image is too large')
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    asset = ImageAsset.query.filter_by(content_hash=content_hash).first()
+    if asset is not None:
+        return asset, False
+
+    Image, _ = _pillow()
+    width = height = None
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image_format, (width, height) = image.format, image.size
+                image.verify()
+        except Exception:
+            raise ImageError('File is not a valid image')
+    else:
+        image_format = MIMETYPES.get(mimetype)
+    if image_format not in FORMATS:
+        raise ImageError(f'Unsupported image type; use {", ".join(sorted(FORMATS))}')
+
+    filename = _write_file(current_app.config['IMAGE_DIR'], data, FORMATS[image_format])
+    asset = ImageAsset(
+        content_hash=content_hash,
+        original_url=_url(filename),
+        content_type=f'image/{image_format.lower()}',
+        width=width,
+        height=height,
+        status='pending'
+    )
+    db.session.add(asset)
+    db.session.commit()
+    return asset, True
+
+
+def generate_derivatives(asset):
+    """
+    Write a WebP and a JPEG rendition of the original for every configured
+    size (fit within the box, never upscaled) and mark the asset ready
+    """
+    from catalog_cache import bump_catalog_version
+
+    Image, ImageOps = _pillow()
+    if Image is None:
+        logger.warning('Pillow is not installed; image %s is served full size only', asset.id)
+        return asset
+
+    directory = current_app.config['IMAGE_DIR']
+    variants = {}
+    try:
+        with Image.open(_path(asset.original_url)) as original:
+            original = ImageOps.exif_transpose(original)
+            for size, box in current_app.config['IMAGE_SIZES'].items():
+                image = original.copy()
+                image.thumbnail(box, Image.LANCZOS)
+                has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+                renditions = {'width': image.width, 'height': image.height}
+
+                buffer = io.BytesIO()
+                image.convert('RGBA' if has_alpha else 'RGB').save(buffer, 'WEBP', quality=80, method=4)
+                renditions['webp'] = _url(_write_file(directory, buffer.getvalue(), 'webp'))
+
+                buffer = io.BytesIO()
+                image.convert('RGB').save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+                renditions['jpeg'] = _url(_write_file(directory, buffer.getvalue(), 'jpg'))
+                variants[size] = renditions
+    except Exception as e:
+        asset.status = 'failed'
+        asset.error = str(e)
+        asset.processed_at = datetime.utcnow()
+        db.session.commit()
+        logger.warning('Could not process image %s: %s', asset.id, e)
+        return asset
+
+    asset.variants = json.dumps(variants)
+    asset.status = 'ready'
+    asset.error = None
+    asset.processed_at = datetime.utcnow()
+    # Listings switch to the small renditions as soon as they exist
+    bump_catalog_version('tours', 'destinations', 'vehicles')
+    db.session.commit()
+    return asset
+
+
+def _process_in_background(app, asset_id):
+    with app.app_context():
+        try:
+            asset = db.session.get(ImageAsset, asset_id)
+            if asset is not None and asset.status == 'pending':
+                generate_derivatives(asset)
+        finally:
+            db.session.remove()
+
+
+def submit_derivatives(asset):
+    """
+    Queue derivative generation on this process's background worker, or run
+    it right away when IMAGE_BACKGROUND_PROCESSING is off
+    """
+    global _executor
+    if not current_app.config['IMAGE_BACKGROUND_PROCESSING']:
+        generate_derivatives(asset)
+        return None
+    with _executor_lock:
+        # Created lazily so no thread exists before gunicorn forks
+        if _executor is None:
+            _executor = ThreadPoolExecutor(current_app.config['IMAGE_WORKER_THREADS'], thread_name_prefix='images')
+        future = _executor.submit(_process_in_background, current_app._get_current_object(), asset.id)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+
+def wait_for_derivatives(timeout=None):
+    """
+    Block until every queued image has been processed
+    """
+    wait(list(_pending), timeout=timeout)
+
+
+def serialize_asset(asset):
+    return {
+        'id': asset.id,
+        'url': asset.original_url,
+        'content_type': asset.content_type,
+        'width': asset.width,
+        'height': asset.height,
+        'status': asset.status,
+        'variants': json.loads(asset.variants) if asset.variants else {},
+        'error': asset.error,
+        'created_at': asset.created_at.isoformat() if asset.created_at else None
+    }
+
+
+def get_variant_map(connection=None):
+    """
+    Return {original_url: variants} for every processed image, in one query
+    """
+    statement = select(ImageAsset.original_url, ImageAsset.variants).where(ImageAsset.status == 'ready')
+    try:
+        rows = (connection or db.session).execute(statement).all()
+    except OperationalError as e:
+        # Database not migrated yet: listings keep using the originals
+        logger.warning('Image variants unavailable: %s', e)
+        return {}
+    return {url: json.loads(variants) for url, variants in rows}
+
+
+def listing_images(image_url, variant_map):
+    """
+    Small image URLs for listing cards, falling back to the original for
+    external or not yet processed images
+    """
+    variants = variant_map.get(image_url) if image_url else None
+    if not variants:
+        return {'thumbnail_url': image_url, 'card_url': image_url}
+    return {'thumbnail_url': variants['thumb']['webp'], 'card_url': variants['card']['webp']}
+
+
+def init_images(app):
+    """
+    Configure image storage and serve stored images with immutable caching
+    """
+    app.config.setdefault('IMAGE_DIR', os.path.join(app.static_folder, 'images'))
+    # Set to an absolute URL (e.g. https://api.example.com/static/images) when
+    # the frontend is served from another origin
+    app.config.setdefault('IMAGE_URL_PATH', os.environ.get('IMAGE_URL_PATH', f'{app.static_url_path}/images'))
+    app.config.setdefault('IMAGE_SIZES', {'thumb': (320, 240), 'card': (800, 600)})
+    app.config.setdefault('IMAGE_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+    app.config.setdefault('IMAGE_WORKER_THREADS', 1)
+    app.config.setdefault('IMAGE_BACKGROUND_PROCESSING', True)
+
+    @app.after_request
+    def cache_stored_images(response):
+        if request.endpoint == 'static' and response.status_code in (200, 304) and \
+                request.view_args.get('filename', '').startswith('images/'):
+            response.cache_control.public = True
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+
+if __name__ == '__main__':
+    # python images.py process  -- (re)generate derivatives for pending/failed images
+    from app import create_app, CLI_CONFIG
+    if sys.argv[1:] != ['process']:
+        sys.exit('usage: python images.py process')
+    with create_app(CLI_CONFIG).app_context():
+        assets = ImageAsset.query.filter(ImageAsset.status != 'ready').all()
+        for asset in assets:
+            generate_derivatives(asset)
+            print(f'image {asset.id}: {asset.status}')
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, delete, or_, select, update
+from archival import BATCH_SIZE, archive_bookings
+from booking_events import RETENTION_DAYS, record_events
+from booking_summaries import apply_summary_delta
+from catalog_cache import bump_catalog_version
+from database import db
+from models import Booking, BookingEvent, TourDate, VehicleBooking
+from scheduler import job
+from snapshots import build_snapshot
+from user_bookings import bump_bookings_version
+
+# Built-in periodic jobs. Each works in batches of BATCH_SIZE rows with one
+# short transaction per batch, and returns how many rows it touched.
+
+
+def _expire_booking_batch(cutoff, batch_size):
+    """
+    Cancel one batch of unpaid bookings made before cutoff and give their
+    seats back. Returns (bookings expired, seats released).
+    """
+    bookings = Booking.__table__
+    stale = (
+        (bookings.c.booking_status == 'pending')
+        & (bookings.c.payment_status == 'pending')
+        & (bookings.c.created_at < cutoff)
+    )
+    # The status checks are repeated in the UPDATE, so a booking paid since
+    # the SELECT is left alone
+    expired = db.session.execute(
+        update(bookings)
+        .where(bookings.c.id.in_(select(bookings.c.id).where(stale).limit(batch_size)), stale)
+        .values(booking_status='cancelled', payment_status='expired')
+        .returning(bookings.c.id, bookings.c.user_id, bookings.c.tour_id, bookings.c.tour_date_id,
+                   bookings.c.number_of_participants, bookings.c.total_price)
+    ).all()
+    if not expired:
+        return 0, 0
+
+    # tour_date_id -> [tour_id, bookings, participants, revenue]
+    per_date = {}
+    for row in expired:
+        totals = per_date.setdefault(row.tour_date_id, [row.tour_id, 0, 0, 0.0])
+        totals[1] += 1
+        totals[2] += row.number_of_participants
+        totals[3] += row.total_price
+    db.session.execute(
+        update(TourDate.__table__)
+        .where(TourDate.__table__.c.id == bindparam('date_id'))
+        .values(available_seats=TourDate.__table__.c.available_seats + bindparam('released')),
+        [{'date_id': date_id, 'released': totals[2]} for date_id, totals in per_date.items()]
+    )
+    departures = dict(db.session.execute(
+        select(TourDate.id, TourDate.departure_date).where(TourDate.id.in_(per_date))
+    ).all())
+    for date_id, (tour_id, count, participants, revenue) in per_date.items():
+        apply_summary_delta(tour_id, date_id, departures[date_id], (-count, -participants, -revenue, count))
+    record_events([{
+        'user_id': row.user_id, 'booking_type': 'tour', 'booking_id': row.id, 'event': 'expired',
+        'status': 'cancelled', 'payment_status': 'expired'
+    } for row in expired])
+    bump_catalog_version('tours')
+    bump_bookings_version(*{row.user_id for row in expired})
+    db.session.commit()
+    return len(expired), sum(totals[2] for totals in per_date.values())
+
+
+@job('expire_unpaid_bookings', interval=300)
+def expire_unpaid_bookings():
+    """
+    Cancel pending, unpaid tour bookings older than BOOKING_HOLD_MINUTES and
+    release the seats they hold
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=current_app.config['BOOKING_HOLD_MINUTES'])
+    expired = released = 0
+    while True:
+        count, seats = _expire_booking_batch(cutoff, BATCH_SIZE)
+        expired += count
+        released += seats
+        if count < BATCH_SIZE:
+            return {'bookings_expired': expired, 'seats_released': released}
+
+
+@job('expire_vehicle_requests', interval=900)
+def expire_vehicle_requests():
+    """
+    Mark pending vehicle requests as expired once they are older than
+    VEHICLE_REQUEST_TTL_HOURS or their first day has passed
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=current_app.config['VEHICLE_REQUEST_TTL_HOURS'])
+    stale = (VehicleBooking.status == 'pending') & or_(
+        VehicleBooking.created_at < cutoff, VehicleBooking.from_date < now.date()
+    )
+    expired = 0
+    while True:
+        # Pending requests have no slot rows, so a plain UPDATE is enough
+        rows = db.session.execute(
+            update(VehicleBooking)
+            .where(VehicleBooking.id.in_(select(VehicleBooking.id).where(stale).limit(BATCH_SIZE)), stale)
+            .values(status='expired')
+            .returning(VehicleBooking.id, VehicleBooking.user_id),
+            execution_options={'synchronize_session': False}
+        ).all()
+        record_events([{
+            'user_id': row.user_id, 'booking_type': 'vehicle', 'booking_id': row.id, 'event': 'expired',
+            'status': 'expired'
+        } for row in rows])
+        db.session.commit()
+        count = len(rows)
+        expired += count
+        if count < BATCH_SIZE:
+            return {'vehicle_requests_expired': expired}
+
+
+@job('archive_bookings', interval=24 * 60 * 60)
+def archive_finished_bookings():
+    """
+    Move finished bookings to the archive tables and purge expired
+    password-reset codes (see archival.py)
+    """
+    return archive_bookings()
+
+
+@job('build_snapshots', interval=15 * 60)
+def build_snapshots():
+    """
+    Write and publish a columnar snapshot of the reporting tables for the
+    admin reports (see snapshots.py), unless SNAPSHOT_DIR is unset
+    """
+    if not current_app.config.get('SNAPSHOT_DIR'):
+        return {}
+    manifest = build_snapshot()
+    return {f'{table}_rows': info['rows'] for table, info in manifest['tables'].items()}
+
+
+@job('purge_booking_events', interval=24 * 60 * 60)
+def purge_booking_events():
+    """
+    Delete streamed booking events older than EVENTS_RETENTION_DAYS; clients
+    that were away longer resume from the oldest one kept
+    """
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    purged = 0
+    while True:
+        count = db.session.execute(
+            delete(BookingEvent).where(BookingEvent.id.in_(
+                select(BookingEvent.id).where(BookingEvent.created_at < cutoff).limit(BATCH_SIZE)
+            ))
+        ).rowcount
+        db.session.commit()
+        purged += count
+        if count < BATCH_SIZE:
+            return {'booking_events_purged': purged}
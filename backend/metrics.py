@@ -0,0 +1,280 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from flask import Blueprint, Response, g, request
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Counters of worker processes that have exited (see mark_process_dead)
+EXITED_FILE = 'metrics_exited.json'
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+class MetricsStore:
+    """
+    Request metrics for one process. When a multiprocess directory is set,
+    the process snapshots its metrics to its own file there (at most once per
+    flush interval) so any worker can serve totals for the whole server.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}   # (blueprint, endpoint, method, status) -> count
+        self.latency = {}    # (blueprint, endpoint, method) -> [bucket counts..., +Inf count, sum]
+        self.in_flight = {}  # (blueprint, endpoint) -> count
+        self.multiproc_dir = None
+        self.flush_interval = 1.0
+        self.last_flush = 0.0
+
+    def configure(self, multiproc_dir=None, flush_interval=1.0):
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+            # Don't lose the last partial interval when a worker exits cleanly
+            atexit.register(self.flush)
+
+    def start(self, blueprint, endpoint):
+        key = (blueprint, endpoint)
+        with self.lock:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finish(self, blueprint, endpoint, method, status, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            key = (blueprint, endpoint)
+            self.in_flight[key] = self.in_flight.get(key, 1) - 1
+            key = (blueprint, endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            key = (blueprint, endpoint, method)
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+            flush = self.multiproc_dir and time.monotonic() - self.last_flush >= self.flush_interval
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return _snapshot(os.getpid(), self.requests, self.latency, self.in_flight)
+
+    def flush(self):
+        # A process that served nothing (the gunicorn master) leaves no file
+        if not self.multiproc_dir or not (self.requests or self.in_flight):
+            return
+        self.last_flush = time.monotonic()
+        path = os.path.join(self.multiproc_dir, f'metrics_{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Metrics must never fail a request; the next flush will retry
+            pass
+
+    def collect(self):
+        """
+        Merge this process's live metrics with the snapshots of every other
+        process. Counters and histograms are cumulative and always summed;
+        in-flight gauges only count for processes that are still running.
+        """
+        snapshots = [self.snapshot()]
+        if self.multiproc_dir:
+            own_pid = os.getpid()
+            for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics_*.json')):
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if data['pid'] == own_pid:
+                    continue
+                if data['in_flight'] and not process_alive(data['pid']):
+                    data['in_flight'] = []
+                snapshots.append(data)
+        return _merge(snapshots)
+
+
+def _snapshot(pid, requests, latency, in_flight):
+    return {
+        'pid': pid,
+        'requests': [list(key) + [count] for key, count in requests.items()],
+        'latency': [list(key) + [list(histogram)] for key, histogram in latency.items()],
+        'in_flight': [list(key) + [count] for key, count in in_flight.items()]
+    }
+
+
+def _merge(snapshots):
+    requests, latency, in_flight = {}, {}, {}
+    for data in snapshots:
+        for *key, count in data['requests']:
+            key = tuple(key)
+            requests[key] = requests.get(key, 0) + count
+        for *key, histogram in data['latency']:
+            key = tuple(key)
+            merged = latency.get(key)
+            latency[key] = histogram if merged is None else [a + b for a, b in zip(merged, histogram)]
+        for *key, count in data['in_flight']:
+            key = tuple(key)
+            in_flight[key] = in_flight.get(key, 0) + count
+    return requests, latency, in_flight
+
+
+def process_alive(pid):
+    """
+    Whether a process with this pid still exists (also used by rate_limits)
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+store = MetricsStore()
+
+
+def _multiproc_dir(multiproc_dir=None):
+    return multiproc_dir or store.multiproc_dir or os.environ.get('METRICS_MULTIPROC_DIR')
+
+
+def _write_json(path, data):
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def mark_process_dead(pid, multiproc_dir=None):
+    """
+    Fold an exited worker's counters into the file shared by all exited
+    workers and delete its own file, dropping its in-flight gauge. Run from
+    gunicorn's child_exit hook, in the master, so the directory holds one
+    file per live worker however often workers are recycled.
+    """
+    multiproc_dir = _multiproc_dir(multiproc_dir)
+    if not multiproc_dir:
+        return
+    path = os.path.join(multiproc_dir, f'metrics_{pid}.json')
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = None
+    if data is not None:
+        exited_path = os.path.join(multiproc_dir, EXITED_FILE)
+        try:
+            with open(exited_path) as f:
+                exited = [json.load(f)]
+        except (OSError, ValueError):
+            exited = []
+        requests, latency, _ = _merge(exited + [data])
+        _write_json(exited_path, _snapshot(None, requests, latency, {}))
+    for stale in (path, f'{path}.tmp'):
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+
+
+def clear_multiproc_dir(multiproc_dir=None):
+    """
+    Delete every process's metrics file, e.g. from gunicorn's on_starting
+    hook so a new server does not count a previous one's requests
+    """
+    multiproc_dir = _multiproc_dir(multiproc_dir)
+    if not multiproc_dir:
+        return
+    for path in glob.glob(os.path.join(multiproc_dir, 'metrics_*.json*')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _labels(names, values):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+
+
+def render_metrics():
+    requests, latency, in_flight = store.collect()
+    lines = [
+        '# HELP http_requests_total Total HTTP requests by endpoint, method and status.',
+        '# TYPE http_requests_total counter'
+    ]
+    for key, count in sorted(requests.items()):
+        lines.append(f'http_requests_total{{{_labels(("blueprint", "endpoint", "method", "status"), key)}}} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by endpoint and method.',
+        '# TYPE http_request_duration_seconds histogram'
+    ]
+    for key, histogram in sorted(latency.items()):
+        labels = _labels(('blueprint', 'endpoint', 'method'), key)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram[:-1]):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests currently being served.',
+        '# TYPE http_requests_in_flight gauge'
+    ]
+    for key, count in sorted(in_flight.items()):
+        lines.append(f'http_requests_in_flight{{{_labels(("blueprint", "endpoint"), key)}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def _route_labels():
+    return request.blueprint or 'app', request.endpoint or 'unmatched'
+
+
+def init_metrics(app):
+    """
+    Record request counts, latency histograms, status codes and in-flight
+    requests per endpoint, and serve them at /metrics
+    """
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_MULTIPROC_DIR', os.environ.get('METRICS_MULTIPROC_DIR'))
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    store.configure(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    app.register_blueprint(metrics_bp)
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        store.start(*_route_labels())
+
+    @app.after_request
+    def capture_response_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        store.finish(*_route_labels(), request.method, g.pop('_metrics_status', 500), time.perf_counter() - started)
@@ -1,4 +1,4 @@
-from app import app
+from app import create_app, CLI_CONFIG
 from database import db
 from models import User, Destination, Tour, TourDate, Booking, Review
 from datetime import datetime, timedelta
@@ -9,7 +9,8 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-def init_db():
+def init_db(app=None):
+    app = app or create_app(CLI_CONFIG)
     with app.app_context():
         # Create tables
         db.create_all()
@@ -153,9 +154,45 @@ def migrate_vehicle_booking_dates():
         db.session.execute(text('ALTER TABLE vehicle_booking ADD COLUMN time VARCHAR(20)'))
     except Exception:
         pass
+    try:
+        db.session.execute(text('ALTER TABLE vehicle_booking ADD COLUMN start_time TIME'))
+    except Exception:
+        pass
+    try:
+        db.session.execute(text('ALTER TABLE vehicle_booking ADD COLUMN end_time TIME'))
+    except Exception:
+        pass
     # The old 'date' column does not exist, so we skip copying data
         db.session.commit()
 
+def migrate_user_bookings_version():
+    # Version counter keying each user's cached booking pages (see user_bookings.py)
+    try:
+        db.session.execute(text('ALTER TABLE user ADD COLUMN bookings_version INTEGER NOT NULL DEFAULT 0'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+def migrate_new_tables():
+    # Tables added since the database was initialised (catalog versions,
+    # uploaded images, ...); existing tables are left untouched
+    db.create_all()
+
+def migrate_vehicle_slots():
+    from vehicle_slots import rebuild_slots
+    # Structured start times from the free-form 'HH:MM' time column, then
+    # index every approved booking. Only real times of day (00:00-23:59) are
+    # copied; anything else would break parsing the start time.
+    db.session.execute(text(
+        "UPDATE vehicle_booking SET start_time = substr('0' || time, -5) || '\\:00.000000' "
+        "WHERE start_time IS NULL AND (time GLOB '[01][0-9]:[0-5][0-9]' OR time GLOB '2[0-3]:[0-5][0-9]' "
+        "OR time GLOB '[0-9]:[0-5][0-9]')"
+    ))
+    rebuild_slots()
+
 if __name__ == '__main__':
-    with app.app_context():
-        migrate_vehicle_booking_dates() 
\ No newline at end of file
+    with create_app(CLI_CONFIG).app_context():
+        migrate_vehicle_booking_dates()
+        migrate_user_bookings_version()
+        migrate_new_tables()
+        migrate_vehicle_slots()
\ No newline at end of file
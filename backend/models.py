@@ -10,6 +10,8 @@ class User(db.Model):
     phone = db.Column(db.String(20))
     address = db.Column(db.String(200))
     is_admin = db.Column(db.Boolean, default=False)
+    # Bumped with every change to the user's bookings; keys their cached pages (user_bookings.py)
+    bookings_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     bookings = db.relationship('Booking', backref='user', lazy=True)
     reviews = db.relationship('Review', backref='user', lazy=True)
     vehicle_bookings = db.relationship('VehicleBooking', backref='user', lazy=True)
@@ -63,7 +65,7 @@ class Booking(db.Model):
     number_of_participants = db.Column(db.Integer, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
     booking_status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
-    payment_status = db.Column(db.String(20), default='pending')  # pending, paid, refunded
+    payment_status = db.Column(db.String(20), default='pending')  # pending, paid, refunded, expired
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     special_requests = db.Column(db.Text)
     tour_date = db.relationship('TourDate', backref='bookings', lazy=True)
@@ -94,9 +96,175 @@ class VehicleBooking(db.Model):
     # Deprecated: date = db.Column(db.Date, nullable=False)
     from_date = db.Column(db.Date, nullable=False)
     to_date = db.Column(db.Date, nullable=True)  # If null or same as from_date, it's a single-day booking
-    time = db.Column(db.String(20), nullable=True)  # For single-day bookings (e.g., '10:00', '14:30')
-    status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
+    time = db.Column(db.String(20), nullable=True)  # Legacy display copy of start_time (e.g., '10:00', '14:30')
+    start_time = db.Column(db.Time, nullable=True)  # Start on from_date; null means from midnight
+    end_time = db.Column(db.Time, nullable=True)  # End on to_date; null means until the end of the day
+    status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, expired
     from_place = db.Column(db.String(120), nullable=False)
     to_place = db.Column(db.String(120), nullable=False)
     travel_details = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    slots = db.relationship('VehicleSlot', backref='booking', lazy=True, cascade="all, delete-orphan")
+
+# --- Vehicle availability index ---
+# One row per approved vehicle booking and day it touches, with the minutes
+# of that day it occupies; maintained by vehicle_slots.py on every flush
+class VehicleSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('vehicle_booking.id', ondelete='CASCADE'), nullable=False, index=True)
+    start_minute = db.Column(db.Integer, nullable=False)  # Minutes after midnight, inclusive
+    end_minute = db.Column(db.Integer, nullable=False)  # Exclusive; 1440 = end of day
+    __table_args__ = (db.Index('ix_vehicle_slot_vehicle_day', 'vehicle_id', 'day'),)
+
+# One row per vehicle, upserted by vehicle_slots.lock_vehicles at the start of
+# every vehicle booking write: the row lock (on SQLite, the write lock it
+# takes) serializes conflict checks on a vehicle until the writer commits.
+# No foreign key, so taking a lock never fails.
+class VehicleLock(db.Model):
+    vehicle_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped by every lock taken
+
+# --- Archive ---
+# Finished, cancelled and rejected bookings are moved here by archival.py so
+# the hot tables only hold rows that can still change. Columns mirror the hot
+# tables (ids are kept) without foreign keys, so tours, dates and vehicles can
+# be removed without touching history.
+class BookingArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    tour_id = db.Column(db.Integer, nullable=False)
+    tour_date_id = db.Column(db.Integer, nullable=False)
+    number_of_participants = db.Column(db.Integer, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    booking_status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    special_requests = db.Column(db.Text)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user = db.relationship('User', primaryjoin='foreign(BookingArchive.user_id) == User.id', viewonly=True)
+    tour = db.relationship('Tour', primaryjoin='foreign(BookingArchive.tour_id) == Tour.id', viewonly=True)
+    tour_date = db.relationship('TourDate', primaryjoin='foreign(BookingArchive.tour_date_id) == TourDate.id', viewonly=True)
+
+class VehicleBookingArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    vehicle_id = db.Column(db.Integer, nullable=False, index=True)
+    from_date = db.Column(db.Date, nullable=False)
+    to_date = db.Column(db.Date)
+    time = db.Column(db.String(20))
+    start_time = db.Column(db.Time)
+    end_time = db.Column(db.Time)
+    status = db.Column(db.String(20))
+    from_place = db.Column(db.String(120), nullable=False)
+    to_place = db.Column(db.String(120), nullable=False)
+    travel_details = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user = db.relationship('User', primaryjoin='foreign(VehicleBookingArchive.user_id) == User.id', viewonly=True)
+    vehicle = db.relationship('Vehicle', primaryjoin='foreign(VehicleBookingArchive.vehicle_id) == Vehicle.id', viewonly=True)
+
+# --- Admin reporting summaries ---
+# Maintained incrementally by booking_summaries.py in the same transaction as
+# the booking change. bookings/participants/revenue count active (non-cancelled)
+# bookings; cancellations counts cancelled ones.
+class TourSummary(db.Model):
+    tour_id = db.Column(db.Integer, db.ForeignKey('tour.id', ondelete='CASCADE'), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    participants = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TourDateSummary(db.Model):
+    tour_date_id = db.Column(db.Integer, db.ForeignKey('tour_date.id', ondelete='CASCADE'), primary_key=True)
+    tour_id = db.Column(db.Integer, db.ForeignKey('tour.id', ondelete='CASCADE'), nullable=False, index=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    participants = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MonthlySummary(db.Model):
+    month = db.Column(db.String(7), primary_key=True)  # Departure month, 'YYYY-MM'
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    participants = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- Read-mostly catalog cache ---
+# One row per cached catalog (tours, destinations, vehicles); bumped in the
+# same transaction as any change to its data so every worker's copy can be
+# checked with a single primary-key read. See catalog_cache.py.
+class CatalogVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# --- Uploaded images ---
+# Originals and their resized derivatives live under static/images with
+# content-hashed names; see images.py
+class ImageAsset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)
+    original_url = db.Column(db.String(500), unique=True, nullable=False)
+    content_type = db.Column(db.String(50))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    status = db.Column(db.String(20), default='pending')  # pending, ready, failed
+    variants = db.Column(db.Text)  # JSON: {size: {format: url, ..., 'width': w, 'height': h}}
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+# --- Background jobs ---
+# One lease row per job: the worker that claims it runs the job, so each job
+# runs once per interval however many workers run a scheduler. See scheduler.py
+class JobLease(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(200))
+    expires_at = db.Column(db.DateTime, nullable=False)
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+
+class JobRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    owner = db.Column(db.String(200))
+    started_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Float)
+    rows_touched = db.Column(db.Integer, default=0)
+    details = db.Column(db.Text)  # JSON: {counter: rows}
+    status = db.Column(db.String(20))  # success, failed
+    error = db.Column(db.Text)
+
+# --- Pricing rules ---
+# Layered on top of tour.price * tour_date.price_modifier by pricing.py.
+# A rule without tour_id applies to every tour.
+class PricingRule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # season, group, early_bird
+    tour_id = db.Column(db.Integer, db.ForeignKey('tour.id', ondelete='CASCADE'), nullable=True)
+    modifier = db.Column(db.Float, nullable=False)  # Multiplies the per-person price (0.9 = 10% off)
+    start_date = db.Column(db.Date)  # season: departures from this day...
+    end_date = db.Column(db.Date)  # ...up to and including this one
+    min_participants = db.Column(db.Integer)  # group: bookings of at least this many people
+    min_days_before = db.Column(db.Integer)  # early_bird: booked at least this many days ahead
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- Booking events ---
+# Outbox of booking lifecycle changes, written in the same transaction as the
+# change and streamed to the booking's user and to admins by booking_events.py.
+# The id is the stream's resume cursor, so it is never reused.
+class BookingEvent(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # Owner of the booking; no FK so events outlive users
+    booking_type = db.Column(db.String(20), nullable=False)  # tour, vehicle
+    booking_id = db.Column(db.Integer, nullable=False)
+    event = db.Column(db.String(20), nullable=False)  # created, updated, cancelled, approved, rejected, expired
+    status = db.Column(db.String(20))  # Booking status after the change
+    payment_status = db.Column(db.String(20))  # Tour bookings only
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,177 @@
+import os
+import threading
+import weakref
+from datetime import date, datetime
+import numpy as np
+from sqlalchemy import event, inspect, select
+from catalog_cache import bump_catalog_version, catalog_version
+from database import db
+from models import PricingRule, Tour, TourDate
+
+# Quotes are priced from a PriceBook: every departure's base price and every
+# active pricing rule, loaded once per process into NumPy arrays. A batch of
+# quotes is then a handful of array operations however many it holds. The
+# book is rebuilt when the 'pricing' version is bumped, which happens in the
+# same transaction as any change to a price, a departure or a rule.
+#
+# Layering: the per-person price is tour.price * tour_date.price_modifier,
+# multiplied by at most one rule of each kind. Among the rules of a kind that
+# match, a tour's own rule beats a global one and a newer rule an older one.
+
+KINDS = ('season', 'group', 'early_bird')
+MAX_QUOTES = int(os.environ.get('PRICING_MAX_QUOTES', 10000))
+# Changes to these fields move prices; seat counts do not
+PRICED_FIELDS = {Tour: ('price',), TourDate: ('tour_id', 'departure_date', 'price_modifier')}
+
+_lock = threading.Lock()
+# engine -> (version, PriceBook)
+_books = weakref.WeakKeyDictionary()
+
+
+class PriceBook:
+    def __init__(self, dates, rules):
+        dates = sorted(dates)
+        self.date_ids = np.array([row[0] for row in dates], dtype=np.int64)
+        self.date_tours = np.array([row[1] for row in dates], dtype=np.int64)
+        self.date_days = np.array([row[2].toordinal() for row in dates], dtype=np.int64)
+        self.date_bases = np.array([row[3] * (row[4] if row[4] is not None else 1.0) for row in dates],
+                                   dtype=np.float64)
+
+        # Per kind, the rules in rank order: global before tour-specific, old before new
+        self.rules = {}
+        for kind in KINDS:
+            ranked = sorted((rule for rule in rules if rule.kind == kind),
+                            key=lambda rule: (rule.tour_id is not None, rule.id))
+            self.rules[kind] = {
+                'tour': np.array([rule.tour_id or -1 for rule in ranked], dtype=np.int64),
+                'modifier': np.array([rule.modifier for rule in ranked], dtype=np.float64),
+                'start': np.array([rule.start_date.toordinal() if rule.start_date else 0 for rule in ranked],
+                                  dtype=np.int64),
+                'end': np.array([rule.end_date.toordinal() if rule.end_date else date.max.toordinal()
+                                 for rule in ranked], dtype=np.int64),
+                'min_participants': np.array([rule.min_participants or 0 for rule in ranked], dtype=np.int64),
+                'min_days_before': np.array([rule.min_days_before or 0 for rule in ranked], dtype=np.int64),
+            }
+
+    def _factor(self, kind, tours, match):
+        """
+        Modifier of the highest-ranked rule of a kind matching each quote (1.0
+        if none). match holds the kind's own conditions, quotes x rules.
+        """
+        rules = self.rules[kind]
+        if not len(rules['modifier']):
+            return np.ones(len(tours))
+        match &= (rules['tour'] == -1) | (rules['tour'] == tours[:, None])
+        ranked = np.where(match, np.arange(len(rules['modifier'])), -1)
+        best = ranked.max(axis=1)
+        return np.where(best >= 0, rules['modifier'][best], 1.0)
+
+    def quote(self, tour_date_ids, participants, booked_on):
+        """
+        Price every (tour_date_id, participants) pair for a booking made on
+        booked_on. Returns a dict of arrays; raises KeyError for unknown dates.
+        """
+        tour_date_ids = np.asarray(tour_date_ids, dtype=np.int64)
+        participants = np.asarray(participants, dtype=np.int64)
+        index = np.searchsorted(self.date_ids, tour_date_ids)
+        found = index < len(self.date_ids)
+        found[found] = self.date_ids[index[found]] == tour_date_ids[found]
+        if not found.all():
+            raise KeyError(int(tour_date_ids[~found][0]))
+
+        tours = self.date_tours[index]
+        days = self.date_days[index]
+        season = self.rules['season']
+        factors = {
+            'season': self._factor('season', tours, (season['start'] <= days[:, None]) & (days[:, None] <= season['end'])),
+            'group': self._factor('group', tours, participants[:, None] >= self.rules['group']['min_participants']),
+            'early_bird': self._factor('early_bird', tours, (days - booked_on.toordinal())[:, None]
+                                       >= self.rules['early_bird']['min_days_before']),
+        }
+        unit_prices = np.round(self.date_bases[index] * factors['season'] * factors['group'] * factors['early_bird'], 2)
+        return {
+            'tour_id': tours,
+            'unit_price': unit_prices,
+            'total_price': np.round(unit_prices * participants, 2),
+            **factors
+        }
+
+
+def _load_book():
+    dates = db.session.execute(
+        select(TourDate.id, TourDate.tour_id, TourDate.departure_date, Tour.price, TourDate.price_modifier)
+        .join(Tour, TourDate.tour_id == Tour.id)
+    ).all()
+    dates = [(row[0], row[1], row[2].date() if isinstance(row[2], datetime) else row[2], row[3], row[4])
+             for row in dates]
+    return PriceBook(dates, PricingRule.query.filter_by(active=True).all())
+
+
+def get_price_book():
+    """
+    This process's PriceBook, rebuilt if prices or rules changed since it was
+    loaded
+    """
+    engine = db.engine
+    version = catalog_version('pricing')
+    if version is None:
+        return _load_book()
+    entry = _books.get(engine)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    book = _load_book()
+    with _lock:
+        _books[engine] = (version, book)
+    return book
+
+
+def quote_prices(tour_date_ids, participants, booked_on=None):
+    """
+    Quote many (tour_date_id, participants) pairs in one vectorized pass; see
+    PriceBook.quote
+    """
+    return get_price_book().quote(tour_date_ids, participants, booked_on or datetime.utcnow().date())
+
+
+def quote_booking(tour_date_id, participants, booked_on=None):
+    """
+    Total price of one booking
+    """
+    return float(quote_prices([tour_date_id], [participants], booked_on)['total_price'][0])
+
+
+def listed_prices(tour_date_ids, booked_on=None):
+    """
+    Per-person price of each departure, by id, as a one-person booking made
+    on booked_on (today) would be charged; what the tour listings show
+    """
+    tour_date_ids = list(tour_date_ids)
+    if not tour_date_ids:
+        return {}
+    quoted = quote_prices(tour_date_ids, [1] * len(tour_date_ids), booked_on)
+    return dict(zip(tour_date_ids, quoted['unit_price'].tolist()))
+
+
+def reset_price_books():
+    with _lock:
+        _books.clear()
+
+
+def _changes_prices(session):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, (PricingRule, Tour, TourDate)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, PricingRule):
+            return True
+        fields = PRICED_FIELDS.get(type(obj), ())
+        if any(inspect(obj).attrs[name].history.has_changes() for name in fields):
+            return True
+    return False
+
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_changed_prices(session, flush_context):
+    if _changes_prices(session):
+        # The tour catalog lists quoted prices
+        bump_catalog_version('pricing', 'tours', connection=session.connection())
@@ -0,0 +1,282 @@
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import Blueprint, current_app, g, jsonify, request, send_file
+from routes.auth_routes import admin_required, load_token_user
+
+profiling_bp = Blueprint('profiling_bp', __name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+_request_counter = itertools.count(1)
+_profile_counter = itertools.count(1)
+# From Python 3.12 cProfile runs on sys.monitoring, which allows one active
+# profiler per process rather than one per thread
+_cprofile_exclusive = threading.Lock() if sys.version_info >= (3, 12) else None
+
+
+class StackSampler:
+    """
+    Statistical profiler: samples one thread's stack at a fixed interval and
+    counts identical stacks, which is directly usable as flamegraph input
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+
+def _function_label(func):
+    filename, line, name = func
+    return f'{name} ({os.path.basename(filename)}:{line})' if line else name
+
+
+def pstats_to_collapsed(stats, max_depth=64):
+    """
+    Approximate collapsed stacks from cProfile's caller graph. Each function's
+    own time is split across call paths in proportion to the cumulative time
+    spent along each caller edge. Values are in microseconds.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, entry in stats.items() if not entry[4]]
+    lines = {}
+
+    def walk(func, path, fraction):
+        if fraction <= 0 or len(path) > max_depth:
+            return
+        path = path + [_function_label(func)]
+        own_time = stats[func][2] * fraction
+        if own_time > 0:
+            key = ';'.join(path)
+            lines[key] = lines.get(key, 0) + own_time
+        total = stats[func][3]
+        for callee, edge_time in callees.get(func, []):
+            if callee == func or _function_label(callee) in path or not total:
+                continue
+            walk(callee, path, fraction * min(edge_time / total, 1.0))
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return ''.join(
+        f'{stack} {int(round(value * 1e6))}\n' for stack, value in sorted(lines.items()) if value * 1e6 >= 0.5
+    )
+
+
+def _profile_dir():
+    return current_app.config['PROFILE_DIR']
+
+
+def _requester_is_admin():
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return False
+    try:
+        user = load_token_user(auth_header.split(' ')[1])
+    except Exception:
+        return False
+    return bool(user and user.is_admin)
+
+
+def _requested_mode():
+    flag = request.headers.get('X-Profile') or request.args.get('__profile')
+    if flag and _requester_is_admin():
+        return flag if flag in PROFILE_MODES else 'cprofile'
+    sample_rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if sample_rate and next(_request_counter) % sample_rate == 0:
+        return current_app.config['PROFILE_SAMPLE_MODE']
+    return None
+
+
+def _start_profiler(mode):
+    """
+    Start profiling the current thread. Returns the profiler and its mode: a
+    cProfile that cannot run beside another active profiler falls back to the
+    stack sampler.
+    """
+    if mode == 'cprofile' and (_cprofile_exclusive is None or _cprofile_exclusive.acquire(blocking=False)):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            return profiler, mode
+        except ValueError:
+            # Some other profiling tool (a debugger, coverage) holds the slot
+            if _cprofile_exclusive is not None:
+                _cprofile_exclusive.release()
+    profiler = StackSampler(threading.get_ident())
+    profiler.enable()
+    return profiler, 'sample'
+
+
+def _stop_profiler(profiler, mode):
+    profiler.disable()
+    if mode == 'cprofile' and _cprofile_exclusive is not None:
+        _cprofile_exclusive.release()
+
+
+def _enforce_ring(directory, size):
+    metas = sorted(glob.glob(os.path.join(directory, '*.json')))
+    for meta_path in metas[:max(len(metas) - size, 0)]:
+        base = meta_path[:-len('.json')]
+        for path in (meta_path, base + '.pstats', base + '.collapsed'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _save_profile(profiler, mode, response, duration):
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Zero-padded millisecond timestamp keeps ids sortable oldest-first
+    profile_id = f'{int(time.time() * 1000):015d}-{os.getpid()}-{next(_profile_counter)}'
+    base = os.path.join(directory, profile_id)
+
+    if mode == 'cprofile':
+        profiler.dump_stats(base + '.pstats')
+        formats = ['pstats', 'collapsed']
+    else:
+        with open(base + '.collapsed', 'w') as f:
+            f.write(profiler.collapsed())
+        formats = ['collapsed']
+
+    sql_stats = g.get('_sql_stats')
+    meta = {
+        'id': profile_id,
+        'mode': mode,
+        'formats': formats,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_queries': sql_stats['count'] if sql_stats else None,
+        'sql_time_ms': round(sql_stats['time'] * 1000, 3) if sql_stats else None,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    with open(base + '.json', 'w') as f:
+        json.dump(meta, f)
+    _enforce_ring(directory, current_app.config['PROFILE_RING_SIZE'])
+    return profile_id
+
+
+def _load_meta(profile_id):
+    if not profile_id.replace('-', '').isdigit():
+        return None
+    path = os.path.join(_profile_dir(), f'{profile_id}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+@profiling_bp.route('', methods=['GET'])
+@profiling_bp.route('/', methods=['GET'])
+@admin_required
+def list_profiles():
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(_profile_dir(), '*.json')), reverse=True):
+        with open(path) as f:
+            profiles.append(json.load(f))
+    return jsonify({'status': 'success', 'profiles': profiles}), 200
+
+
+@profiling_bp.route('/<profile_id>', methods=['GET'])
+@admin_required
+def download_profile(profile_id):
+    meta = _load_meta(profile_id)
+    if meta is None:
+        return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
+    fmt = request.args.get('format', meta['formats'][0])
+    if fmt not in meta['formats']:
+        return jsonify({'status': 'error', 'message': f'Profile is only available as {", ".join(meta["formats"])}'}), 400
+
+    base = os.path.join(_profile_dir(), profile_id)
+    if fmt == 'pstats':
+        return send_file(base + '.pstats', mimetype='application/octet-stream',
+                         as_attachment=True, download_name=f'{profile_id}.pstats')
+    if meta['mode'] == 'cprofile':
+        stats = pstats.Stats(base + '.pstats').stats
+        return send_file(io.BytesIO(pstats_to_collapsed(stats).encode()), mimetype='text/plain',
+                         as_attachment=True, download_name=f'{profile_id}.collapsed')
+    return send_file(base + '.collapsed', mimetype='text/plain',
+                     as_attachment=True, download_name=f'{profile_id}.collapsed')
+
+
+def init_profiling(app):
+    """
+    Profile individual requests on demand. Admins trigger it with an
+    X-Profile header or __profile query flag (cprofile or sample), and
+    PROFILE_SAMPLE_RATE = N profiles every Nth request. Profiles are kept in
+    a bounded ring on disk and downloadable from /api/profiles.
+    """
+    app.config.setdefault('PROFILING_ENABLED', True)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', int(os.environ.get('PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_SAMPLE_MODE', 'cprofile')
+    app.config.setdefault('PROFILE_RING_SIZE', 50)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    app.register_blueprint(profiling_bp, url_prefix='/api/profiles')
+
+    @app.before_request
+    def start_profile():
+        if request.blueprint == 'profiling_bp':
+            return
+        mode = _requested_mode()
+        if mode is None:
+            return
+        profiler, mode = _start_profiler(mode)
+        g._profile = (profiler, mode, time.perf_counter())
+
+    @app.after_request
+    def finish_profile(response):
+        active = g.pop('_profile', None)
+        if active is None:
+            return response
+        profiler, mode, started = active
+        _stop_profiler(profiler, mode)
+        try:
+            response.headers['X-Profile-Id'] = _save_profile(profiler, mode, response, time.perf_counter() - started)
+        except OSError as e:
+            app.logger.warning('Could not save profile: %s', e)
+        return response
+
+    @app.teardown_request
+    def stop_abandoned_profile(exc):
+        active = g.pop('_profile', None)
+        if active is not None:
+            _stop_profiler(*active[:2])
@@ -0,0 +1,310 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import blake2b
+import numpy as np
+from flask import current_app, g, jsonify, request
+from metrics import process_alive
+from routes.auth_routes import decode_token
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shared store, limits are per process
+    fcntl = None
+
+# Admission control for expensive endpoints. Endpoints are grouped into route
+# classes (RATE_LIMIT_ROUTES); each class has a token bucket per client IP
+# and per user (the bearer token's user, or the email a login names), plus a
+# cap on how many of its requests the whole server runs at once. Requests
+# over either limit are turned away before the view runs: 429 when the
+# client is over its rate, 503 when the class is at its cap, both with
+# Retry-After.
+#
+# State lives in one fixed-size table: RATE_LIMIT_SLOTS buckets, found by
+# hashing their key, and one row of in-flight counts per worker process.
+# With RATE_LIMIT_STORE set (the default) the table is a file every gunicorn
+# worker maps, locked with flock, so limits hold for the server as a whole;
+# without it each process keeps its own.
+
+# Per route class: tokens added per second, bucket size, and requests of the
+# class allowed in flight across all workers
+DEFAULT_LIMITS = {
+    # Password hashing makes these the costliest requests per call, and they
+    # are what credential stuffing hammers
+    'auth': {'rate': 10 / 60, 'burst': 10, 'concurrency': int(os.environ.get('RATE_LIMIT_AUTH_CONCURRENCY', 8))},
+    'admin_list': {'rate': 30 / 60, 'burst': 10, 'concurrency': int(os.environ.get('RATE_LIMIT_ADMIN_CONCURRENCY', 4))},
+}
+DEFAULT_ROUTES = {
+    'auth_bp.login': 'auth',
+    'auth_bp.register': 'auth',
+    'auth_bp.forgot_password': 'auth',
+    'auth_bp.reset_password': 'auth',
+    'auth_bp.change_password': 'auth',
+    'auth_bp.get_all_users': 'admin_list',
+    'booking_bp.get_all_bookings': 'admin_list',
+    'analytics_bp.get_report': 'admin_list',
+    'vehicle_bp.get_fleet_utilization': 'admin_list',
+}
+# Buckets a key may live in: its hash slot and the next few
+PROBES = 8
+MAX_WORKERS = int(os.environ.get('RATE_LIMIT_MAX_WORKERS', 64))
+# Retry-After for a 503, when a class is at its cap
+BUSY_RETRY_SECONDS = 1
+MAGIC = b'PCARL001'
+# Set on the environ of a request that was already admitted (by the async
+# server, see asgi.py) so the Flask hooks do not charge it twice
+ADMITTED = 'pca.rate_limit_admitted'
+
+HEADER = np.dtype([('magic', 'S8'), ('slots', np.int64), ('workers', np.int64), ('classes', np.int64)])
+BUCKET = np.dtype([('key', np.uint64), ('tokens', np.float64), ('updated', np.float64)])
+
+_attach_lock = threading.Lock()
+
+
+def _hash(key):
+    # 0 marks a free slot
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class RateLimitStore:
+    """
+    Token buckets and per-process in-flight counts, in this process's memory
+    or in a file shared by every process that opens it
+    """
+
+    def __init__(self, slots, classes, path=None):
+        self.slots = slots
+        self.classes = {name: i for i, name in enumerate(classes)}
+        self.path = path if fcntl else None
+        self.worker = np.dtype([('pid', np.int64), ('in_flight', np.int32, (max(len(classes), 1),))])
+        self.size = HEADER.itemsize + slots * BUCKET.itemsize + MAX_WORKERS * self.worker.itemsize
+        self._pid = None
+
+    def _attach(self):
+        # Opened lazily and again after a fork: flock only excludes other
+        # open files, and an in-memory table must not be shared with the
+        # parent by accident of copy-on-write
+        if self._pid == os.getpid():
+            return
+        with _attach_lock:
+            if self._pid == os.getpid():
+                return
+            self._lock = threading.Lock()
+            self._fd = None
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                header = np.array([(MAGIC, self.slots, MAX_WORKERS, len(self.classes))], HEADER).tobytes()
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    if os.pread(self._fd, HEADER.itemsize, 0) != header or os.fstat(self._fd).st_size != self.size:
+                        # New, or laid out for other settings: start empty
+                        os.ftruncate(self._fd, 0)
+                        os.ftruncate(self._fd, self.size)
+                        os.pwrite(self._fd, header, 0)
+                finally:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                table = np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(self.size,))
+            else:
+                table = np.zeros(self.size, dtype=np.uint8)
+            buckets_end = HEADER.itemsize + self.slots * BUCKET.itemsize
+            self.buckets = table[HEADER.itemsize:buckets_end].view(BUCKET)
+            self.workers = table[buckets_end:].view(self.worker)
+            self._row = None
+            self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self):
+        self._attach()
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slot(self, key, burst, now):
+        """
+        The bucket slot of key, claiming one (full) if it has none
+        """
+        hashed = _hash(key)
+        index = (hashed + np.arange(PROBES, dtype=np.uint64)) % np.uint64(self.slots)
+        keys = self.buckets['key'][index]
+        found = np.flatnonzero(keys == hashed)
+        if found.size:
+            return index[found[0]]
+        # Take a free slot, else the one idle longest. A bucket idle for
+        # burst / rate seconds is full again, so forgetting it loses nothing;
+        # only a table overrun by active clients forgets partly used ones.
+        free = np.flatnonzero(keys == 0)
+        slot = index[free[0]] if free.size else index[np.argmin(self.buckets['updated'][index])]
+        self.buckets[slot] = (hashed, burst, now)
+        return slot
+
+    def take(self, keys, rate, burst, now):
+        """
+        Take a token from the bucket of every key if each has one. Returns 0,
+        or the seconds until they all will.
+        """
+        with self._locked():
+            slots = [self._slot(key, burst, now) for key in keys]
+            tokens = [min(burst, self.buckets['tokens'][slot] + (now - self.buckets['updated'][slot]) * rate)
+                      for slot in slots]
+            wait = max([(1 - available) / rate for available in tokens if available < 1], default=0)
+            for slot, available in zip(slots, tokens):
+                self.buckets['tokens'][slot] = available if wait else available - 1
+                self.buckets['updated'][slot] = now
+            return wait
+
+    def _own_row(self):
+        if self._row is None or self.workers['pid'][self._row] != os.getpid():
+            pids = self.workers['pid']
+            rows = np.flatnonzero(pids == 0)
+            if not rows.size:
+                self._reap()
+                rows = np.flatnonzero(pids == 0)
+            if not rows.size:
+                return None
+            self._row = rows[0]
+            self.workers[self._row] = (os.getpid(), 0)
+        return self._row
+
+    def _reap(self):
+        """
+        Free the rows of processes that have exited, dropping the requests
+        they had in flight
+        """
+        for row in np.flatnonzero(self.workers['pid']):
+            if not process_alive(int(self.workers['pid'][row])):
+                self.workers[row] = (0, 0)
+
+    def in_flight(self, name):
+        with self._locked():
+            return int(self.workers['in_flight'][:, self.classes[name]].sum())
+
+    def acquire(self, name, limit):
+        """
+        Count a request of class name in flight unless limit are already
+        """
+        column = self.classes[name]
+        with self._locked():
+            if self.workers['in_flight'][:, column].sum() >= limit:
+                # A worker killed mid-request never released its count
+                self._reap()
+                if self.workers['in_flight'][:, column].sum() >= limit:
+                    return False
+            row = self._own_row()
+            if row is not None:
+                self.workers['in_flight'][row, column] += 1
+            return True
+
+    def release(self, name):
+        with self._locked():
+            row = self._own_row()
+            if row is not None and self.workers['in_flight'][row, self.classes[name]] > 0:
+                self.workers['in_flight'][row, self.classes[name]] -= 1
+
+    def reset(self):
+        with self._locked():
+            self.buckets[:] = 0
+            self.workers[:] = 0
+            self._row = None
+
+
+def _client_ip():
+    # Behind N proxies the client is the Nth address from the end of
+    # X-Forwarded-For; anything before that is whatever the client sent
+    hops = current_app.config['RATE_LIMIT_PROXY_HOPS']
+    forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',') if address.strip()]
+    if hops and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.remote_addr
+
+
+def _user_key():
+    header = request.headers.get('Authorization', '')
+    if len(header.split(' ')) == 2:
+        try:
+            return f'user:{decode_token(header.split(" ")[1])["user_id"]}'
+        except Exception:
+            return None
+    # Sign-in requests name their account in the body
+    data = request.get_json(silent=True)
+    email = data.get('email') if isinstance(data, dict) else None
+    return f'email:{email.strip().lower()}' if isinstance(email, str) and email.strip() else None
+
+
+def _reject(status, message, retry_after):
+    response = jsonify({'status': 'error', 'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def get_store(app=None):
+    return (app or current_app).extensions.get('rate_limits')
+
+
+def admit():
+    """
+    Apply the limits of the current request's route class. Returns the 429 or
+    503 response to send instead of running the view (or None), and the class
+    whose concurrency slot the request now holds, to hand to release() once
+    it is done (or None)
+    """
+    name = current_app.config['RATE_LIMIT_ROUTES'].get(request.endpoint)
+    limits = current_app.config['RATE_LIMITS'].get(name) if name else None
+    store = get_store()
+    if not limits or store is None or request.method == 'OPTIONS' or request.environ.get(ADMITTED):
+        return None, None
+    user = _user_key()
+    keys = [f'{name}:ip:{_client_ip()}'] + ([f'{name}:{user}'] if user else [])
+    # Wall clock: the buckets are shared with other processes
+    wait = store.take(keys, limits['rate'], limits['burst'], time.time())
+    if wait:
+        return _reject(429, 'Too many requests, please try again later', wait), None
+    if not limits.get('concurrency'):
+        return None, None
+    if not store.acquire(name, limits['concurrency']):
+        return _reject(503, 'The server is busy, please try again shortly', BUSY_RETRY_SECONDS), None
+    return None, name
+
+
+def release(name, app=None):
+    if name is not None:
+        get_store(app).release(name)
+
+
+def init_rate_limits(app):
+    """
+    Apply per-client token buckets and per-class concurrency caps to the
+    endpoints in RATE_LIMIT_ROUTES
+    """
+    app.config.setdefault('RATE_LIMITS_ENABLED', os.environ.get('RATE_LIMITS_ENABLED', '1') != '0')
+    app.config.setdefault('RATE_LIMITS', {name: dict(limits) for name, limits in DEFAULT_LIMITS.items()})
+    app.config.setdefault('RATE_LIMIT_ROUTES', dict(DEFAULT_ROUTES))
+    app.config.setdefault('RATE_LIMIT_STORE', os.environ.get(
+        'RATE_LIMIT_STORE', os.path.join(app.instance_path, 'rate_limits.bin')
+    ))
+    app.config.setdefault('RATE_LIMIT_SLOTS', int(os.environ.get('RATE_LIMIT_SLOTS', 65536)))
+    app.config.setdefault('RATE_LIMIT_PROXY_HOPS', int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0)))
+    if not app.config['RATE_LIMITS_ENABLED']:
+        return
+
+    app.extensions['rate_limits'] = RateLimitStore(
+        app.config['RATE_LIMIT_SLOTS'], sorted(set(app.config['RATE_LIMIT_ROUTES'].values())),
+        app.config['RATE_LIMIT_STORE']
+    )
+
+    @app.before_request
+    def admit_request():
+        rejection, g._rate_limit_class = admit()
+        return rejection
+
+    @app.teardown_request
+    def release_request(exc):
+        release(g.pop('_rate_limit_class', None))
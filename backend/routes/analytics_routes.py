@@ -0,0 +1,39 @@
+from datetime import date
+from flask import Blueprint, jsonify, request
+from analytics import REPORTS, get_frame
+from routes.auth_routes import admin_required
+
+analytics_bp = Blueprint('analytics_bp', __name__)
+
+@analytics_bp.route('/<report>', methods=['GET'])
+@admin_required
+def get_report(report):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD limit the departures, ?tour_id= one tour,
+    # ?refresh=1 reloads the bookings instead of using the cached arrays, and
+    # ?live=1 reads them from the database instead of the current snapshot
+    if report not in REPORTS:
+        return jsonify({'status': 'error', 'message': 'Report not found'}), 404
+    try:
+        filters = {
+            'departure_from': date.fromisoformat(request.args['from']) if request.args.get('from') else None,
+            'departure_to': date.fromisoformat(request.args['to']) if request.args.get('to') else None,
+            'tour_id': request.args.get('tour_id', type=int)
+        }
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'from and to must be YYYY-MM-DD dates'}), 400
+    options = {}
+    if report == 'revenue':
+        options['by'] = request.args.get('by', 'departure')
+        if options['by'] not in ('departure', 'booking'):
+            return jsonify({'status': 'error', 'message': 'by must be departure or booking'}), 400
+    try:
+        frame = get_frame(refresh=request.args.get('refresh') == '1', live=request.args.get('live') == '1')
+        return jsonify({
+            'status': 'success',
+            'report': report,
+            'generated_at': frame.loaded_at,
+            'source': frame.source,
+            **REPORTS[report](frame, **filters, **options)
+        }), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
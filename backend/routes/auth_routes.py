@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from models import db, User, OTPToken
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
@@ -9,6 +9,31 @@ import random
 
 auth_bp = Blueprint('auth_bp', __name__)
 
+# WSGI environ key under which a batch passes (token, user id) to its
+# sub-requests, so the token is verified once per batch
+AUTHENTICATED_USER = 'pca.authenticated_user'
+
+def hash_password(password):
+    return generate_password_hash(password, method=current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+
+def decode_token(token):
+    """
+    The claims of a bearer token; raises if it is invalid or expired
+    """
+    return jwt.decode(token, os.environ.get('SECRET_KEY', 'your-secret-key-here'), algorithms=["HS256"])
+
+def load_token_user(token):
+    """
+    The user a bearer token belongs to (None if they no longer exist);
+    raises if the token is invalid
+    """
+    authenticated = request.environ.get(AUTHENTICATED_USER)
+    if authenticated is not None and authenticated[0] == token:
+        # Already verified by the batch; load the user as it is now, after
+        # any earlier sub-request's writes
+        return db.session.get(User, authenticated[1])
+    return User.query.get(decode_token(token)['user_id'])
+
 # Authentication decorator
 def token_required(f):
     @wraps(f)
@@ -21,8 +46,7 @@ def token_required(f):
             return jsonify({'message': 'Token is missing'}), 401
 
         try:
-            data = jwt.decode(token, os.environ.get('SECRET_KEY', 'your-secret-key-here'), algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            current_user = load_token_user(token)
             if not current_user:
                 return jsonify({'message': 'Invalid token'}), 401
         except:
@@ -43,8 +67,7 @@ def admin_required(f):
             return jsonify({'message': 'Token is missing'}), 401
 
         try:
-            data = jwt.decode(token, os.environ.get('SECRET_KEY', 'your-secret-key-here'), algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            current_user = load_token_user(token)
             if not current_user or not current_user.is_admin:
                 return jsonify({'message': 'Admin privileges required'}), 403
         except:
@@ -63,7 +86,7 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'message': 'Email already registered'}), 400
 
-    hashed_password = generate_password_hash(data['password'])
+    hashed_password = hash_password(data['password'])
     new_user = User(
         name=data['name'],
         email=data['email'],
@@ -159,7 +182,7 @@ def change_password(current_user):
     if not check_password_hash(current_user.password_hash, data['old_password']):
         return jsonify({'message': 'Invalid current password'}), 401
 
-    current_user.password_hash = generate_password_hash(data['new_password'])
+    current_user.password_hash = hash_password(data['new_password'])
     db.session.commit()
 
     return jsonify({'message': 'Password changed successfully'})
@@ -196,6 +219,8 @@ def reset_password():
     token = OTPToken.query.filter_by(
         email=data['email'],
         token=data['token']
+    ).filter(
+        OTPToken.created_at >= datetime.datetime.utcnow() - datetime.timedelta(minutes=current_app.config['OTP_TTL_MINUTES'])
     ).first()
 
     if not token:
@@ -205,7 +230,7 @@ def reset_password():
     if not user:
         return jsonify({'message': 'User not found'}), 404
 
-    user.password_hash = generate_password_hash(data['new_password'])
+    user.password_hash = hash_password(data['new_password'])
     db.session.delete(token)
     db.session.commit()
 
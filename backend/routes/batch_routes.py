@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify, request
+from batch import run_batch, validate
+
+batch_bp = Blueprint('batch_bp', __name__)
+
+@batch_bp.route('', methods=['POST'])
+def post_batch():
+    # {"requests": [{"id": "tours", "method": "GET", "path": "/api/tours", "body": {...}}, ...],
+    #  "parallel": true}. Each sub-request is authorized on its own with the
+    # batch's Authorization header; failures are reported per sub-request.
+    data = request.get_json(silent=True) or {}
+    error = validate(data.get('requests'))
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
+    try:
+        responses = run_batch(data['requests'], parallel=bool(data.get('parallel')))
+        return jsonify({'status': 'success', 'responses': responses}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,6 +1,12 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from models import db, Booking, Tour, TourDate, User
 from routes.auth_routes import token_required, admin_required
+from booking_summaries import booking_snapshot, record_booking_change, get_summaries
+from booking_events import record_event
+from pricing import quote_booking
+from user_bookings import DEFAULT_PER_PAGE, MAX_PER_PAGE, get_bookings_page
+from archival import is_archived, query_with_archive
+from models import BookingArchive
 from datetime import datetime
 
 booking_bp = Blueprint('booking_bp', __name__)
@@ -10,26 +16,18 @@ booking_bp = Blueprint('booking_bp', __name__)
 @token_required
 def get_user_bookings(current_user):
     try:
-        bookings = Booking.query.filter_by(user_id=current_user.id).all()
-        return jsonify({
-            'status': 'success',
-            'bookings': [{
-                'id': booking.id,
-                'tour': {
-                    'id': booking.tour.id,
-                    'name': booking.tour.name,
-                    'image_url': booking.tour.image_url,
-                    'destination': booking.tour.destination.name
-                },
-                'departure_date': booking.tour_date.departure_date.isoformat(),
-                'number_of_participants': booking.number_of_participants,
-                'total_price': booking.total_price,
-                'booking_status': booking.booking_status,
-                'payment_status': booking.payment_status,
-                'special_requests': booking.special_requests,
-                'created_at': booking.created_at.isoformat()
-            } for booking in bookings]
-        }), 200
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+        if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+            return jsonify({'status': 'error', 'message': f'page must be >= 1 and per_page between 1 and {MAX_PER_PAGE}'}), 400
+        include_archived = request.args.get('include_archived') == '1'
+        body, etag = get_bookings_page(current_user, page, per_page, include_archived)
+        response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+        # Per-user data: browsers may keep it but must revalidate, shared caches must not
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -37,7 +35,11 @@ def get_user_bookings(current_user):
 @token_required
 def get_booking(current_user, booking_id):
     try:
-        booking = Booking.query.get_or_404(booking_id)
+        booking = db.session.get(Booking, booking_id)
+        if booking is None and request.args.get('include_archived') == '1':
+            booking = db.session.get(BookingArchive, booking_id)
+        if booking is None:
+            return jsonify({'status': 'error', 'message': 'Booking not found'}), 404
         
         # Check if the booking belongs to the current user or if user is admin
         if booking.user_id != current_user.id and not current_user.is_admin:
@@ -65,7 +67,8 @@ def get_booking(current_user, booking_id):
                 'booking_status': booking.booking_status,
                 'payment_status': booking.payment_status,
                 'special_requests': booking.special_requests,
-                'created_at': booking.created_at.isoformat()
+                'created_at': booking.created_at.isoformat(),
+                'archived': is_archived(booking)
             }
         }), 200
     except Exception as e:
@@ -88,8 +91,8 @@ def create_booking(current_user):
                 'message': f'Not enough seats available. Only {tour_date.available_seats} seats left'
             }), 400
         
-        # Calculate total price
-        total_price = tour_date.tour.price * tour_date.price_modifier * data['number_of_participants']
+        # Price it with the same rules as the quotes the user was shown
+        total_price = quote_booking(tour_date.id, data['number_of_participants'])
         
         # Create booking
         new_booking = Booking(
@@ -105,6 +108,8 @@ def create_booking(current_user):
         tour_date.available_seats -= data['number_of_participants']
         
         db.session.add(new_booking)
+        record_booking_change(new_booking, tour_date=tour_date)
+        record_event(new_booking, 'created')
         db.session.commit()
         
         return jsonify({
@@ -127,6 +132,7 @@ def update_booking(current_user, booking_id):
             return jsonify({'status': 'error', 'message': 'Unauthorized access'}), 403
         
         data = request.get_json()
+        before = booking_snapshot(booking)
         
         # Update allowed fields
         if 'special_requests' in data:
@@ -139,6 +145,9 @@ def update_booking(current_user, booking_id):
             if 'payment_status' in data:
                 booking.payment_status = data['payment_status']
         
+        record_booking_change(booking, before=before)
+        cancelled = booking.booking_status == 'cancelled' and before[0] != 'cancelled'
+        record_event(booking, 'cancelled' if cancelled else 'updated')
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Booking updated successfully'}), 200
     except Exception as e:
@@ -160,12 +169,15 @@ def cancel_booking(current_user, booking_id):
             return jsonify({'status': 'error', 'message': 'Booking is already cancelled'}), 400
         
         # Update booking status
+        before = booking_snapshot(booking)
         booking.booking_status = 'cancelled'
         
         # Return seats to available pool
         tour_date = booking.tour_date
         tour_date.available_seats += booking.number_of_participants
         
+        record_booking_change(booking, before=before, tour_date=tour_date)
+        record_event(booking, 'cancelled')
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Booking cancelled successfully'}), 200
     except Exception as e:
@@ -176,7 +188,7 @@ def cancel_booking(current_user, booking_id):
 @admin_required
 def get_all_bookings():
     try:
-        bookings = Booking.query.all()
+        bookings = query_with_archive(Booking, request.args.get('include_archived') == '1')
         return jsonify({
             'status': 'success',
             'bookings': [{
@@ -195,8 +207,24 @@ def get_all_bookings():
                 'total_price': booking.total_price,
                 'booking_status': booking.booking_status,
                 'payment_status': booking.payment_status,
-                'created_at': booking.created_at.isoformat()
+                'created_at': booking.created_at.isoformat(),
+                'archived': is_archived(booking)
             } for booking in bookings]
         }), 200
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@booking_bp.route('/admin/summary', methods=['GET'])
+@admin_required
+def get_booking_summary():
+    try:
+        scopes = request.args.getlist('scope') or ['tour', 'tour_date', 'month']
+        for scope in scopes:
+            if scope not in ('tour', 'tour_date', 'month'):
+                return jsonify({'status': 'error', 'message': f'Unknown summary scope: {scope}'}), 400
+        return jsonify({
+            'status': 'success',
+            'summary': {scope: get_summaries(scope) for scope in scopes}
+        }), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,28 +1,67 @@
-from flask import Blueprint, jsonify
-from models import db
+from flask import Blueprint, current_app, jsonify, request
+from archival import archive_bookings
+from database import db
+from database_stats import get_database_stats
+from slow_queries import get_slow_queries, reset_slow_queries
+from routes.auth_routes import admin_required
 
 database_bp = Blueprint('database_bp', __name__)
 
 @database_bp.route('/info', methods=['GET'])
 def get_database_info():
     try:
-        # Get database statistics
-        user_count = db.session.execute('SELECT COUNT(*) FROM user').scalar()
-        tour_count = db.session.execute('SELECT COUNT(*) FROM tour').scalar()
-        booking_count = db.session.execute('SELECT COUNT(*) FROM booking').scalar()
-        destination_count = db.session.execute('SELECT COUNT(*) FROM destination').scalar()
+        # Counts and sizes come from the cached statistics service, so the
+        # dashboard can poll this without scanning every table
+        stats = get_database_stats(refresh=request.args.get('refresh') == '1')
+        tables = stats['tables']
+        counts = {name: table['row_count'] for name, table in tables.items()}
 
         return jsonify({
             'status': 'success',
-            'database_name': 'auth.db',
-            'database_type': 'SQLite',
-            'last_updated': None,  # You can add this if needed
+            'database_name': stats['database_name'],
+            'database_type': stats['database_type'],
+            'last_updated': stats['last_updated'],
+            'schema': {'tables': tables},
             'statistics': {
-                'total_users': user_count,
-                'total_tours': tour_count,
-                'total_bookings': booking_count,
-                'total_destinations': destination_count
+                'total_tables': len(tables),
+                'total_users': counts.get('user', 0),
+                'total_tours': counts.get('tour', 0),
+                'total_bookings': counts.get('booking', 0),
+                'total_destinations': counts.get('destination', 0),
+                'total_otp_tokens': counts.get('otp_token', 0),
+                'database_size': stats['database_size']
             }
         }), 200
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@database_bp.route('/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_query_log():
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({
+            'status': 'success',
+            'threshold_ms': current_app.config.get('SLOW_QUERY_THRESHOLD_MS'),
+            'queries': get_slow_queries(limit)
+        }), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@database_bp.route('/slow-queries', methods=['DELETE'])
+@admin_required
+def clear_slow_query_log():
+    reset_slow_queries()
+    return jsonify({'status': 'success', 'message': 'Slow query log cleared'}), 200
+
+@database_bp.route('/archive', methods=['POST'])
+@admin_required
+def run_archival():
+    # Normally run from cron/the scheduler (python archival.py); this lets an
+    # admin trigger a pass on demand
+    try:
+        batch_size = request.args.get('batch_size', type=int)
+        return jsonify({'status': 'success', 'archived': archive_bookings(batch_size)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,27 +1,35 @@
 from flask import Blueprint, jsonify, request
 from models import db, Destination, Tour
 from routes.auth_routes import admin_required
+from catalog_cache import catalog, catalog_response
+from images import get_variant_map, listing_images
 
 destination_bp = Blueprint('destination_bp', __name__)
 
+@catalog('destinations')
+def destination_catalog():
+    destinations = Destination.query.all()
+    variants = get_variant_map()
+    return {
+        'status': 'success',
+        'destinations': [{
+            'id': dest.id,
+            'name': dest.name,
+            'description': dest.description,
+            'image_url': dest.image_url,
+            **listing_images(dest.image_url, variants),
+            'country': dest.country,
+            'state': dest.state,
+            'city': dest.city,
+            'tour_count': len(dest.tours)
+        } for dest in destinations]
+    }
+
 @destination_bp.route('', methods=['GET'])
 @destination_bp.route('/', methods=['GET'])
 def get_destinations():
     try:
-        destinations = Destination.query.all()
-        return jsonify({
-            'status': 'success',
-            'destinations': [{
-                'id': dest.id,
-                'name': dest.name,
-                'description': dest.description,
-                'image_url': dest.image_url,
-                'country': dest.country,
-                'state': dest.state,
-                'city': dest.city,
-                'tour_count': len(dest.tours)
-            } for dest in destinations]
-        }), 200
+        return catalog_response('destinations'), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -142,6 +150,7 @@ def search_destinations():
         
         # Execute query
         results = destinations.all()
+        variants = get_variant_map()
         
         return jsonify({
             'status': 'success',
@@ -150,6 +159,7 @@ def search_destinations():
                 'name': dest.name,
                 'description': dest.description,
                 'image_url': dest.image_url,
+                **listing_images(dest.image_url, variants),
                 'country': dest.country,
                 'state': dest.state,
                 'city': dest.city,
@@ -0,0 +1,53 @@
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from booking_events import events_after, get_hub, open_stream, stream_events, visible_to
+from routes.auth_routes import token_required
+
+event_bp = Blueprint('event_bp', __name__)
+
+@event_bp.route('/stream', methods=['GET'])
+def stream_booking_events():
+    # Server-Sent Events: one 'booking' event per change to the user's
+    # bookings (every booking for admins). Resumes after Last-Event-ID or
+    # ?after=; without either, only new events are sent. Each stream ends
+    # after EVENTS_STREAM_SECONDS and the browser reconnects where it left off.
+    # A stream holds this request thread throughout, so only
+    # EVENTS_WSGI_STREAMS run at once per process; clients beyond that are
+    # told to retry (or to poll /api/events). The async server (asgi.py)
+    # serves streams without holding threads.
+    opened = open_stream()
+    if not callable(opened[1]):
+        return jsonify(opened[1]), opened[0]
+    cursor, visible = opened
+    duration = current_app.config['EVENTS_STREAM_SECONDS']
+    hub = get_hub(current_app._get_current_object())
+    if not hub.claim_thread(current_app.config['EVENTS_WSGI_STREAMS']):
+        response = jsonify({'status': 'error', 'message': 'Too many open event streams, please try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(duration, 1))
+        return response
+    response = Response(
+        stream_with_context(stream_events(hub, cursor, visible, duration)),
+        mimetype='text/event-stream',
+        # No caching, and no proxy buffering of the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the response is closed, whether or not it was streamed
+    response.call_on_close(hub.release_thread)
+    return response
+
+@event_bp.route('', methods=['GET'])
+@event_bp.route('/', methods=['GET'])
+@token_required
+def list_booking_events(current_user):
+    # Polling fallback: ?after=<event id> returns the next page of events
+    try:
+        cursor = request.args.get('after', 0, type=int)
+        events = events_after(cursor)
+        visible = visible_to(current_user.id, current_user.is_admin)
+        return jsonify({
+            'status': 'success',
+            'events': [e for e in events if visible(e)],
+            'cursor': events[-1]['id'] if events else cursor
+        }), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,34 @@
+from flask import Blueprint, jsonify, request
+from models import db, ImageAsset
+from images import ImageError, serialize_asset, store_upload, submit_derivatives
+from routes.auth_routes import admin_required
+
+image_bp = Blueprint('image_bp', __name__)
+
+@image_bp.route('', methods=['POST'])
+@image_bp.route('/', methods=['POST'])
+@admin_required
+def upload_image():
+    # multipart/form-data with a single 'file' part. The returned url goes
+    # into a tour, destination or vehicle image_url; listing thumbnails
+    # follow once the background worker has resized it.
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'No file uploaded'}), 400
+    try:
+        asset, created = store_upload(upload.read(), upload.mimetype)
+        if asset.status == 'pending':
+            submit_derivatives(asset)
+        return jsonify({'status': 'success', 'image': serialize_asset(asset)}), 201 if created else 200
+    except ImageError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@image_bp.route('/<int:image_id>', methods=['GET'])
+def get_image(image_id):
+    asset = db.session.get(ImageAsset, image_id)
+    if asset is None:
+        return jsonify({'status': 'error', 'message': 'Image not found'}), 404
+    return jsonify({'status': 'success', 'image': serialize_asset(asset)}), 200
@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify, request
+from database import db
+from scheduler import get_jobs, job_status, run_job, serialize_run
+from routes.auth_routes import admin_required
+
+job_bp = Blueprint('job_bp', __name__)
+
+@job_bp.route('', methods=['GET'])
+@admin_required
+def get_job_status():
+    try:
+        history = request.args.get('history', 5, type=int)
+        return jsonify({'status': 'success', 'jobs': job_status(history)}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@job_bp.route('/<name>/run', methods=['POST'])
+@admin_required
+def run_job_now(name):
+    # Runs even if the job is not due, but never alongside another run of it
+    if name not in get_jobs():
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    try:
+        run = run_job(name, force=True)
+        if run is None:
+            return jsonify({'status': 'error', 'message': 'Job is already running'}), 409
+        return jsonify({'status': 'success', 'run': serialize_run(run)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,38 +1,48 @@
 from flask import Blueprint, jsonify, request
-from models import db, Tour, Destination, TourDate, Booking, Review
-from datetime import datetime
+from models import db, Tour, Destination, TourDate, Booking, Review, PricingRule
+from datetime import date, datetime
 from routes.auth_routes import token_required, admin_required
+from catalog_cache import catalog, catalog_response
+from images import get_variant_map, listing_images
+from pricing import KINDS, MAX_QUOTES, listed_prices, quote_prices
 import json
 
 tour_bp = Blueprint('tour_bp', __name__)
 
+@catalog('tours', daily=True)
+def tour_catalog():
+    tours = Tour.query.all()
+    variants = get_variant_map()
+    prices = listed_prices(date.id for tour in tours for date in tour.departure_dates if date.available_seats > 0)
+    return {
+        'status': 'success',
+        'tours': [{
+            'id': tour.id,
+            'name': tour.name,
+            'description': tour.description,
+            'destination': {
+                'id': tour.destination.id,
+                'name': tour.destination.name,
+                'country': tour.destination.country
+            },
+            'duration_days': tour.duration_days,
+            'price': tour.price,
+            'image_url': tour.image_url,
+            **listing_images(tour.image_url, variants),
+            'available_dates': [{
+                'id': date.id,
+                'departure_date': date.departure_date.isoformat(),
+                'available_seats': date.available_seats,
+                'price': prices[date.id]
+            } for date in tour.departure_dates if date.available_seats > 0]
+        } for tour in tours]
+    }
+
 @tour_bp.route('', methods=['GET'])
 @tour_bp.route('/', methods=['GET'])
 def get_tours():
     try:
-        tours = Tour.query.all()
-        return jsonify({
-            'status': 'success',
-            'tours': [{
-                'id': tour.id,
-                'name': tour.name,
-                'description': tour.description,
-                'destination': {
-                    'id': tour.destination.id,
-                    'name': tour.destination.name,
-                    'country': tour.destination.country
-                },
-                'duration_days': tour.duration_days,
-                'price': tour.price,
-                'image_url': tour.image_url,
-                'available_dates': [{
-                    'id': date.id,
-                    'departure_date': date.departure_date.isoformat(),
-                    'available_seats': date.available_seats,
-                    'price': tour.price * date.price_modifier
-                } for date in tour.departure_dates if date.available_seats > 0]
-            } for tour in tours]
-        }), 200
+        return catalog_response('tours'), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -40,6 +50,7 @@ def get_tours():
 def get_tour(tour_id):
     try:
         tour = Tour.query.get_or_404(tour_id)
+        prices = listed_prices(date.id for date in tour.departure_dates)
         reviews = [{
             'id': review.id,
             'rating': review.rating,
@@ -71,7 +82,7 @@ def get_tour(tour_id):
                     'id': date.id,
                     'departure_date': date.departure_date.isoformat(),
                     'available_seats': date.available_seats,
-                    'price': tour.price * date.price_modifier
+                    'price': prices[date.id]
                 } for date in tour.departure_dates],
                 'reviews': reviews,
                 'average_rating': sum(r['rating'] for r in reviews) / len(reviews) if reviews else 0
@@ -80,6 +91,118 @@ def get_tour(tour_id):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@tour_bp.route('/quotes', methods=['POST'])
+def get_quotes():
+    # Prices many (tour date, participants) combinations in one pass, e.g. a
+    # whole price grid, with the pricing rules applied
+    try:
+        data = request.get_json(silent=True) or {}
+        quotes = data.get('quotes')
+        if not isinstance(quotes, list) or not quotes:
+            return jsonify({'status': 'error', 'message': 'quotes must be a non-empty list'}), 400
+        if len(quotes) > MAX_QUOTES:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_QUOTES} quotes per request'}), 400
+        try:
+            tour_date_ids = [int(quote['tour_date_id']) for quote in quotes]
+            participants = [int(quote.get('participants', 1)) for quote in quotes]
+            booked_on = date.fromisoformat(data['booked_on']) if data.get('booked_on') else None
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Each quote needs an integer tour_date_id and participants; booked_on is YYYY-MM-DD'}), 400
+        if min(participants) < 1:
+            return jsonify({'status': 'error', 'message': 'participants must be at least 1'}), 400
+
+        try:
+            prices = quote_prices(tour_date_ids, participants, booked_on)
+        except KeyError as e:
+            return jsonify({'status': 'error', 'message': f'Tour date {e.args[0]} not found'}), 404
+        tour_ids = prices['tour_id'].tolist()
+        for quote, tour_id in zip(quotes, tour_ids):
+            if quote.get('tour_id') not in (None, tour_id):
+                return jsonify({'status': 'error', 'message': f'Tour date {quote["tour_date_id"]} is not a date of tour {quote["tour_id"]}'}), 400
+
+        return jsonify({
+            'status': 'success',
+            'quotes': [{
+                'tour_id': tour_id,
+                'tour_date_id': tour_date_id,
+                'participants': count,
+                'unit_price': unit_price,
+                'total_price': total_price,
+                'modifiers': {'season': season, 'group': group, 'early_bird': early_bird}
+            } for tour_id, tour_date_id, count, unit_price, total_price, season, group, early_bird in zip(
+                tour_ids, tour_date_ids, participants, prices['unit_price'].tolist(), prices['total_price'].tolist(),
+                prices['season'].tolist(), prices['group'].tolist(), prices['early_bird'].tolist()
+            )]
+        }), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def _serialize_rule(rule):
+    return {
+        'id': rule.id,
+        'kind': rule.kind,
+        'tour_id': rule.tour_id,
+        'modifier': rule.modifier,
+        'start_date': rule.start_date.isoformat() if rule.start_date else None,
+        'end_date': rule.end_date.isoformat() if rule.end_date else None,
+        'min_participants': rule.min_participants,
+        'min_days_before': rule.min_days_before,
+        'active': rule.active
+    }
+
+@tour_bp.route('/pricing-rules', methods=['GET'])
+@admin_required
+def get_pricing_rules():
+    try:
+        rules = PricingRule.query.order_by(PricingRule.id).all()
+        return jsonify({'status': 'success', 'rules': [_serialize_rule(rule) for rule in rules]}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@tour_bp.route('/pricing-rules', methods=['POST'])
+@admin_required
+def create_pricing_rule():
+    try:
+        data = request.get_json()
+        if data.get('kind') not in KINDS:
+            return jsonify({'status': 'error', 'message': f'kind must be one of {", ".join(KINDS)}'}), 400
+        if not isinstance(data.get('modifier'), (int, float)) or data['modifier'] <= 0:
+            return jsonify({'status': 'error', 'message': 'modifier must be a positive number'}), 400
+        required = {'season': 'start_date', 'group': 'min_participants', 'early_bird': 'min_days_before'}[data['kind']]
+        if data.get(required) is None:
+            return jsonify({'status': 'error', 'message': f'{required} is required for {data["kind"]} rules'}), 400
+        if data.get('tour_id') is not None and db.session.get(Tour, data['tour_id']) is None:
+            return jsonify({'status': 'error', 'message': 'Tour not found'}), 404
+
+        rule = PricingRule(
+            kind=data['kind'],
+            tour_id=data.get('tour_id'),
+            modifier=data['modifier'],
+            start_date=date.fromisoformat(data['start_date']) if data.get('start_date') else None,
+            end_date=date.fromisoformat(data['end_date']) if data.get('end_date') else None,
+            min_participants=data.get('min_participants'),
+            min_days_before=data.get('min_days_before'),
+            active=data.get('active', True)
+        )
+        db.session.add(rule)
+        db.session.commit()
+        return jsonify({'status': 'success', 'message': 'Pricing rule created', 'rule': _serialize_rule(rule)}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@tour_bp.route('/pricing-rules/<int:rule_id>', methods=['DELETE'])
+@admin_required
+def delete_pricing_rule(rule_id):
+    try:
+        rule = PricingRule.query.get_or_404(rule_id)
+        db.session.delete(rule)
+        db.session.commit()
+        return jsonify({'status': 'success', 'message': 'Pricing rule deleted'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @tour_bp.route('', methods=['POST'])
 @tour_bp.route('/', methods=['POST'])
 @admin_required
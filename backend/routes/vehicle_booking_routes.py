@@ -1,6 +1,12 @@
 from flask import Blueprint, jsonify, request
 from models import db, Vehicle, VehicleBooking, User
 from routes.auth_routes import token_required, admin_required
+from vehicle_slots import (
+    add_windows, booking_windows, check_availability, find_conflict, format_time,
+    load_slots, lock_vehicles, parse_time, remove_booking, validate_schedule, windows_for
+)
+from archival import is_archived, query_with_archive
+from booking_events import record_event
 from datetime import datetime, date
 
 vehicle_booking_bp = Blueprint('vehicle_booking_bp', __name__)
@@ -18,33 +24,41 @@ def request_vehicle_booking(current_user):
         to_date = datetime.strptime(to_date, '%Y-%m-%d').date()
     else:
         to_date = from_date
-    time = data.get('time')  # Only for single-day bookings
+    try:
+        # start_time/end_time bound the trip; the legacy 'time' is a start time
+        start_time = parse_time(data.get('start_time') or data.get('time'))
+        end_time = parse_time(data.get('end_time'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Times must be given as HH:MM'}), 400
     from_place = data.get('from_place')
     to_place = data.get('to_place')
     travel_details = data.get('travel_details', '')
     if not from_place or not to_place:
         return jsonify({'status': 'error', 'message': 'From and To places are required'}), 400
-    # Check for overlapping bookings
-    overlap = VehicleBooking.query.filter(
-        VehicleBooking.vehicle_id == vehicle_id,
-        VehicleBooking.status == 'approved',
-        VehicleBooking.from_date <= to_date,
-        VehicleBooking.to_date >= from_date
-    ).first()
-    if overlap:
+    error = validate_schedule(from_date, to_date, start_time, end_time)
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
+    # Check for overlapping approved bookings, to the minute. The lock holds
+    # off approvals on this vehicle until the request is committed.
+    lock_vehicles([vehicle_id])
+    if check_availability(vehicle_id, booking_windows(from_date, to_date, start_time, end_time)):
+        db.session.rollback()
         return jsonify({'status': 'error', 'message': 'Vehicle already booked for these dates'}), 400
     booking = VehicleBooking(
         user_id=current_user.id,
         vehicle_id=vehicle_id,
         from_date=from_date,
         to_date=to_date,
-        time=time,
+        time=format_time(start_time),
+        start_time=start_time,
+        end_time=end_time,
         status='pending',
         from_place=from_place,
         to_place=to_place,
         travel_details=travel_details
     )
     db.session.add(booking)
+    record_event(booking, 'created')
     db.session.commit()
     return jsonify({'status': 'success', 'message': 'Booking request sent', 'booking_id': booking.id}), 201
 
@@ -53,57 +67,92 @@ def request_vehicle_booking(current_user):
 @vehicle_booking_bp.route('/', methods=['GET'])
 @token_required
 def get_vehicle_bookings(current_user):
+    include_archived = request.args.get('include_archived') == '1'
     if current_user.is_admin:
-        bookings = VehicleBooking.query.all()
+        bookings = query_with_archive(VehicleBooking, include_archived)
     else:
-        bookings = VehicleBooking.query.filter_by(user_id=current_user.id).all()
+        bookings = query_with_archive(VehicleBooking, include_archived, user_id=current_user.id)
     return jsonify({
         'bookings': [
             {
                 'id': b.id,
                 'user': {'id': b.user.id, 'name': b.user.name, 'email': b.user.email},
-                'vehicle': {'id': b.vehicle.id, 'name': b.vehicle.name, 'type': b.vehicle.type},
+                # Archived bookings may outlive their vehicle
+                'vehicle': {'id': b.vehicle.id, 'name': b.vehicle.name, 'type': b.vehicle.type} if b.vehicle else None,
                 'from_date': b.from_date.isoformat() if b.from_date else None,
                 'to_date': b.to_date.isoformat() if b.to_date else None,
                 'time': b.time,
+                'start_time': format_time(b.start_time),
+                'end_time': format_time(b.end_time),
                 'status': b.status,
                 'from_place': b.from_place,
                 'to_place': b.to_place,
                 'travel_details': b.travel_details,
-                'created_at': b.created_at.isoformat()
+                'created_at': b.created_at.isoformat(),
+                'archived': is_archived(b)
             } for b in bookings
         ]
     })
 
+def _apply_schedule(booking, data):
+    """
+    Apply from_date, to_date, start_time and end_time (or the legacy time)
+    from a PATCH body. Returns whether anything changed; raises ValueError
+    for malformed values or an impossible window.
+    """
+    updated = False
+    for key in ['from_date', 'to_date']:
+        if key in data:
+            setattr(booking, key, datetime.strptime(data[key], '%Y-%m-%d').date())
+            updated = True
+    if 'start_time' in data or 'time' in data:
+        booking.start_time = parse_time(data['start_time'] if 'start_time' in data else data['time'])
+        booking.time = format_time(booking.start_time)
+        updated = True
+    if 'end_time' in data:
+        booking.end_time = parse_time(data['end_time'])
+        updated = True
+    if updated:
+        error = validate_schedule(booking.from_date, booking.to_date, booking.start_time, booking.end_time)
+        if error:
+            raise ValueError(error)
+    return updated
+
 # Admin or user can update booking (admin: status, user: date)
 @vehicle_booking_bp.route('/<int:booking_id>', methods=['PATCH'])
 @token_required
 def update_vehicle_booking(current_user, booking_id):
     data = request.get_json()
     booking = VehicleBooking.query.get_or_404(booking_id)
+    # Lock the vehicle, then re-read the booking: an approval must be checked
+    # against the booking as committed, not as it was before the lock
+    lock_vehicles([booking.vehicle_id])
+    db.session.refresh(booking)
 
     # Admin can approve/reject/cancel and update dates/times
     if current_user.is_admin:
         updated = False
+        previous_status = booking.status
         if 'status' in data and data['status'] in ['approved', 'rejected', 'cancelled']:
             booking.status = data['status']
             updated = True
-        if 'from_date' in data:
-            try:
-                booking.from_date = datetime.strptime(data['from_date'], '%Y-%m-%d').date()
-                updated = True
-            except Exception as e:
-                return jsonify({'status': 'error', 'message': str(e)}), 400
-        if 'to_date' in data:
-            try:
-                booking.to_date = datetime.strptime(data['to_date'], '%Y-%m-%d').date()
-                updated = True
-            except Exception as e:
-                return jsonify({'status': 'error', 'message': str(e)}), 400
-        if 'time' in data:
-            booking.time = data['time']
-            updated = True
+        try:
+            updated = _apply_schedule(booking, data) or updated
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         if updated:
+            if booking.status == 'approved':
+                with db.session.no_autoflush:
+                    conflict = check_availability(booking.vehicle_id, windows_for(booking), [booking.id])
+                if conflict:
+                    db.session.rollback()
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Vehicle already booked for these dates',
+                        'conflicting_booking_id': conflict
+                    }), 400
+            record_event(booking, booking.status if booking.status != previous_status else 'updated')
             db.session.commit()
             return jsonify({'status': 'success', 'message': 'Booking updated by admin'}), 200
         return jsonify({'status': 'error', 'message': 'No valid fields to update'}), 400
@@ -111,28 +160,107 @@ def update_vehicle_booking(current_user, booking_id):
     # User can only update their own booking's dates/times or cancel
     if booking.user_id != current_user.id:
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
-    updated = False
-    if 'from_date' in data:
-        try:
-            booking.from_date = datetime.strptime(data['from_date'], '%Y-%m-%d').date()
-            updated = True
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 400
-    if 'to_date' in data:
-        try:
-            booking.to_date = datetime.strptime(data['to_date'], '%Y-%m-%d').date()
-            updated = True
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 400
-    if 'time' in data:
-        booking.time = data['time']
-        updated = True
+    try:
+        updated = _apply_schedule(booking, data)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     if updated:
         booking.status = 'pending'  # Set status to pending on reschedule
+        record_event(booking, 'updated')
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Booking updated. Please wait for approval.'}), 200
     if 'status' in data and data['status'] == 'cancelled':
         booking.status = 'cancelled'
+        record_event(booking, 'cancelled')
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Booking cancelled.'}), 200
-    return jsonify({'status': 'error', 'message': 'Only dates, time, or cancellation can be updated by user.'}), 400 
\ No newline at end of file
+    return jsonify({'status': 'error', 'message': 'Only dates, time, or cancellation can be updated by user.'}), 400
+
+# Admin applies status changes to many bookings in one transaction
+@vehicle_booking_bp.route('/batch', methods=['PATCH'])
+@admin_required
+def batch_update_vehicle_bookings():
+    data = request.get_json() or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'status': 'error', 'message': 'A non-empty list of updates is required'}), 400
+
+    results = [None] * len(updates)
+    valid = []
+    seen_ids = set()
+    for index, item in enumerate(updates):
+        booking_id = item.get('id') if isinstance(item, dict) else None
+        status = item.get('status') if isinstance(item, dict) else None
+        if not isinstance(booking_id, int) or status not in ['approved', 'rejected', 'cancelled']:
+            results[index] = {'id': booking_id, 'status': 'error', 'message': 'Each update needs an id and a status of approved, rejected or cancelled'}
+        elif booking_id in seen_ids:
+            results[index] = {'id': booking_id, 'status': 'error', 'message': 'Booking appears more than once in the batch'}
+        else:
+            seen_ids.add(booking_id)
+            valid.append((index, booking_id, status))
+
+    bookings = {}
+    if seen_ids:
+        # Lock the vehicles before reading the bookings and their slots
+        lock_vehicles(vehicle_id for vehicle_id, in db.session.query(VehicleBooking.vehicle_id).filter(
+            VehicleBooking.id.in_(seen_ids)
+        ))
+        bookings = {b.id: b for b in VehicleBooking.query.filter(VehicleBooking.id.in_(seen_ids)).all()}
+
+    # Load the slot index for every vehicle and day an approval in this batch
+    # could collide on in one query, then check overlaps in memory
+    approvals = [bookings[booking_id] for _, booking_id, status in valid
+                 if status == 'approved' and booking_id in bookings]
+    slots = {}
+    if approvals:
+        slots = load_slots(
+            {b.vehicle_id for b in approvals},
+            min(b.from_date for b in approvals),
+            max(b.to_date or b.from_date for b in approvals)
+        )
+        # Rejections and cancellations in the batch always apply, so the
+        # slots they release are free for its approvals
+        for _, booking_id, status in valid:
+            booking = bookings.get(booking_id)
+            if status != 'approved' and booking is not None:
+                remove_booking(slots, booking.vehicle_id, windows_for(booking), booking_id)
+
+    changed = []
+    for index, booking_id, status in valid:
+        booking = bookings.get(booking_id)
+        if booking is None:
+            results[index] = {'id': booking_id, 'status': 'error', 'message': 'Booking not found'}
+            continue
+        if status == 'approved':
+            windows = windows_for(booking)
+            # Only this booking's own slots are ignored: other approved
+            # members of the batch still hold theirs
+            conflict = find_conflict(slots, booking.vehicle_id, windows, booking.id)
+            if conflict:
+                results[index] = {
+                    'id': booking_id,
+                    'status': 'error',
+                    'message': 'Vehicle already booked for these dates',
+                    'conflicting_booking_id': conflict
+                }
+                continue
+            add_windows(slots, booking.vehicle_id, windows, booking.id)
+        booking.status = status
+        record_event(booking, status)
+        changed.append(booking)
+        results[index] = {'id': booking_id, 'status': 'success', 'booking_status': status}
+
+    try:
+        if changed:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    return jsonify({
+        'status': 'success',
+        'updated': len(changed),
+        'failed': len(results) - len(changed),
+        'results': results
+    }), 200
@@ -1,16 +1,20 @@
 from flask import Blueprint, jsonify, request
-from models import db, Vehicle, VehicleBooking, User
+from models import db, Vehicle, VehicleBooking, VehicleSlot, User
 from routes.auth_routes import token_required, admin_required
+from catalog_cache import catalog, catalog_response
+from images import get_variant_map, listing_images
+from vehicle_slots import DAY_MINUTES, format_minute
+from fleet_utilization import MAX_RANGE_DAYS, default_range, fleet_utilization
 from datetime import datetime, date
 
 vehicle_bp = Blueprint('vehicle_bp', __name__)
 
 # --- Vehicle CRUD (Admin Only) ---
-@vehicle_bp.route('', methods=['GET'])
-@vehicle_bp.route('/', methods=['GET'])
-def get_vehicles():
+@catalog('vehicles')
+def vehicle_catalog():
     vehicles = Vehicle.query.all()
-    return jsonify({
+    variants = get_variant_map()
+    return {
         'vehicles': [
             {
                 'id': v.id,
@@ -18,10 +22,16 @@ def get_vehicles():
                 'type': v.type,
                 'description': v.description,
                 'image_url': v.image_url,
+                **listing_images(v.image_url, variants),
                 'created_at': v.created_at.isoformat()
             } for v in vehicles
         ]
-    })
+    }
+
+@vehicle_bp.route('', methods=['GET'])
+@vehicle_bp.route('/', methods=['GET'])
+def get_vehicles():
+    return catalog_response('vehicles')
 
 @vehicle_bp.route('/<int:vehicle_id>', methods=['GET'])
 def get_vehicle(vehicle_id):
@@ -72,8 +82,42 @@ def delete_vehicle(vehicle_id):
     return jsonify({'message': 'Vehicle deleted'})
 
 # --- Vehicle Calendar ---
+@vehicle_bp.route('/utilization', methods=['GET'])
+@admin_required
+def get_fleet_utilization():
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive, default the last year),
+    # optionally ?type=bus, and ?live=1 to read the database, not the snapshot
+    try:
+        first_day, last_day = default_range()
+        if request.args.get('from'):
+            first_day = date.fromisoformat(request.args['from'])
+        if request.args.get('to'):
+            last_day = date.fromisoformat(request.args['to'])
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'from and to must be YYYY-MM-DD dates'}), 400
+    if last_day < first_day or (last_day - first_day).days >= MAX_RANGE_DAYS:
+        return jsonify({'status': 'error', 'message': f'to must be on or after from, at most {MAX_RANGE_DAYS} days apart'}), 400
+    try:
+        report = fleet_utilization(first_day, last_day, request.args.get('type'), live=request.args.get('live') == '1')
+        return jsonify({'status': 'success', **report}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @vehicle_bp.route('/<int:vehicle_id>/calendar', methods=['GET'])
 def vehicle_calendar(vehicle_id):
-    bookings = VehicleBooking.query.filter_by(vehicle_id=vehicle_id, status='approved').all()
-    booked_dates = [b.date.isoformat() for b in bookings]
-    return jsonify({'booked_dates': booked_dates}) 
\ No newline at end of file
+    # Read from the slot index: booked_dates are days taken whole, slots list
+    # every approved period so partly booked days can still be offered
+    slots = VehicleSlot.query.filter_by(vehicle_id=vehicle_id).order_by(
+        VehicleSlot.day, VehicleSlot.start_minute
+    ).all()
+    booked_dates = sorted({
+        s.day.isoformat() for s in slots if s.start_minute == 0 and s.end_minute == DAY_MINUTES
+    })
+    return jsonify({
+        'booked_dates': booked_dates,
+        'slots': [{
+            'date': s.day.isoformat(),
+            'start_time': format_minute(s.start_minute),
+            'end_time': format_minute(s.end_minute)
+        } for s in slots]
+    }) 
\ No newline at end of file
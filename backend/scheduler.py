@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import JobLease, JobRun
+
+logger = logging.getLogger(__name__)
+
+# Periodic maintenance jobs run on a thread inside each web worker. A job only
+# runs in the worker that claims its row in job_lease, and only once its
+# interval has passed since the last start, so it runs once per interval
+# across all workers (and servers sharing the database). A worker that dies
+# mid-job keeps the lease until it expires.
+
+_jobs = {}
+_thread = None
+_stop = threading.Event()
+
+
+class Job:
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+
+
+def job(name, interval):
+    """
+    Register the decorated function as a periodic job. It runs in an app
+    context, commits its own work and returns {counter: rows touched}.
+    """
+    def decorator(fn):
+        _jobs[name] = Job(name, fn, interval)
+        return fn
+    return decorator
+
+
+def get_jobs():
+    import maintenance_jobs  # noqa: F401  (registers the built-in jobs)
+    return _jobs
+
+
+def _owner():
+    # Computed per call: with preload the module is imported before the fork
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _interval(job_spec):
+    return current_app.config['SCHEDULER_INTERVALS'].get(job_spec.name, job_spec.interval)
+
+
+def _acquire(job_spec, now, force=False):
+    """
+    Claim the job's lease if no live worker holds it and (unless force) the
+    job is due. One statement, so two workers can never both win.
+    """
+    interval = _interval(job_spec)
+    stmt = insert(JobLease).values(
+        name=job_spec.name,
+        owner=_owner(),
+        expires_at=now + timedelta(seconds=current_app.config['SCHEDULER_LEASE_SECONDS']),
+        last_started_at=now
+    )
+    claimable = JobLease.expires_at < now
+    if not force:
+        claimable &= (JobLease.last_started_at.is_(None)) | (JobLease.last_started_at <= now - timedelta(seconds=interval))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'owner': stmt.excluded.owner, 'expires_at': stmt.excluded.expires_at,
+              'last_started_at': stmt.excluded.last_started_at},
+        where=claimable
+    )
+    acquired = db.session.execute(stmt).rowcount == 1
+    db.session.commit()
+    return acquired
+
+
+def run_job(name, force=False):
+    """
+    Run a job here if this worker wins its lease. Returns the recorded JobRun,
+    or None when the job is not due or another worker is running it.
+    """
+    job_spec = get_jobs()[name]
+    started_at = datetime.utcnow()
+    if not _acquire(job_spec, started_at, force):
+        return None
+
+    started = time.perf_counter()
+    details, status, error = {}, 'success', None
+    try:
+        details = job_spec.fn() or {}
+    except Exception as e:
+        db.session.rollback()
+        status, error = 'failed', str(e)
+        logger.exception('Job %s failed', name)
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    run = JobRun(
+        name=name,
+        owner=_owner(),
+        started_at=started_at,
+        duration_ms=round(duration_ms, 2),
+        rows_touched=sum(details.values()),
+        details=json.dumps(details),
+        status=status,
+        error=error
+    )
+    db.session.add(run)
+    db.session.execute(
+        update(JobLease).where(JobLease.name == name, JobLease.owner == _owner())
+        .values(expires_at=datetime.utcnow(), last_finished_at=datetime.utcnow())
+    )
+    # Keep the most recent runs of each job only
+    keep = select(JobRun.id).where(JobRun.name == name).order_by(JobRun.id.desc()) \
+        .limit(current_app.config['SCHEDULER_HISTORY'])
+    db.session.flush()
+    db.session.execute(delete(JobRun).where(JobRun.name == name, JobRun.id.notin_(keep)))
+    db.session.commit()
+    logger.info('Job %s %s in %.1f ms, %d rows touched %s', name, status, duration_ms, run.rows_touched, details)
+    return run
+
+
+def run_due_jobs():
+    """
+    Run every job that is due and not claimed by another worker
+    """
+    return [run for run in (run_job(name) for name in get_jobs()) if run is not None]
+
+
+def serialize_run(run):
+    return {
+        'id': run.id,
+        'name': run.name,
+        'owner': run.owner,
+        'started_at': run.started_at.isoformat(),
+        'duration_ms': run.duration_ms,
+        'rows_touched': run.rows_touched,
+        'details': json.loads(run.details) if run.details else {},
+        'status': run.status,
+        'error': run.error
+    }
+
+
+def job_status(history=5):
+    """
+    Interval, lease and recent runs of every registered job
+    """
+    leases = {lease.name: lease for lease in JobLease.query.all()}
+    status = []
+    for name, job_spec in get_jobs().items():
+        lease = leases.get(name)
+        runs = JobRun.query.filter_by(name=name).order_by(JobRun.id.desc()).limit(history).all()
+        # A finished run releases its lease by expiring it
+        running = lease is not None and lease.expires_at > datetime.utcnow()
+        status.append({
+            'name': name,
+            'interval_seconds': _interval(job_spec),
+            'running': running,
+            'owner': lease.owner if running else None,
+            'last_started_at': lease.last_started_at.isoformat() if lease and lease.last_started_at else None,
+            'recent_runs': [serialize_run(run) for run in runs]
+        })
+    return status
+
+
+def init_scheduler(app):
+    """
+    Configure the job scheduler; start_scheduler() starts it in a worker
+    """
+    app.config.setdefault('SCHEDULER_ENABLED', os.environ.get('SCHEDULER_ENABLED', '1') != '0')
+    # How often each worker looks for due jobs
+    app.config.setdefault('SCHEDULER_TICK_SECONDS', 30)
+    # A job running longer than this is assumed dead and can be claimed again
+    app.config.setdefault('SCHEDULER_LEASE_SECONDS', 600)
+    # Per-job interval overrides, {job name: seconds}
+    app.config.setdefault('SCHEDULER_INTERVALS', {})
+    app.config.setdefault('SCHEDULER_HISTORY', 100)
+    # Unpaid tour bookings hold their seats this long before they expire
+    app.config.setdefault('BOOKING_HOLD_MINUTES', int(os.environ.get('BOOKING_HOLD_MINUTES', 24 * 60)))
+    # Pending vehicle requests nobody acted on expire after this
+    app.config.setdefault('VEHICLE_REQUEST_TTL_HOURS', int(os.environ.get('VEHICLE_REQUEST_TTL_HOURS', 72)))
+
+
+def start_scheduler(app):
+    """
+    Start this process's scheduler thread (once). Call it after forking,
+    e.g. from gunicorn's post_worker_init.
+    """
+    global _thread
+    if not app.config.get('SCHEDULER_ENABLED') or (_thread is not None and _thread.is_alive()):
+        return None
+    _stop.clear()
+    tick = app.config['SCHEDULER_TICK_SECONDS']
+
+    def loop():
+        # Spread the workers' first ticks so they don't all race for leases
+        _stop.wait(random.uniform(0, tick))
+        while not _stop.is_set():
+            with app.app_context():
+                try:
+                    run_due_jobs()
+                except Exception:
+                    logger.exception('Scheduler tick failed')
+                finally:
+                    db.session.remove()
+            _stop.wait(tick)
+
+    _thread = threading.Thread(target=loop, name='scheduler', daemon=True)
+    _thread.start()
+    return _thread
+
+
+def stop_scheduler(timeout=None):
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+if __name__ == '__main__':
+    # python scheduler.py            -- run due jobs forever (standalone process)
+    # python scheduler.py run NAME   -- run one job now
+    from app import create_app, CLI_CONFIG
+    app = create_app(CLI_CONFIG)
+    with app.app_context():
+        if sys.argv[1:2] == ['run'] and len(sys.argv) == 3:
+            run = run_job(sys.argv[2], force=True)
+            print(json.dumps(serialize_run(run) if run else {'message': 'Job is running elsewhere'}, indent=2))
+            sys.exit(0)
+        if sys.argv[1:]:
+            sys.exit('usage: python scheduler.py [run JOB]')
+    app.config['SCHEDULER_ENABLED'] = True
+    start_scheduler(app)
+    try:
+        while _thread.is_alive():
+            _thread.join(1)
+    except KeyboardInterrupt:
+        stop_scheduler()
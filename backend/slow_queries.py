@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sql_instrumentation import normalize_statement
+
+logger = logging.getLogger(__name__)
+
+_settings = {
+    'threshold': 0.1,       # seconds
+    'capacity': 500,        # distinct statement patterns kept in memory
+    'replan_interval': 300  # seconds before a pattern's query plan is captured again
+}
+_lock = threading.Lock()
+_entries = {}
+_listeners_installed = False
+
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def _parameter_shape(parameters, executemany):
+    if executemany:
+        rows = list(parameters or [])
+        first = _parameter_shape(rows[0], False) if rows else []
+        return {'executemany': len(rows), 'row': first}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in (parameters or ())]
+
+
+def _explain(cursor, statement, parameters, executemany):
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = next(iter(parameters or []), ())
+    try:
+        rows = cursor.connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ()).fetchall()
+    except Exception as e:
+        return [f'plan unavailable: {e}']
+    # Rows are (id, parent, notused, detail)
+    return [row[-1] for row in rows]
+
+
+def _has_full_scan(plan):
+    return any(detail.startswith('SCAN ') and 'INDEX' not in detail for detail in plan or [])
+
+
+def _current_route():
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    return 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_slow_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if elapsed < _settings['threshold']:
+        return
+    record_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+
+def record_slow_query(cursor, statement, parameters, executemany, elapsed):
+    pattern = normalize_statement(statement)
+    route = _current_route()
+    now = time.time()
+    with _lock:
+        entry = _entries.get(pattern)
+        needs_plan = entry is None or now - entry['planned_at'] >= _settings['replan_interval']
+    plan = _explain(cursor, statement, parameters, executemany) if needs_plan else None
+
+    with _lock:
+        entry = _entries.get(pattern)
+        if entry is None:
+            if len(_entries) >= _settings['capacity']:
+                # Keep the heaviest patterns; drop the one with least total time
+                del _entries[min(_entries, key=lambda key: _entries[key]['total_time'])]
+            entry = _entries[pattern] = {
+                'statement': pattern,
+                'count': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'routes': {},
+                'planned_at': 0.0,
+                'plan': None,
+                'first_seen': datetime.utcnow().isoformat()
+            }
+        entry['count'] += 1
+        entry['total_time'] += elapsed
+        entry['max_time'] = max(entry['max_time'], elapsed)
+        entry['last_time'] = elapsed
+        entry['last_seen'] = datetime.utcnow().isoformat()
+        entry['parameters'] = _parameter_shape(parameters, executemany)
+        entry['routes'][route] = entry['routes'].get(route, 0) + 1
+        if plan is not None:
+            entry['plan'] = plan
+            entry['planned_at'] = now
+
+    logger.warning('Slow query (%.1f ms) from %s: %s', elapsed * 1000, route, pattern[:300])
+
+
+def get_slow_queries(limit=20):
+    """
+    Return the slowest statement patterns, ordered by total time spent
+    """
+    with _lock:
+        entries = sorted(_entries.values(), key=lambda entry: -entry['total_time'])[:limit]
+        return [{
+            'statement': entry['statement'],
+            'count': entry['count'],
+            'total_ms': round(entry['total_time'] * 1000, 3),
+            'mean_ms': round(entry['total_time'] / entry['count'] * 1000, 3),
+            'max_ms': round(entry['max_time'] * 1000, 3),
+            'last_ms': round(entry['last_time'] * 1000, 3),
+            'parameters': entry['parameters'],
+            'routes': dict(entry['routes']),
+            'plan': entry['plan'],
+            'full_scan': _has_full_scan(entry['plan']),
+            'first_seen': entry['first_seen'],
+            'last_seen': entry['last_seen']
+        } for entry in entries]
+
+
+def reset_slow_queries():
+    with _lock:
+        _entries.clear()
+
+
+def init_slow_query_log(app):
+    """
+    Log statements slower than SLOW_QUERY_THRESHOLD_MS together with their
+    query plan, parameter shape and originating route, keeping a
+    deduplicated top list that admins can fetch
+    """
+    global _listeners_installed
+    app.config.setdefault('SLOW_QUERY_LOG', True)
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100)
+    app.config.setdefault('SLOW_QUERY_CAPACITY', 500)
+    if not app.config['SLOW_QUERY_LOG']:
+        return
+
+    configure_slow_query_log(app.config['SLOW_QUERY_THRESHOLD_MS'], app.config['SLOW_QUERY_CAPACITY'])
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+def configure_slow_query_log(threshold_ms=None, capacity=None):
+    if threshold_ms is not None:
+        _settings['threshold'] = threshold_ms / 1000.0
+    if capacity is not None:
+        _settings['capacity'] = capacity
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from columnar import TABLES, DTYPES, Columns, encode_chunks, read_table, table_columns, table_select
+from database import db
+
+# Columnar snapshots of the reporting tables, so reports read files instead
+# of the SQLite database that serves bookings. A snapshot is a directory
+# under SNAPSHOT_DIR holding one .npy file per column (str columns as int32
+# codes next to a JSON list of their values) and a manifest:
+#
+#   SNAPSHOT_DIR/CURRENT                      name of the snapshot to read
+#   SNAPSHOT_DIR/<name>/manifest.json         tables, row counts, build time
+#   SNAPSHOT_DIR/<name>/<table>/<column>.npy
+#   SNAPSHOT_DIR/<name>/<table>/<column>.json dictionary of a str column
+#
+# Snapshots are written under a temporary name, renamed into place and then
+# published by replacing CURRENT, so a reader sees either the old snapshot or
+# the new one, never half of one. Readers memory-map the columns, so every
+# worker shares the page cache copy and only touches the columns it uses.
+
+MANIFEST = 'manifest.json'
+POINTER = 'CURRENT'
+
+_lock = threading.Lock()
+# SNAPSHOT_DIR -> the Snapshot CURRENT named when last read
+_snapshots = {}
+
+
+class Snapshot:
+    """
+    A published snapshot, its columns memory-mapped read-only. Every table is
+    mapped when the snapshot is opened: a map outlives its file, so readers
+    holding the snapshot are unaffected when _prune deletes it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.name = self.manifest['name']
+        self.built_at = datetime.fromisoformat(self.manifest['built_at'])
+        self._tables = {name: self._open_table(name, info['columns'])
+                        for name, info in self.manifest['tables'].items()}
+
+    def _open_table(self, name, kinds):
+        directory = os.path.join(self.path, name)
+        values = {}
+        for column, kind in kinds.items():
+            if kind == 'str':
+                with open(os.path.join(directory, f'{column}.json')) as f:
+                    values[column] = json.load(f)
+        arrays = {column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r') for column in kinds}
+        return Columns(arrays, values)
+
+    def table(self, name):
+        return self._tables[name]
+
+
+@contextmanager
+def _consistent_reads(conn):
+    """
+    Run the enclosed reads in one SQLite read transaction, so every table
+    is read as of the same moment
+    """
+    # pysqlite only opens a transaction before writes; a session that has
+    # not written yet reads each statement on its own
+    dbapi_connection = conn.connection.dbapi_connection
+    if getattr(dbapi_connection, 'in_transaction', True):
+        yield
+        return
+    dbapi_connection.execute('BEGIN')
+    try:
+        yield
+    finally:
+        dbapi_connection.rollback()
+
+
+def _write_table(conn, name, directory):
+    kinds = table_columns(name)
+    rows = conn.execute(select(func.count()).select_from(table_select(name, kinds).subquery())).scalar()
+    os.makedirs(directory)
+    files = {
+        column: np.lib.format.open_memmap(os.path.join(directory, f'{column}.npy'), mode='w+',
+                                          dtype=DTYPES[kind], shape=(rows,))
+        for column, kind in kinds.items()
+    }
+    values = {}
+    written = 0
+    # The count and the rows come from the same read transaction
+    for chunk in encode_chunks(conn, name, kinds, values):
+        size = len(next(iter(chunk.values())))
+        for column, array in chunk.items():
+            files[column][written:written + size] = array
+        written += size
+    for column, array in files.items():
+        array.flush()
+    for column, kind in kinds.items():
+        if kind == 'str':
+            with open(os.path.join(directory, f'{column}.json'), 'w') as f:
+                json.dump(values[column].values_by_code() if column in values else [], f)
+    return {'rows': written, 'columns': kinds}
+
+
+def _publish(directory, name):
+    pointer = os.path.join(directory, POINTER)
+    with open(f'{pointer}.tmp', 'w') as f:
+        f.write(name)
+    os.replace(f'{pointer}.tmp', pointer)
+
+
+def _prune(directory, current, keep):
+    """
+    Delete all but the newest keep snapshots. Workers still reading an older
+    one keep their open maps.
+    """
+    names = sorted(name for name in os.listdir(directory)
+                   if not name.startswith('.') and os.path.isdir(os.path.join(directory, name)))
+    for name in names[:-keep] if keep else names:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def build_snapshot():
+    """
+    Write a snapshot of every reporting table and publish it. Returns its
+    manifest.
+    """
+    directory = current_app.config['SNAPSHOT_DIR']
+    built_at = datetime.utcnow()
+    name = built_at.strftime('%Y%m%dT%H%M%S%f')
+    staging = os.path.join(directory, f'.{name}.{os.getpid()}.tmp')
+    os.makedirs(staging)
+    try:
+        conn = db.session.connection()
+        with _consistent_reads(conn):
+            tables = {table: _write_table(conn, table, os.path.join(staging, table)) for table in TABLES}
+        manifest = {'name': name, 'built_at': built_at.isoformat(), 'tables': tables}
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        os.rename(staging, os.path.join(directory, name))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _publish(directory, name)
+    _prune(directory, name, current_app.config['SNAPSHOT_KEEP'])
+    return manifest
+
+
+def get_snapshot():
+    """
+    The snapshot CURRENT points at, or None when snapshots are off or none
+    has been published yet
+    """
+    directory = current_app.config.get('SNAPSHOT_DIR')
+    if not directory:
+        return None
+    # A snapshot can be pruned between reading CURRENT and opening it, once
+    # newer ones are published; CURRENT then names one of those
+    for _ in range(2):
+        try:
+            with open(os.path.join(directory, POINTER)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        cached = _snapshots.get(directory)
+        if cached and cached.name == name:
+            return cached
+        try:
+            snapshot = Snapshot(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        with _lock:
+            _snapshots[directory] = snapshot
+        return snapshot
+    # Still missing: read the live database this time
+    return None
+
+
+def load_tables(tables, live=False):
+    """
+    {table: Columns} for tables ({table: columns}) from the current snapshot,
+    or from the live database when live or there is none. Returns the tables
+    and the snapshot they came from (None for live).
+    """
+    snapshot = None if live else get_snapshot()
+    if snapshot:
+        return {name: snapshot.table(name) for name in tables}, snapshot
+    conn = db.session.connection()
+    with _consistent_reads(conn):
+        return {name: read_table(conn, name, columns) for name, columns in tables.items()}, None
+
+
+def init_snapshots(app):
+    """
+    Configure where snapshots are written; None turns them off and reports
+    read the live database
+    """
+    app.config.setdefault('SNAPSHOT_DIR', os.environ.get('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots')))
+    app.config.setdefault('SNAPSHOT_KEEP', int(os.environ.get('SNAPSHOT_KEEP', 2)))
+    if app.config['SNAPSHOT_DIR']:
+        os.makedirs(app.config['SNAPSHOT_DIR'], exist_ok=True)
+
+
+if __name__ == '__main__':
+    # python snapshots.py build  -- write and publish a snapshot now
+    from app import create_app, CLI_CONFIG
+    if sys.argv[1:] != ['build']:
+        sys.exit('usage: python snapshots.py build')
+    with create_app(CLI_CONFIG).app_context():
+        manifest = build_snapshot()
+        for table, info in manifest['tables'].items():
+            print(f'{table}: {info["rows"]} rows')
+        print(f'published {manifest["name"]}')
@@ -0,0 +1,118 @@
+import re
+import time
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Collapse literals and IN-lists so statements that differ only in their
+# parameters are grouped under one pattern
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+# Transaction control (e.g. savepoints around nested transactions) is not
+# query work and would otherwise skew per-request counts
+_TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+_listeners_installed = False
+
+
+def normalize_statement(statement):
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(?...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('_sql_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start lives on the statement's own execution context, so a statement
+    # that raises (and never reaches after_cursor_execute) leaves nothing behind
+    if context is not None and _current_stats() is not None:
+        context._sql_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = getattr(context, '_sql_query_start', None)
+    if stats is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if statement.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+        return
+    stats['count'] += 1
+    stats['time'] += elapsed
+    pattern = stats['patterns'].setdefault(normalize_statement(statement), [0, 0.0])
+    pattern[0] += 1
+    pattern[1] += elapsed
+
+
+def get_request_sql_stats():
+    """
+    Return the SQL statistics recorded so far for the current request, or None
+    """
+    return _current_stats()
+
+
+def find_n_plus_one(stats, threshold):
+    """
+    Return (pattern, count, seconds) for SELECTs repeated at least threshold
+    times in one request, which usually means a lazy load inside a loop
+    """
+    return sorted((
+        (pattern, count, seconds)
+        for pattern, (count, seconds) in stats['patterns'].items()
+        if count >= threshold and pattern.upper().startswith('SELECT')
+    ), key=lambda item: -item[1])
+
+
+def init_sql_instrumentation(app):
+    """
+    Record query count, SQL time and repeated statements for every request,
+    report them in a Server-Timing header and a debug log entry, and flag
+    probable N+1 query patterns
+    """
+    global _listeners_installed
+    app.config.setdefault('SQL_INSTRUMENTATION', True)
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+    @app.before_request
+    def start_sql_stats():
+        g._sql_stats = {'count': 0, 'time': 0.0, 'patterns': {}, 'started': time.perf_counter()}
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('_sql_stats', None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        sql_ms = stats['time'] * 1000
+        suspects = find_n_plus_one(stats, app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+
+        timings = [
+            f'db;dur={sql_ms:.2f};desc="{stats["count"]} queries"',
+            f'app;dur={total_ms:.2f}'
+        ]
+        if suspects:
+            timings.append(f'n-plus-one;desc="{len(suspects)} repeated SELECT patterns"')
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        app.logger.debug(
+            '%s %s: %d queries in %.2f ms (request %.2f ms)',
+            request.method, request.path, stats['count'], sql_ms, total_ms
+        )
+        for pattern, count, seconds in suspects:
+            app.logger.debug('Probable N+1: %dx (%.2f ms) %s', count, seconds * 1000, pattern[:300])
+        return response
@@ -1,39 +1,69 @@
 import os
 import unittest
-from app import app
+from app import create_app
 from database import db
 from models import User, Destination, Tour, TourDate, Booking, Review
 from datetime import datetime, timedelta
 import json
 from werkzeug.security import generate_password_hash
+from testing import DatabaseTestCase, get_test_app
 
-class TestBackend(unittest.TestCase):
-    def setUp(self):
-        # Configure test database
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/test.db'
-        app.config['TESTING'] = True
-        self.client = app.test_client()
 
-        with app.app_context():
-            # Create test database and tables
-            if not os.path.exists('instance'):
-                os.makedirs('instance')
-            db.create_all()
+def seed(app):
+    # Test admin user, shared by every test
+    admin = User(
+        name='Test Admin',
+        email='admin@test.com',
+        password_hash=generate_password_hash('test123', method=app.config['PASSWORD_HASH_METHOD']),
+        is_admin=True
+    )
+    db.session.add(admin)
+    db.session.commit()
 
-            # Create test admin user
-            admin = User(
-                name='Test Admin',
-                email='admin@test.com',
-                password_hash=generate_password_hash('test123'),
-                is_admin=True
-            )
-            db.session.add(admin)
-            db.session.commit()
 
-    def tearDown(self):
-        with app.app_context():
-            db.session.remove()
-            db.drop_all()
+# Schema and seed data are built once per test process; each test runs in a
+# transaction that is rolled back afterwards
+app = get_test_app(seed)
+
+class TestBackend(DatabaseTestCase):
+    app = app
+
+    def _login(self, email, password='test123'):
+        response = self.client.post('/api/auth/login', json={'email': email, 'password': password})
+        return response.json['token']
+
+    def _register_and_login(self, email='test@test.com'):
+        self.client.post('/api/auth/register', json={
+            'name': 'Test User',
+            'email': email,
+            'password': 'test123'
+        })
+        return self._login(email)
+
+    def _create_tour(self, admin_token, available_seats=20, price=100.0):
+        destination_id = self.client.post(
+            '/api/destinations',
+            json={'name': 'Test Destination', 'description': 'A test destination', 'country': 'Test Country'},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        ).json['destination_id']
+        tour_id = self.client.post(
+            '/api/tours',
+            json={
+                'name': 'Test Tour',
+                'description': 'A test tour',
+                'destination_id': destination_id,
+                'duration_days': 5,
+                'price': price,
+                'max_participants': available_seats,
+                'departure_dates': [{
+                    'date': datetime(2030, 5, 1).isoformat(),
+                    'available_seats': available_seats
+                }]
+            },
+            headers={'Authorization': f'Bearer {admin_token}'}
+        ).json['tour_id']
+        tour_date_id = self.client.get(f'/api/tours/{tour_id}').json['tour']['available_dates'][0]['id']
+        return tour_id, tour_date_id
 
     def test_register_user(self):
         response = self.client.post('/api/auth/register', json={
@@ -198,5 +228,1206 @@ class TestBackend(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertIn('success', response.json['message'].lower())
 
+    def test_database_info(self):
+        response = self.client.get('/api/database/info?refresh=1')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json['statistics']
+        self.assertEqual(stats['total_users'], 1)
+        self.assertIn('booking', response.json['schema']['tables'])
+        self.assertGreater(stats['database_size'], 0)
+
+        # Counts are maintained on commit without waiting for the cache TTL
+        self.client.post('/api/auth/register', json={
+            'name': 'Test User',
+            'email': 'test@test.com',
+            'password': 'test123'
+        })
+        response = self.client.get('/api/database/info')
+        self.assertEqual(response.json['statistics']['total_users'], 2)
+
+        # Bulk deletes bypass the ORM counters, so they drop the cached counts
+        from sqlalchemy import delete, text
+        with app.app_context():
+            db.session.execute(delete(User).where(User.email == 'test@test.com'))
+            db.session.commit()
+        response = self.client.get('/api/database/info')
+        self.assertEqual(response.json['statistics']['total_users'], 1)
+
+        # A schema change is picked up without a restart: on refresh (or once
+        # the TTL expires), or straight away after create_all
+        from sqlalchemy import create_engine
+        from database_stats import get_schema, get_sizes
+        engine = create_engine('sqlite://')
+        for table in ('first', 'second'):
+            with engine.begin() as conn:
+                conn.execute(text(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY)'))
+            self.assertEqual(sorted(get_schema(engine))[-1], 'first')
+            self.assertEqual(sorted(get_schema(engine, refresh=True))[-1], table)
+        db.metadata.create_all(engine)
+        self.assertIn('vehicle_slot', get_schema(engine))
+
+        # Cached sizes are copied out, so callers cannot change them
+        get_sizes(engine)['database_size'] = None
+        self.assertIsNotNone(get_sizes(engine)['database_size'])
+        engine.dispose()
+
+    def test_batch_vehicle_booking_approvals(self):
+        self.client.post('/api/auth/register', json={
+            'name': 'Test User',
+            'email': 'test@test.com',
+            'password': 'test123'
+        })
+        token = self.client.post('/api/auth/login', json={
+            'email': 'test@test.com',
+            'password': 'test123'
+        }).json['token']
+        admin_token = self.client.post('/api/auth/login', json={
+            'email': 'admin@test.com',
+            'password': 'test123'
+        }).json['token']
+
+        vehicle_id = self.client.post(
+            '/api/vehicles',
+            json={'name': 'Test Car', 'type': 'car'},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        ).json['vehicle_id']
+
+        booking_ids = []
+        for from_date, to_date in [('2030-01-01', '2030-01-03'), ('2030-01-02', '2030-01-04'), ('2030-01-10', '2030-01-10')]:
+            response = self.client.post(
+                '/api/vehicle-bookings',
+                json={
+                    'vehicle_id': vehicle_id,
+                    'from_date': from_date,
+                    'to_date': to_date,
+                    'from_place': 'A',
+                    'to_place': 'B'
+                },
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            booking_ids.append(response.json['booking_id'])
+
+        response = self.client.patch(
+            '/api/vehicle-bookings/batch',
+            json={'updates': [
+                {'id': booking_ids[0], 'status': 'approved'},
+                {'id': booking_ids[1], 'status': 'approved'},
+                {'id': booking_ids[2], 'status': 'approved'},
+                {'id': 999999, 'status': 'rejected'}
+            ]},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], ['success', 'error', 'success', 'error'])
+        self.assertEqual(results[1]['conflicting_booking_id'], booking_ids[0])
+        self.assertEqual(response.json['updated'], 2)
+
+        # Re-approving an approved booking in the same batch keeps its slots
+        # in the way of an overlapping approval
+        response = self.client.patch(
+            '/api/vehicle-bookings/batch',
+            json={'updates': [{'id': booking_ids[1], 'status': 'approved'},
+                              {'id': booking_ids[0], 'status': 'approved'}]},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        self.assertEqual([r['status'] for r in response.json['results']], ['error', 'success'])
+        self.assertEqual(response.json['results'][0]['conflicting_booking_id'], booking_ids[0])
+        # ...while rejecting it in the batch frees them
+        response = self.client.patch(
+            '/api/vehicle-bookings/batch',
+            json={'updates': [{'id': booking_ids[1], 'status': 'approved'},
+                              {'id': booking_ids[0], 'status': 'rejected'}]},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        self.assertEqual([r['status'] for r in response.json['results']], ['success', 'success'])
+
+        # Moving a booking's slots in memory touches only its own days
+        from datetime import date
+        from vehicle_slots import add_windows
+        other = [(0, 60, 2)]
+        slots = {(1, date(2030, 1, 1)): [(0, 60, 1)], (1, date(2030, 1, 2)): other}
+        add_windows(slots, 1, [(date(2030, 1, 1), 60, 120)], 1)
+        self.assertEqual(slots[(1, date(2030, 1, 1))], [(60, 120, 1)])
+        self.assertIs(slots[(1, date(2030, 1, 2))], other)
+
+    def test_vehicle_booking_writes_lock_the_vehicle(self):
+        from models import VehicleBooking, VehicleLock
+        token = self._register_and_login()
+        admin_headers = {'Authorization': f'Bearer {self._login("admin@test.com")}'}
+        vehicle_id = self.client.post('/api/vehicles', json={'name': 'Van', 'type': 'van'},
+                                      headers=admin_headers).json['vehicle_id']
+
+        def lock_version():
+            lock = db.session.get(VehicleLock, vehicle_id)
+            return lock.version if lock else 0
+
+        def request_booking():
+            return self.client.post('/api/vehicle-bookings', json={
+                'vehicle_id': vehicle_id, 'from_date': '2030-06-01', 'from_place': 'A', 'to_place': 'B'
+            }, headers={'Authorization': f'Bearer {token}'}).json['booking_id']
+
+        with app.app_context():
+            first, second = request_booking(), request_booking()
+            self.assertEqual(lock_version(), 2)
+            # Approvals, single or batched, take it before their check too
+            self.assertEqual(self.client.patch(f'/api/vehicle-bookings/{first}', json={'status': 'approved'},
+                                               headers=admin_headers).status_code, 200)
+            response = self.client.patch('/api/vehicle-bookings/batch', json={
+                'updates': [{'id': second, 'status': 'approved'}]
+            }, headers=admin_headers)
+            self.assertEqual(response.json['results'][0]['conflicting_booking_id'], first)
+            db.session.expire_all()
+            self.assertEqual(lock_version(), 4)
+            self.assertEqual(db.session.get(VehicleBooking, second).status, 'pending')
+
+    def test_concurrent_vehicle_writes_never_double_book(self):
+        # Real threads on a file database: the shared in-memory test database
+        # cannot have two writers at once
+        import tempfile
+        from benchmarks.vehicle_contention import approved_overlaps, create_contention_app, hammer
+        with tempfile.TemporaryDirectory() as directory:
+            contention_app, vehicle_id, tokens = create_contention_app(os.path.join(directory, 'contention.db'), 8)
+            samples = hammer(contention_app, vehicle_id, tokens, clients=8, duration=2, days=1)
+            approved, pairs = approved_overlaps(contention_app, vehicle_id)
+            with contention_app.app_context():
+                db.engine.dispose()
+        self.assertEqual([status for _, status, _ in samples if status >= 500], [])
+        self.assertGreater(approved, 1)
+        self.assertEqual(pairs, set())
+
+    def test_rate_limits_and_concurrency_caps(self):
+        import tempfile
+        from unittest.mock import patch
+        from rate_limits import RateLimitStore, get_store
+        store = get_store(app)
+        store.reset()
+        self.addCleanup(store.reset)
+        admin_headers = {'Authorization': f'Bearer {self._login("admin@test.com")}'}
+        limits = {'auth': {'rate': 1 / 60, 'burst': 2, 'concurrency': 4},
+                  'admin_list': {'rate': 1, 'burst': 5, 'concurrency': 1}}
+
+        def login(email, address='10.0.0.1'):
+            return self.client.post('/api/auth/login', json={'email': email, 'password': 'wrong'},
+                                    environ_base={'REMOTE_ADDR': address})
+
+        with patch.dict(app.config, RATE_LIMITS=limits):
+            self.assertEqual([login('a@test.com').status_code for _ in range(2)], [401, 401])
+            response = login('a@test.com')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '60')
+            # The same IP is out of tokens for any account, and the account
+            # for any IP
+            self.assertEqual(login('b@test.com').status_code, 429)
+            self.assertEqual(login('a@test.com', '10.0.0.2').status_code, 429)
+            self.assertEqual(login('b@test.com', '10.0.0.2').status_code, 401)
+
+            # Behind a proxy, batched sign-ins are charged to the client
+            # named in X-Forwarded-For, not to the proxy
+            def batch_login(client_address):
+                response = self.client.post('/api/batch', json={'requests': [
+                    {'method': 'POST', 'path': '/api/auth/login', 'body': {'email': 'c@test.com', 'password': 'wrong'}}
+                ]}, headers={'X-Forwarded-For': client_address}, environ_base={'REMOTE_ADDR': '10.0.0.9'})
+                return response.json['responses'][0]['status']
+
+            with patch.dict(app.config, RATE_LIMIT_PROXY_HOPS=1):
+                self.assertEqual([login('d@test.com', '10.0.0.9').status_code for _ in range(3)], [401, 401, 429])
+                self.assertEqual(batch_login('10.0.1.1'), 401)
+
+            # A class at its cap turns requests away until one finishes
+            self.assertTrue(store.acquire('admin_list', 1))
+            response = self.client.get('/api/auth/admin/users', headers=admin_headers)
+            self.assertEqual((response.status_code, response.headers['Retry-After']), (503, '1'))
+            store.release('admin_list')
+            self.assertEqual(self.client.get('/api/auth/admin/users', headers=admin_headers).status_code, 200)
+            self.assertEqual(store.in_flight('admin_list'), 0)
+
+        # Stores opened on one file (one per worker) share their buckets
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rate_limits.bin')
+            first, second = RateLimitStore(64, ['auth'], path), RateLimitStore(64, ['auth'], path)
+            self.assertEqual(first.take(['auth:ip:x'], 1, 1, 100.0), 0)
+            self.assertEqual(second.take(['auth:ip:x'], 1, 1, 100.5), 0.5)
+            self.assertTrue(first.acquire('auth', 1))
+            self.assertFalse(second.acquire('auth', 1))
+
+    def test_vehicle_time_slots(self):
+        token = self._register_and_login()
+        admin_token = self._login('admin@test.com')
+        vehicle_id = self.client.post(
+            '/api/vehicles',
+            json={'name': 'Test Car', 'type': 'car'},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        ).json['vehicle_id']
+
+        def request_booking(from_date, to_date=None, **times):
+            return self.client.post(
+                '/api/vehicle-bookings',
+                json=dict({'vehicle_id': vehicle_id, 'from_date': from_date, 'to_date': to_date,
+                           'from_place': 'A', 'to_place': 'B'}, **times),
+                headers={'Authorization': f'Bearer {token}'}
+            )
+
+        def approve(booking_id):
+            return self.client.patch(f'/api/vehicle-bookings/{booking_id}', json={'status': 'approved'},
+                                     headers={'Authorization': f'Bearer {admin_token}'})
+
+        morning = request_booking('2030-03-01', start_time='08:00', end_time='10:00').json['booking_id']
+        self.assertEqual(approve(morning).status_code, 200)
+
+        # Two more trips fit the same day; an overlapping one does not
+        afternoon = request_booking('2030-03-01', start_time='10:00', end_time='12:30')
+        self.assertEqual(afternoon.status_code, 201)
+        legacy = request_booking('2030-03-01', time='14:00')
+        self.assertEqual(legacy.status_code, 201)
+        response = request_booking('2030-03-01', start_time='09:30', end_time='11:00')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(request_booking('2030-03-01', start_time='11:00', end_time='10:00').status_code, 400)
+
+        response = self.client.patch(
+            '/api/vehicle-bookings/batch',
+            json={'updates': [{'id': afternoon.json['booking_id'], 'status': 'approved'},
+                              {'id': legacy.json['booking_id'], 'status': 'approved'}]},
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        self.assertEqual(response.json['updated'], 2)
+
+        # A multi-day trip ending at 07:00 on the 1st clashes with nothing
+        overnight = request_booking('2030-02-28', '2030-03-01', start_time='20:00', end_time='07:00')
+        self.assertEqual(approve(overnight.json['booking_id']).status_code, 200)
+        # The legacy 14:00 booking holds the rest of its day
+        self.assertEqual(request_booking('2030-03-01', start_time='18:00', end_time='19:00').status_code, 400)
+
+        calendar = self.client.get(f'/api/vehicles/{vehicle_id}/calendar').json
+        self.assertEqual(calendar['booked_dates'], [])
+        self.assertEqual(
+            [(s['date'], s['start_time'], s['end_time']) for s in calendar['slots']],
+            [('2030-02-28', '20:00', '24:00'), ('2030-03-01', '00:00', '07:00'), ('2030-03-01', '08:00', '10:00'),
+             ('2030-03-01', '10:00', '12:30'), ('2030-03-01', '14:00', '24:00')]
+        )
+
+        # Rescheduling sends the booking back for approval and frees its slot
+        self.client.patch(f'/api/vehicle-bookings/{morning}', json={'from_date': '2030-03-02', 'to_date': '2030-03-02'},
+                          headers={'Authorization': f'Bearer {token}'})
+        first = request_booking('2030-03-01', start_time='08:30', end_time='09:00').json['booking_id']
+        second = request_booking('2030-03-01', start_time='08:45', end_time='09:30').json['booking_id']
+        self.assertEqual(approve(first).status_code, 200)
+        response = approve(second)
+        self.assertEqual((response.status_code, response.json['conflicting_booking_id']), (400, first))
+        bookings = self.client.get('/api/vehicle-bookings', headers={'Authorization': f'Bearer {token}'}).json['bookings']
+        self.assertEqual({(b['start_time'], b['end_time'], b['time']) for b in bookings if b['id'] == morning},
+                         {('08:00', '10:00', '08:00')})
+
+        # The migration copies only real times of day out of the legacy column
+        from datetime import date, time
+        from migrations import migrate_vehicle_slots
+        from models import VehicleBooking
+        with app.app_context():
+            user_id = VehicleBooking.query.get(morning).user_id
+            legacy_ids = {}
+            for day, legacy_time in enumerate(('9:15', '23:59', '24:30', '29:00', 'noon'), start=10):
+                booking = VehicleBooking(user_id=user_id, vehicle_id=vehicle_id, from_date=date(2030, 3, day),
+                                         time=legacy_time, status='approved', from_place='A', to_place='B')
+                db.session.add(booking)
+                db.session.flush()
+                legacy_ids[legacy_time] = booking.id
+            db.session.commit()
+            migrate_vehicle_slots()
+            self.assertEqual({legacy_time: VehicleBooking.query.get(booking_id).start_time
+                              for legacy_time, booking_id in legacy_ids.items()},
+                             {'9:15': time(9, 15), '23:59': time(23, 59), '24:30': None, '29:00': None, 'noon': None})
+
+    def test_user_bookings_pages_are_cached(self):
+        admin_token = self._login('admin@test.com')
+        tour_id, tour_date_id = self._create_tour(admin_token)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        booking_ids = [
+            self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': n},
+                             headers=headers).json['booking_id']
+            for n in (1, 2, 3)
+        ]
+        self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 1},
+                         headers={'Authorization': f'Bearer {admin_token}'})
+
+        # One joined query (plus the token's user lookup and the tours
+        # version), newest first
+        response = self.client.get('/api/bookings?per_page=2', headers=headers)
+        self.assertIn('desc="3 queries"', response.headers['Server-Timing'])
+        self.assertEqual([b['id'] for b in response.json['bookings']], booking_ids[:0:-1])
+        self.assertEqual(response.json['bookings'][0]['tour']['destination'], 'Test Destination')
+        self.assertEqual(response.json['pagination'], {'page': 1, 'per_page': 2, 'total': 3, 'pages': 2})
+        self.assertIn('private', response.headers['Cache-Control'])
+        etag = response.headers['ETag']
+
+        # Cached: only the user and version lookups, and a matching ETag gets a 304
+        response = self.client.get('/api/bookings?per_page=2', headers=headers)
+        self.assertIn('desc="2 queries"', response.headers['Server-Timing'])
+        response = self.client.get('/api/bookings?per_page=2', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/bookings?page=2&per_page=2', headers=headers).json['bookings'][0]['id'],
+                         booking_ids[0])
+        self.assertEqual(self.client.get('/api/bookings?page=3&per_page=2', headers=headers).json['pagination']['total'], 3)
+
+        # Changes to the user's bookings invalidate their pages
+        self.client.post(f'/api/bookings/{booking_ids[2]}/cancel', headers=headers)
+        response = self.client.get('/api/bookings?per_page=2', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['bookings'][0]['booking_status'], 'cancelled')
+        self.client.put(f'/api/bookings/{booking_ids[1]}', json={'special_requests': 'Window seat'}, headers=headers)
+        response = self.client.get('/api/bookings?per_page=2', headers=headers)
+        self.assertEqual(response.json['bookings'][1]['special_requests'], 'Window seat')
+        self.assertEqual(self.client.get('/api/bookings?per_page=500', headers=headers).status_code, 400)
+
+        # So do edits to the tours they show
+        self.client.put(f'/api/tours/{tour_id}', json={'name': 'Renamed Tour'},
+                        headers={'Authorization': f'Bearer {admin_token}'})
+        response = self.client.get('/api/bookings?per_page=2', headers=headers)
+        self.assertEqual(response.json['bookings'][0]['tour']['name'], 'Renamed Tour')
+
+    def test_archival_moves_finished_bookings(self):
+        from datetime import date
+        from archival import archive_bookings
+        from models import OTPToken, VehicleSlot
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        _, tour_date_id = self._create_tour(admin_token)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        booking_ids = [
+            self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 1},
+                             headers=headers).json['booking_id']
+            for _ in range(4)
+        ]
+        self.client.post(f'/api/bookings/{booking_ids[0]}/cancel', headers=headers)
+        summary = self.client.get('/api/bookings/admin/summary', headers=admin_headers).json['summary']
+        self.assertEqual(self.client.get('/api/bookings', headers=headers).json['pagination']['total'], 4)
+
+        vehicle_id = self.client.post('/api/vehicles', json={'name': 'Test Car', 'type': 'car'},
+                                      headers=admin_headers).json['vehicle_id']
+        vehicle_booking_ids = []
+        for day in ('2030-05-02', '2030-07-01', '2030-07-02'):
+            vehicle_booking_ids.append(self.client.post(
+                '/api/vehicle-bookings',
+                json={'vehicle_id': vehicle_id, 'from_date': day, 'from_place': 'A', 'to_place': 'B'},
+                headers=headers
+            ).json['booking_id'])
+            self.client.patch(f'/api/vehicle-bookings/{vehicle_booking_ids[-1]}', json={'status': 'approved'},
+                              headers=admin_headers)
+
+        self.client.post('/api/auth/forgot-password', json={'email': 'test@test.com'})
+        with app.app_context():
+            otp = OTPToken.query.first()
+            otp.created_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            otp_code = otp.token
+        response = self.client.post('/api/auth/reset-password',
+                                    json={'email': 'test@test.com', 'token': otp_code, 'new_password': 'x'})
+        self.assertEqual(response.status_code, 400)
+        # The code's stated lifetime is the one reset enforces
+        import contextlib
+        import io
+        from email_utils import send_otp
+        output = io.StringIO()
+        with app.app_context(), contextlib.redirect_stdout(output):
+            send_otp('test@test.com', otp_code)
+        self.assertIn(f"Valid for {app.config['OTP_TTL_MINUTES']} minutes", output.getvalue())
+
+        # The 5-day tour left on 2030-05-01; the newest row of each table stays
+        with app.app_context():
+            moved = archive_bookings(batch_size=2, today=date(2030, 6, 1))
+        self.assertEqual(moved, {'booking': 3, 'vehicle_booking': 1, 'otp_token': 1})
+
+        response = self.client.get('/api/bookings', headers=headers)
+        self.assertEqual([b['id'] for b in response.json['bookings']], [booking_ids[3]])
+        response = self.client.get('/api/bookings?include_archived=1', headers=headers)
+        self.assertEqual([(b['id'], b['archived']) for b in response.json['bookings']],
+                         [(booking_ids[3], False)] + [(i, True) for i in booking_ids[2::-1]])
+        self.assertEqual(response.json['bookings'][-1]['booking_status'], 'cancelled')
+        self.assertEqual(self.client.get(f'/api/bookings/{booking_ids[0]}', headers=headers).status_code, 404)
+        response = self.client.get(f'/api/bookings/{booking_ids[0]}?include_archived=1', headers=headers)
+        self.assertTrue(response.json['booking']['archived'])
+        self.assertEqual(len(self.client.get('/api/bookings/admin/bookings?include_archived=1',
+                                             headers=admin_headers).json['bookings']), 4)
+
+        response = self.client.get('/api/vehicle-bookings', headers=headers)
+        self.assertEqual([b['id'] for b in response.json['bookings']], vehicle_booking_ids[1:])
+        response = self.client.get('/api/vehicle-bookings?include_archived=1', headers=headers)
+        self.assertEqual({b['id']: b['archived'] for b in response.json['bookings']},
+                         {vehicle_booking_ids[0]: True, vehicle_booking_ids[1]: False, vehicle_booking_ids[2]: False})
+        with app.app_context():
+            self.assertEqual(VehicleSlot.query.filter_by(booking_id=vehicle_booking_ids[0]).count(), 0)
+            from booking_summaries import rebuild_summaries
+            rebuild_summaries()
+        # Summaries cover archived bookings too, before and after a rebuild
+        self.assertEqual(self.client.get('/api/bookings/admin/summary', headers=admin_headers).json['summary'], summary)
+
+    def test_maintenance_jobs_expire_stale_holds(self):
+        from models import Booking, JobLease, VehicleBooking
+        from scheduler import run_job
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        tour_id, tour_date_id = self._create_tour(admin_token, available_seats=10, price=100.0)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        stale, paid, recent = [
+            self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': n},
+                             headers=headers).json['booking_id']
+            for n in (2, 3, 1)
+        ]
+        vehicle_id = self.client.post('/api/vehicles', json={'name': 'Test Car', 'type': 'car'},
+                                      headers=admin_headers).json['vehicle_id']
+        stale_request, fresh_request = [
+            self.client.post('/api/vehicle-bookings',
+                             json={'vehicle_id': vehicle_id, 'from_date': '2030-05-02', 'from_place': 'A', 'to_place': 'B'},
+                             headers=headers).json['booking_id']
+            for _ in range(2)
+        ]
+        with app.app_context():
+            long_ago = datetime.utcnow() - timedelta(days=5)
+            for booking_id in (stale, paid):
+                db.session.get(Booking, booking_id).created_at = long_ago
+            db.session.get(Booking, paid).payment_status = 'paid'
+            db.session.get(VehicleBooking, stale_request).created_at = long_ago
+            db.session.commit()
+        self.assertEqual(self.client.get('/api/tours').json['tours'][0]['available_dates'][0]['available_seats'], 4)
+        self.client.get('/api/bookings', headers=headers)
+
+        with app.app_context():
+            run = run_job('expire_unpaid_bookings')
+            self.assertEqual((run.status, run.rows_touched), ('success', 3))
+            self.assertEqual(run_job('expire_vehicle_requests').rows_touched, 1)
+            # Neither job is due again yet
+            self.assertIsNone(run_job('expire_unpaid_bookings'))
+
+        response = self.client.get('/api/bookings', headers=headers)
+        self.assertEqual({b['id']: (b['booking_status'], b['payment_status']) for b in response.json['bookings']},
+                         {stale: ('cancelled', 'expired'), paid: ('pending', 'paid'), recent: ('pending', 'pending')})
+        self.assertEqual(self.client.get('/api/tours').json['tours'][0]['available_dates'][0]['available_seats'], 6)
+        summary = self.client.get('/api/bookings/admin/summary', headers=admin_headers).json['summary']
+        self.assertEqual({k: summary['tour'][0][k] for k in ('bookings', 'participants', 'revenue', 'cancellations')},
+                         {'bookings': 2, 'participants': 4, 'revenue': 400.0, 'cancellations': 1})
+        response = self.client.get('/api/vehicle-bookings', headers=headers)
+        self.assertEqual({b['id']: b['status'] for b in response.json['bookings']},
+                         {stale_request: 'expired', fresh_request: 'pending'})
+
+        response = self.client.get('/api/jobs', headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        jobs = {job['name']: job for job in response.json['jobs']}
+        last_run = jobs['expire_unpaid_bookings']['recent_runs'][0]
+        self.assertEqual(last_run['details'], {'bookings_expired': 1, 'seats_released': 2})
+        self.assertGreaterEqual(last_run['duration_ms'], 0)
+        self.assertFalse(jobs['expire_unpaid_bookings']['running'])
+
+        # A manual run skips the interval but not a lease held by another worker
+        response = self.client.post('/api/jobs/expire_unpaid_bookings/run', headers=admin_headers)
+        self.assertEqual(response.json['run']['rows_touched'], 0)
+        with app.app_context():
+            lease = db.session.get(JobLease, 'expire_unpaid_bookings')
+            lease.owner, lease.expires_at = 'elsewhere:1', datetime.utcnow() + timedelta(minutes=5)
+            db.session.commit()
+        self.assertEqual(self.client.post('/api/jobs/expire_unpaid_bookings/run', headers=admin_headers).status_code, 409)
+        self.assertEqual(self.client.post('/api/jobs/nope/run', headers=admin_headers).status_code, 404)
+        self.assertEqual(self.client.get('/api/jobs', headers=headers).status_code, 403)
+
+    def test_booking_summaries(self):
+        token = self._register_and_login()
+        admin_token = self._login('admin@test.com')
+        tour_id, tour_date_id = self._create_tour(admin_token, available_seats=10, price=100.0)
+
+        booking_ids = []
+        for participants in (2, 3):
+            response = self.client.post(
+                '/api/bookings',
+                json={'tour_date_id': tour_date_id, 'number_of_participants': participants},
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            booking_ids.append(response.json['booking_id'])
+        self.client.post(f'/api/bookings/{booking_ids[0]}/cancel', headers={'Authorization': f'Bearer {token}'})
+
+        response = self.client.get('/api/bookings/admin/summary', headers={'Authorization': f'Bearer {admin_token}'})
+        self.assertEqual(response.status_code, 200)
+        summary = response.json['summary']
+        expected = {'bookings': 1, 'participants': 3, 'revenue': 300.0, 'cancellations': 1}
+        for scope in ('tour', 'tour_date', 'month'):
+            self.assertEqual(len(summary[scope]), 1)
+            row = summary[scope][0]
+            self.assertEqual({k: row[k] for k in expected}, expected)
+            self.assertEqual(row['capacity'], 10)
+            self.assertAlmostEqual(row['load_factor'], 0.3)
+        self.assertEqual(summary['month'][0]['month'], '2030-05')
+
+        # A full rebuild produces the same figures as the incremental updates
+        from booking_summaries import rebuild_summaries, get_summaries
+        with app.app_context():
+            incremental = get_summaries('tour_date')
+            rebuild_summaries()
+            self.assertEqual(get_summaries('tour_date'), incremental)
+
+    def test_price_quotes_apply_layered_rules(self):
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        tour_id, tour_date_id = self._create_tour(admin_token, price=100.0)
+        rules = [
+            {'kind': 'season', 'modifier': 1.2, 'start_date': '2030-04-01', 'end_date': '2030-06-30'},
+            {'kind': 'group', 'modifier': 0.9, 'min_participants': 4},
+            {'kind': 'group', 'modifier': 0.8, 'min_participants': 4, 'tour_id': tour_id},
+            {'kind': 'early_bird', 'modifier': 0.95, 'min_days_before': 180},
+        ]
+        rule_ids = []
+        for rule in rules:
+            response = self.client.post('/api/tours/pricing-rules', json=rule, headers=admin_headers)
+            self.assertEqual(response.status_code, 201)
+            rule_ids.append(response.json['rule']['id'])
+        response = self.client.post('/api/tours/pricing-rules', json={'kind': 'group', 'modifier': 0.9},
+                                    headers=admin_headers)
+        self.assertEqual(response.status_code, 400)
+
+        def quote(participants, booked_on='2030-04-25', **extra):
+            return self.client.post('/api/tours/quotes', json={
+                'booked_on': booked_on,
+                'quotes': [dict(tour_date_id=tour_date_id, participants=n, **extra) for n in participants]
+            })
+
+        # The tour's own group rule beats the global one; kinds multiply
+        response = quote([2, 4])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(q['unit_price'], q['total_price']) for q in response.json['quotes']],
+                         [(120.0, 240.0), (96.0, 384.0)])
+        self.assertEqual(response.json['quotes'][1]['modifiers'], {'season': 1.2, 'group': 0.8, 'early_bird': 1.0})
+        self.assertEqual(quote([1], booked_on='2029-01-01').json['quotes'][0]['unit_price'], 114.0)
+        self.assertEqual(len(quote([1, 2, 3, 4, 5] * 400).json['quotes']), 2000)
+
+        self.assertEqual(quote([1], tour_id=tour_id + 1).status_code, 400)
+        self.assertEqual(self.client.post('/api/tours/quotes', json={'quotes': [{'tour_date_id': 999}]}).status_code, 404)
+        self.assertEqual(quote([0]).status_code, 400)
+
+        # Rule and price changes reach the cached price book
+        self.client.delete(f'/api/tours/pricing-rules/{rule_ids[2]}', headers=admin_headers)
+        self.assertEqual(quote([4]).json['quotes'][0]['unit_price'], 108.0)
+        self.client.put(f'/api/tours/{tour_id}', json={'price': 200.0}, headers=admin_headers)
+        self.assertEqual(quote([4]).json['quotes'][0]['unit_price'], 216.0)
+
+        # Bookings are charged the quoted price (booked today, so early)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        booking_id = self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 4},
+                                      headers=headers).json['booking_id']
+        booking = self.client.get(f'/api/bookings/{booking_id}', headers=headers).json['booking']
+        self.assertEqual(booking['total_price'], quote([4], booked_on=None).json['quotes'][0]['total_price'])
+        self.assertEqual(booking['total_price'], 820.8)
+
+        # Listings show what one person booking today is charged
+        one = quote([1], booked_on=None).json['quotes'][0]['unit_price']
+        listed = self.client.get('/api/tours').json['tours'][0]['available_dates'][0]['price']
+        detail = self.client.get(f'/api/tours/{tour_id}').json['tour']['available_dates'][0]['price']
+        self.assertEqual((listed, detail), (one, one))
+        self.client.delete(f'/api/tours/pricing-rules/{rule_ids[3]}', headers=admin_headers)
+        self.assertEqual(self.client.get('/api/tours').json['tours'][0]['available_dates'][0]['price'], 240.0)
+
+    def test_booking_analytics_reports(self):
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        tour_id, tour_date_id = self._create_tour(admin_token, available_seats=20, price=100.0)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        booking_ids = [
+            self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': n},
+                             headers=headers).json['booking_id']
+            for n in (2, 3, 1)
+        ]
+        self.client.post(f'/api/bookings/{booking_ids[2]}/cancel', headers=headers)
+
+        def report(name, query=''):
+            response = self.client.get(f'/api/analytics/{name}?refresh=1{query}', headers=admin_headers)
+            self.assertEqual(response.status_code, 200)
+            return response.json
+
+        departures = report('load-factor')['departures']
+        self.assertEqual([(d['tour_date_id'], d['booked_seats'], d['capacity'], d['load_factor']) for d in departures],
+                         [(tour_date_id, 5, 20, 0.25)])
+        self.assertEqual(departures[0]['departure_date'], '2030-05-01')
+        tours = report('cancellations')['tours']
+        self.assertEqual([(t['tour_id'], t['bookings'], t['cancellations'], t['cancellation_rate']) for t in tours],
+                         [(tour_id, 3, 1, 0.3333)])
+        self.assertEqual(report('revenue')['months'],
+                         [{'month': '2030-05', 'bookings': 2, 'participants': 5, 'revenue': 500.0}])
+        lead = report('lead-time')
+        self.assertEqual(lead['bookings'], 2)
+        self.assertEqual(lead['histogram'][-1], {'min_days': 365, 'max_days': None, 'bookings': 2})
+
+        self.assertEqual(report('revenue', '&from=2031-01-01')['months'], [])
+        self.assertEqual(report('load-factor', f'&tour_id={tour_id + 1}')['departures'], [])
+        self.assertEqual(self.client.get('/api/analytics/revenue?from=May', headers=admin_headers).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/nope', headers=admin_headers).status_code, 404)
+        self.assertEqual(self.client.get('/api/analytics/revenue', headers=headers).status_code, 403)
+
+    def test_fleet_utilization_report(self):
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        car_id, bus_id = [
+            self.client.post('/api/vehicles', json={'name': name, 'type': kind}, headers=admin_headers).json['vehicle_id']
+            for name, kind in (('Car', 'car'), ('Bus', 'bus'))
+        ]
+        for vehicle_id, from_date, to_date, status in (
+            (car_id, '2030-05-02', '2030-05-03', 'approved'),
+            (car_id, '2030-05-04', None, 'approved'),  # adjacent: merged with the one above
+            (car_id, '2030-05-10', None, 'approved'),
+            (car_id, '2030-05-06', None, 'pending'),
+            (bus_id, '2030-05-03', '2030-05-05', 'approved'),
+            (bus_id, '2030-04-20', '2030-04-30', 'approved'),  # before the range
+        ):
+            booking_id = self.client.post('/api/vehicle-bookings', json={
+                'vehicle_id': vehicle_id, 'from_date': from_date, 'to_date': to_date, 'from_place': 'A', 'to_place': 'B'
+            }, headers=headers).json['booking_id']
+            if status == 'approved':
+                self.client.patch(f'/api/vehicle-bookings/{booking_id}', json={'status': 'approved'}, headers=admin_headers)
+
+        response = self.client.get('/api/vehicles/utilization?from=2030-05-01&to=2030-05-10', headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        vehicles = {v['vehicle_id']: v for v in response.json['vehicles']}
+        self.assertEqual((vehicles[car_id]['booked_days'], vehicles[car_id]['utilization'], vehicles[car_id]['idle_streaks']),
+                         (4, 0.4, 2))
+        self.assertEqual(vehicles[car_id]['longest_idle_streak'], {'days': 5, 'from': '2030-05-05', 'to': '2030-05-09'})
+        self.assertEqual(vehicles[bus_id]['longest_idle_streak'], {'days': 5, 'from': '2030-05-06', 'to': '2030-05-10'})
+        self.assertEqual(response.json['fleet'], {
+            'vehicles': 2, 'available_days': 20, 'booked_days': 7, 'utilization': 0.35,
+            'peak_concurrent': 2, 'peak_date': '2030-05-03'
+        })
+        self.assertEqual([(t['type'], t['utilization']) for t in response.json['types']], [('bus', 0.3), ('car', 0.4)])
+
+        response = self.client.get('/api/vehicles/utilization?from=2030-05-01&to=2030-05-10&type=bus', headers=admin_headers)
+        self.assertEqual([v['vehicle_id'] for v in response.json['vehicles']], [bus_id])
+        self.assertEqual(self.client.get('/api/vehicles/utilization?from=2030-05-10&to=2030-05-01',
+                                         headers=admin_headers).status_code, 400)
+        self.assertEqual(self.client.get('/api/vehicles/utilization', headers=headers).status_code, 403)
+
+    def test_reports_read_published_snapshot(self):
+        import tempfile
+        import numpy as np
+        from scheduler import run_job
+        from snapshots import get_snapshot
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        tour_id, tour_date_id = self._create_tour(admin_token, available_seats=20, price=100.0)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        def book(participants):
+            self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': participants},
+                             headers=headers)
+
+        def revenue(query=''):
+            response = self.client.get(f'/api/analytics/revenue{query}', headers=admin_headers)
+            self.assertEqual(response.status_code, 200)
+            return response.json['source'], [month['revenue'] for month in response.json['months']]
+
+        book(2)
+        vehicle_id = self.client.post('/api/vehicles', json={'name': 'Van', 'type': 'van'},
+                                      headers=admin_headers).json['vehicle_id']
+        request_id = self.client.post('/api/vehicle-bookings', json={
+            'vehicle_id': vehicle_id, 'from_date': '2030-05-02', 'to_date': '2030-05-04', 'from_place': 'A', 'to_place': 'B'
+        }, headers=headers).json['booking_id']
+        self.client.patch(f'/api/vehicle-bookings/{request_id}', json={'status': 'approved'}, headers=admin_headers)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app.config['SNAPSHOT_DIR'] = tmp_dir
+            try:
+                with app.app_context():
+                    self.assertEqual(run_job('build_snapshots', force=True).status, 'success')
+                    first = get_snapshot()
+                    bookings = first.table('booking')
+                    self.assertIsInstance(bookings['total_price'], np.memmap)
+                    self.assertEqual(bookings.decode('booking_status'), ['pending'])
+                self.assertEqual(revenue(), (first.name, [200.0]))
+                utilization = {
+                    source: self.client.get(f'/api/vehicles/utilization?from=2030-05-01&to=2030-05-10{query}',
+                                            headers=admin_headers).json
+                    for source, query in (('snapshot', ''), ('live', '&live=1'))
+                }
+                self.assertEqual(utilization['snapshot'].pop('source'), first.name)
+                self.assertEqual(utilization['live'].pop('source'), 'live')
+                self.assertEqual(utilization['snapshot'], utilization['live'])
+                self.assertEqual(utilization['snapshot']['fleet']['booked_days'], 3)
+
+                # Reports keep reading the snapshot until the next one is published
+                book(3)
+                self.assertEqual(revenue(), (first.name, [200.0]))
+                self.assertEqual(revenue('?live=1'), ('live', [500.0]))
+                with app.app_context():
+                    run_job('build_snapshots', force=True)
+                    second = get_snapshot()
+                self.assertNotEqual(second.name, first.name)
+                self.assertEqual(revenue(), (second.name, [500.0]))
+                self.assertEqual(open(os.path.join(tmp_dir, 'CURRENT')).read(), second.name)
+
+                # A snapshot already open stays readable after it is pruned
+                with app.app_context():
+                    run_job('build_snapshots', force=True)
+                self.assertFalse(os.path.exists(first.path))
+                self.assertEqual(first.table('vehicle_booking').decode('status'), ['approved'])
+
+                # CURRENT naming a snapshot that is gone falls back to live reads
+                with open(os.path.join(tmp_dir, 'CURRENT'), 'w') as f:
+                    f.write('19700101T000000000000')
+                self.assertEqual(revenue(), ('live', [500.0]))
+            finally:
+                app.config['SNAPSHOT_DIR'] = None
+
+    def test_batch_dispatches_sub_requests_with_one_auth(self):
+        from unittest import mock
+        import jwt
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        tour_id, tour_date_id = self._create_tour(admin_token)
+        token = self._register_and_login()
+
+        with mock.patch('routes.auth_routes.jwt.decode', wraps=jwt.decode) as decode:
+            response = self.client.post('/api/batch', json={'parallel': True, 'requests': [
+                {'id': 'tours', 'path': '/api/tours'},
+                {'id': 'users', 'path': '/api/auth/admin/users'},
+                {'id': 'bookings', 'path': '/api/bookings/admin/bookings'},
+                {'id': 'missing', 'path': '/api/nope'},
+            ]}, headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        results = {r['id']: r for r in response.json['responses']}
+        self.assertEqual([r['id'] for r in response.json['responses']], ['tours', 'users', 'bookings', 'missing'])
+        self.assertEqual([t['id'] for t in results['tours']['body']['tours']], [tour_id])
+        self.assertEqual(results['users']['status'], 200)
+        self.assertEqual(results['missing']['status'], 404)
+
+        # Sub-requests run in order and are authorized one by one
+        response = self.client.post('/api/batch', json={'requests': [
+            {'method': 'POST', 'path': '/api/bookings', 'body': {'tour_date_id': tour_date_id, 'number_of_participants': 2}},
+            {'path': '/api/bookings'},
+            {'path': '/api/auth/admin/users'},
+        ]}, headers={'Authorization': f'Bearer {token}'})
+        created, listed, users = response.json['responses']
+        self.assertEqual(created['status'], 201)
+        self.assertEqual([b['id'] for b in listed['body']['bookings']], [created['body']['booking_id']])
+        self.assertEqual(users['status'], 403)
+        self.assertEqual(self.client.post('/api/batch', json={'requests': [{'path': '/api/tours'}]}).json['responses'][0]['status'], 200)
+
+        # A read after a write in the same batch sees the write, even with
+        # the first read's page cached
+        response = self.client.post('/api/batch', json={'requests': [
+            {'path': '/api/bookings'},
+            {'method': 'POST', 'path': '/api/bookings', 'body': {'tour_date_id': tour_date_id, 'number_of_participants': 1}},
+            {'path': '/api/bookings'},
+        ]}, headers={'Authorization': f'Bearer {token}'})
+        before, created, after = response.json['responses']
+        self.assertEqual(created['status'], 201)
+        self.assertEqual(len(after['body']['bookings']), len(before['body']['bookings']) + 1)
+        # and the batch's writes outlive the batch request
+        with app.app_context():
+            self.assertEqual(Booking.query.count(), 2)
+        self.assertEqual(len(self.client.get('/api/bookings', headers={'Authorization': f'Bearer {token}'}).json['bookings']),
+                         len(after['body']['bookings']))
+
+        for body in ({'requests': []}, {'requests': [{'path': '/api/batch'}]}, {'requests': [{'path': '/api/tours'}] * 21}):
+            self.assertEqual(self.client.post('/api/batch', json=body).status_code, 400)
+
+    def test_booking_event_stream_resumes_per_user(self):
+        from booking_events import EventHub
+        admin_token = self._login('admin@test.com')
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        _, tour_date_id = self._create_tour(admin_token)
+        token = self._register_and_login()
+        headers = {'Authorization': f'Bearer {token}'}
+        other_headers = {'Authorization': f'Bearer {self._register_and_login("other@test.com")}'}
+        vehicle_id = self.client.post('/api/vehicles', json={'name': 'Van', 'type': 'van'},
+                                      headers=admin_headers).json['vehicle_id']
+
+        def stream(request_headers, query='?after=0'):
+            # Closed as a WSGI server would, which frees its stream slot
+            with self.client.get(f'/api/events/stream{query}', headers=request_headers) as response:
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.mimetype, 'text/event-stream')
+                return [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).splitlines()
+                        if line.startswith('data: ')]
+
+        hub = EventHub(app)
+        with app.app_context():
+            hub.refresh()
+        booking_id = self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 1},
+                                      headers=headers).json['booking_id']
+        request_id = self.client.post('/api/vehicle-bookings', json={
+            'vehicle_id': vehicle_id, 'from_date': '2030-05-02', 'from_place': 'A', 'to_place': 'B'
+        }, headers=headers).json['booking_id']
+        self.client.patch(f'/api/vehicle-bookings/{request_id}', json={'status': 'approved'}, headers=admin_headers)
+        self.client.post(f'/api/bookings/{booking_id}/cancel', headers=headers)
+        self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 1},
+                         headers=other_headers)
+
+        events = stream(headers)
+        self.assertEqual([(e['booking_type'], e['booking_id'], e['event'], e['status']) for e in events], [
+            ('tour', booking_id, 'created', 'pending'),
+            ('vehicle', request_id, 'created', 'pending'),
+            ('vehicle', request_id, 'approved', 'approved'),
+            ('tour', booking_id, 'cancelled', 'cancelled'),
+        ])
+        # Reconnecting with the last id seen resumes right after it
+        resumed = stream(dict(headers, **{'Last-Event-ID': str(events[1]['id'])}), '')
+        self.assertEqual([e['id'] for e in resumed], [e['id'] for e in events[2:]])
+        self.assertEqual(len(stream(admin_headers)), 5)
+        self.assertEqual(len(stream({}, f'?after=0&token={token}')), 4)
+        # Without a cursor only new events are sent
+        self.assertEqual(stream(headers, ''), [])
+        self.assertEqual(self.client.get('/api/events/stream').status_code, 401)
+        self.assertEqual(self.client.get('/api/events/stream?after=x', headers=headers).status_code, 400)
+        # Each Flask stream holds a request thread: past the per-process cap
+        # clients are told to come back, and closed streams free their slot
+        from unittest import mock
+        from booking_events import get_hub
+        threaded = get_hub(app)
+        self.assertEqual(threaded.threaded_streams, 0)
+        self.assertTrue(threaded.claim_thread(1))
+        try:
+            with mock.patch.dict(app.config, EVENTS_WSGI_STREAMS=1):
+                response = self.client.get('/api/events/stream', headers=headers)
+            self.assertEqual((response.status_code, response.headers['Retry-After']), (503, '1'))
+        finally:
+            threaded.release_thread()
+        polled = self.client.get('/api/events?after=0', headers=other_headers).json
+        self.assertEqual(([e['event'] for e in polled['events']], polled['cursor']), (['created'], events[-1]['id'] + 1))
+
+        # The hub buffers what it polls and wakes streams waiting past their cursor
+        with app.app_context():
+            hub.refresh()
+        self.assertEqual([e['id'] for e in hub.buffered_after(events[1]['id'])[0]], [e['id'] for e in events[2:]] + [events[-1]['id'] + 1])
+        self.assertTrue(hub.wait(events[-1]['id'], timeout=0))
+        self.assertFalse(hub.wait(hub.last_id, timeout=0))
+
+    def test_sql_instrumentation_flags_n_plus_one(self):
+        admin_token = self._login('admin@test.com')
+        for i in range(3):
+            self.client.post(
+                '/api/destinations',
+                json={'name': f'Destination {i}', 'description': 'A test destination', 'country': 'Test Country'},
+                headers={'Authorization': f'Bearer {admin_token}'}
+            )
+
+        threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        app.config['SQL_N_PLUS_ONE_THRESHOLD'] = 3
+        try:
+            # Each destination lazily loads its tours for tour_count (plus one
+            # query for the image variants)
+            response = self.client.get('/api/destinations/search?q=destination')
+        finally:
+            app.config['SQL_N_PLUS_ONE_THRESHOLD'] = threshold
+        server_timing = response.headers['Server-Timing']
+        self.assertIn('db;dur=', server_timing)
+        self.assertIn('5 queries', server_timing)
+        self.assertIn('n-plus-one', server_timing)
+
+        # Statements that raise leave no timing state on the connection
+        from flask import g
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+        with app.test_request_context():
+            g._sql_stats = {'count': 0, 'time': 0.0, 'patterns': {}}
+            connection = db.session.connection()
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    connection.execute(text('SELECT * FROM no_such_table'))
+            connection.execute(text('SELECT 1'))
+            self.assertEqual(g._sql_stats['count'], 1)
+            self.assertFalse(connection.info.get('_sql_query_start'))
+            db.session.rollback()
+
+        from sql_instrumentation import normalize_statement
+        self.assertEqual(
+            normalize_statement("SELECT * FROM tour WHERE id IN (?, ?, ?) AND name = 'x' LIMIT 5"),
+            'SELECT * FROM tour WHERE id IN (?...) AND name = ? LIMIT ?'
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/tours')
+        self.client.get('/api/tours')
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn(
+            'http_requests_total{blueprint="tour_bp",endpoint="tour_bp.get_tours",method="GET",status="200"}',
+            body
+        )
+        self.assertIn('http_request_duration_seconds_bucket{blueprint="tour_bp",endpoint="tour_bp.get_tours",method="GET",le="+Inf"}', body)
+        self.assertIn('http_requests_in_flight{blueprint="metrics_bp",endpoint="metrics_bp.get_metrics"} 1', body)
+
+    def test_metrics_aggregate_across_processes(self):
+        import tempfile
+        from metrics import MetricsStore, clear_multiproc_dir, mark_process_dead
+
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            # Another (running) worker has flushed its snapshot to the shared directory
+            worker = MetricsStore()
+            worker.configure(multiproc_dir)
+            worker.finish('tour_bp', 'tour_bp.get_tours', 'GET', 200, 0.02)
+            worker.start('tour_bp', 'tour_bp.get_tours')
+            snapshot = worker.snapshot()
+            snapshot['pid'] = os.getppid()
+            with open(os.path.join(multiproc_dir, 'metrics_other.json'), 'w') as f:
+                json.dump(snapshot, f)
+
+            store = MetricsStore()
+            store.configure(multiproc_dir)
+            store.finish('tour_bp', 'tour_bp.get_tours', 'GET', 200, 0.2)
+            requests, latency, in_flight = store.collect()
+            self.assertEqual(requests[('tour_bp', 'tour_bp.get_tours', 'GET', 200)], 2)
+            self.assertEqual(sum(latency[('tour_bp', 'tour_bp.get_tours', 'GET')][:-1]), 2)
+            self.assertEqual(in_flight[('tour_bp', 'tour_bp.get_tours')], 1)
+
+            # Exited workers' files are folded into one, keeping their counts
+            for pid in (999991, 999992):
+                with open(os.path.join(multiproc_dir, f'metrics_{pid}.json'), 'w') as f:
+                    json.dump(dict(snapshot, pid=pid), f)
+                mark_process_dead(pid, multiproc_dir)
+            self.assertEqual(sorted(os.listdir(multiproc_dir)),
+                             sorted(['metrics_exited.json', 'metrics_other.json', f'metrics_{os.getpid()}.json']))
+            requests, _, in_flight = store.collect()
+            self.assertEqual(requests[('tour_bp', 'tour_bp.get_tours', 'GET', 200)], 4)
+            self.assertEqual(in_flight[('tour_bp', 'tour_bp.get_tours')], 1)
+
+            clear_multiproc_dir(multiproc_dir)
+            self.assertEqual(os.listdir(multiproc_dir), [])
+
+    def test_admin_request_profiling(self):
+        import pstats
+        import tempfile
+        import threading
+        from unittest import mock
+
+        admin_token = self._login('admin@test.com')
+        token = self._register_and_login()
+        profile_dir = app.config['PROFILE_DIR']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app.config['PROFILE_DIR'] = tmp_dir
+            try:
+                # Non-admins cannot trigger profiling
+                response = self.client.get('/api/tours', headers={'Authorization': f'Bearer {token}', 'X-Profile': '1'})
+                self.assertNotIn('X-Profile-Id', response.headers)
+
+                response = self.client.get('/api/tours?__profile=cprofile', headers={'Authorization': f'Bearer {admin_token}'})
+                profile_id = response.headers['X-Profile-Id']
+
+                listing = self.client.get('/api/profiles', headers={'Authorization': f'Bearer {admin_token}'}).json
+                self.assertEqual(listing['profiles'][0]['endpoint'], 'tour_bp.get_tours')
+
+                download = self.client.get(f'/api/profiles/{profile_id}?format=pstats',
+                                           headers={'Authorization': f'Bearer {admin_token}'})
+                self.assertEqual(download.status_code, 200)
+                stats_path = os.path.join(tmp_dir, 'download.pstats')
+                with open(stats_path, 'wb') as f:
+                    f.write(download.data)
+                self.assertTrue(pstats.Stats(stats_path).stats)
+
+                collapsed = self.client.get(f'/api/profiles/{profile_id}?format=collapsed',
+                                            headers={'Authorization': f'Bearer {admin_token}'})
+                self.assertIn(b'get_tours', collapsed.data)
+
+                # While another cProfile is running (one per process from
+                # Python 3.12) requests fall back to the stack sampler
+                busy = threading.Lock()
+                busy.acquire()
+                with mock.patch('profiling._cprofile_exclusive', busy):
+                    response = self.client.get('/api/tours?__profile=cprofile',
+                                               headers={'Authorization': f'Bearer {admin_token}'})
+                self.assertEqual(response.status_code, 200)
+                listing = self.client.get('/api/profiles', headers={'Authorization': f'Bearer {admin_token}'}).json
+                self.assertEqual((listing['profiles'][0]['id'], listing['profiles'][0]['mode']),
+                                 (response.headers['X-Profile-Id'], 'sample'))
+            finally:
+                app.config['PROFILE_DIR'] = profile_dir
+
+    def test_slow_query_log_captures_plan(self):
+        from slow_queries import configure_slow_query_log, reset_slow_queries
+        admin_token = self._login('admin@test.com')
+        reset_slow_queries()
+        configure_slow_query_log(threshold_ms=0)
+        try:
+            self.client.get('/api/destinations/search?q=palace')
+        finally:
+            configure_slow_query_log(threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'])
+
+        response = self.client.get('/api/database/slow-queries?limit=100', headers={'Authorization': f'Bearer {admin_token}'})
+        self.assertEqual(response.status_code, 200)
+        search = [q for q in response.json['queries'] if 'GET destination_bp.search_destinations' in q['routes']
+                  and 'FROM destination' in q['statement']]
+        self.assertEqual(len(search), 1)
+        self.assertTrue(search[0]['full_scan'])
+        self.assertTrue(search[0]['plan'][0].startswith('SCAN destination'))
+        self.assertEqual(search[0]['parameters'], ['str', 'str', 'str'])
+
+    def test_apps_are_isolated(self):
+        other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        with other.app_context():
+            db.create_all()
+            self.assertEqual(User.query.count(), 0)
+        with app.app_context():
+            self.assertEqual(User.query.count(), 1)
+
+        # Script apps skip the HTTP layer entirely
+        from app import CLI_CONFIG
+        cli = create_app(dict(CLI_CONFIG, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:'))
+        self.assertEqual(cli.blueprints, {})
+
+    def test_catalog_cache_invalidation(self):
+        from catalog_cache import get_catalog, warm_catalogs
+        admin_token = self._login('admin@test.com')
+        self.assertEqual(self.client.get('/api/tours').json['tours'], [])
+        warm_catalogs(app)
+
+        # Served from the cached body: no catalog query, only the version check
+        response = self.client.get('/api/vehicles')
+        self.assertIn('desc="1 queries"', response.headers['Server-Timing'])
+
+        tour_id, tour_date_id = self._create_tour(admin_token, available_seats=10)
+        tours = self.client.get('/api/tours').json['tours']
+        self.assertEqual([t['id'] for t in tours], [tour_id])
+        self.assertEqual(self.client.get('/api/destinations').json['destinations'][0]['tour_count'], 1)
+
+        # Another worker's cached copy goes stale through the shared version row
+        with app.app_context():
+            stale = get_catalog('tours')
+        token = self._register_and_login()
+        self.client.post('/api/bookings', json={'tour_date_id': tour_date_id, 'number_of_participants': 3},
+                         headers={'Authorization': f'Bearer {token}'})
+        with app.app_context():
+            self.assertNotEqual(get_catalog('tours'), stale)
+        tours = self.client.get('/api/tours').json['tours']
+        self.assertEqual(tours[0]['available_dates'][0]['available_seats'], 7)
+
+    def test_async_mode_matches_sync_api(self):
+        import asyncio
+        import tempfile
+        from unittest import mock
+        import rate_limits
+        from asgi import create_asgi_app
+
+        def call(asgi_app, method, path, query=b'', body=None):
+            messages = []
+            payload = json.dumps(body).encode() if body is not None else b''
+            scope = {
+                'type': 'http', 'method': method, 'path': path, 'query_string': query,
+                'headers': [(b'content-type', b'application/json')] if body is not None else []
+            }
+
+            async def receive():
+                return {'type': 'http.request', 'body': payload}
+
+            async def send(message):
+                messages.append(message)
+
+            asyncio.run(asgi_app(scope, receive, send))
+            data = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+            return messages[0]['status'], json.loads(data)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            asgi_app = create_asgi_app({
+                'TESTING': True,
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_dir}/asgi.db',
+                'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1',
+                'RATE_LIMIT_STORE': None
+            })
+            flask_app = asgi_app.flask_app
+            with flask_app.app_context():
+                db.create_all()
+                seed(flask_app)
+            client = flask_app.test_client()
+            admin_token = client.post('/api/auth/login', json={'email': 'admin@test.com', 'password': 'test123'}).json['token']
+            self.client = client
+            tour_id, _ = self._create_tour(admin_token)
+
+            for path, query in [('/api/tours', b''), ('/api/destinations', b''), ('/api/destinations/search', b'q=test')]:
+                self.assertIn(('GET', path), asgi_app.routes)
+                status, data = call(asgi_app, 'GET', path, query)
+                expected = client.get(f'{path}?{query.decode()}')
+                self.assertEqual((status, data), (expected.status_code, expected.json))
+
+            # Non-async routes are served by the Flask app
+            status, data = call(asgi_app, 'GET', f'/api/tours/{tour_id}')
+            self.assertEqual(status, 200)
+            self.assertEqual(data['tour']['name'], 'Test Tour')
+
+            for body, expected_status in [({'email': 'admin@test.com'}, 200), ({'email': 'nobody@test.com'}, 404), ({}, 400)]:
+                self.assertEqual(call(asgi_app, 'POST', '/api/auth/forgot-password', body=body)[0], expected_status)
+            with flask_app.app_context():
+                from models import OTPToken
+                self.assertEqual(OTPToken.query.count(), 1)
+
+            # The async forgot-password route is rate limited like the Flask one
+            self.assertIn(('POST', '/api/auth/forgot-password'), asgi_app.rate_limited)
+            limits = {'auth': {'rate': 1 / 60, 'burst': 1, 'concurrency': 4}}
+            with mock.patch.dict(flask_app.config, RATE_LIMITS=limits):
+                rate_limits.get_store(flask_app).reset()
+                body = {'email': 'nobody@test.com'}
+                self.assertEqual(call(asgi_app, 'POST', '/api/auth/forgot-password', body=body), (404, {'message': 'Email not found'}))
+                status, data = call(asgi_app, 'POST', '/api/auth/forgot-password', body=body)
+                self.assertEqual((status, data['status']), (429, 'error'))
+                self.assertEqual(rate_limits.get_store(flask_app).in_flight('auth'), 0)
+            asyncio.run(asgi_app.db.dispose())
+            with flask_app.app_context():
+                db.engine.dispose()
+
+    def test_image_upload_derivatives(self):
+        import io
+        import tempfile
+        from PIL import Image
+        admin_token = self._login('admin@test.com')
+        tour_id, _ = self._create_tour(admin_token)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200), (200, 120, 40)).save(buffer, 'PNG')
+        upload = buffer.getvalue()
+        static_folder, image_dir = app.static_folder, app.config['IMAGE_DIR']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app.static_folder, app.config['IMAGE_DIR'] = tmp_dir, os.path.join(tmp_dir, 'images')
+            try:
+                response = self.client.post(
+                    '/api/images',
+                    data={'file': (io.BytesIO(upload), 'tour.png')},
+                    headers={'Authorization': f'Bearer {admin_token}'}
+                )
+                self.assertEqual(response.status_code, 201)
+                image = response.json['image']
+                self.assertEqual((image['width'], image['height']), (1600, 1200))
+
+                image = self.client.get(f'/api/images/{image["id"]}').json['image']
+                self.assertEqual(image['status'], 'ready')
+                self.assertEqual((image['variants']['thumb']['width'], image['variants']['thumb']['height']), (320, 240))
+                self.assertTrue(image['variants']['card']['webp'].endswith('.webp'))
+
+                # The same bytes are not stored twice
+                response = self.client.post(
+                    '/api/images',
+                    data={'file': (io.BytesIO(upload), 'copy.png')},
+                    headers={'Authorization': f'Bearer {admin_token}'}
+                )
+                self.assertEqual((response.status_code, response.json['image']['id']), (200, image['id']))
+
+                # Listings point at the small renditions once the tour uses the image
+                self.client.put(f'/api/tours/{tour_id}', json={'image_url': image['url']},
+                                headers={'Authorization': f'Bearer {admin_token}'})
+                tour = self.client.get('/api/tours').json['tours'][0]
+                self.assertEqual(tour['image_url'], image['url'])
+                self.assertEqual(tour['thumbnail_url'], image['variants']['thumb']['webp'])
+                self.assertEqual(tour['card_url'], image['variants']['card']['webp'])
+
+                response = self.client.get(tour['thumbnail_url'])
+                self.assertEqual(response.mimetype, 'image/webp')
+                self.assertEqual(Image.open(io.BytesIO(response.data)).size, (320, 240))
+                self.assertIn('immutable', response.headers['Cache-Control'])
+                self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+                response.close()
+
+                response = self.client.post(
+                    '/api/images',
+                    data={'file': (io.BytesIO(b'not an image'), 'notes.txt')},
+                    headers={'Authorization': f'Bearer {admin_token}'}
+                )
+                self.assertEqual(response.status_code, 400)
+            finally:
+                app.static_folder, app.config['IMAGE_DIR'] = static_folder, image_dir
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
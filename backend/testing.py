@@ -0,0 +1,136 @@
+import os
+import unittest
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from app import create_app
+from database import db
+
+# Each test process (pytest-xdist worker, or a plain pytest run) gets its own
+# named in-memory database; shared cache lets every connection in the process
+# see it while a keepalive connection holds it open
+WORKER = os.environ.get('PYTEST_XDIST_WORKER', f'pid{os.getpid()}')
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': f'sqlite:///file:pca_test_{WORKER}?mode=memory&cache=shared&uri=true',
+    # A single pbkdf2 round: hashing cost is irrelevant under test
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1',
+    # Worker threads would share the test's connection with the request
+    'IMAGE_BACKGROUND_PROCESSING': False,
+    # Jobs are run explicitly with run_job()
+    'SCHEDULER_ENABLED': False,
+    # Batches run sequentially: worker threads would share the test's connection
+    'BATCH_WORKERS': 1,
+    # Event streams send what is already logged and end, without a poller thread
+    'EVENTS_STREAM_SECONDS': 0,
+    # Reports read the test database; snapshot tests point this at a temp dir
+    'SNAPSHOT_DIR': None,
+    # Tests sign in far more often than any client; the limiter's own test
+    # sets limits. Buckets stay in process memory.
+    'RATE_LIMITS': {},
+    'RATE_LIMIT_STORE': None,
+    # SQLite defaults to one connection per thread for in-memory databases;
+    # the test transaction needs its own connection next to the app's others
+    'SQLALCHEMY_ENGINE_OPTIONS': {
+        'poolclass': QueuePool,
+        'connect_args': {'check_same_thread': False},
+    },
+}
+
+# Engine -> the connection holding the current test's outer transaction
+_outer_connections = {}
+_app = None
+_keepalive = None
+
+
+class TransactionalSessionMixin:
+    """
+    Makes a session join the running test's outer transaction (as a
+    savepoint) when one is open on its engine, so commits made by views are
+    rolled back with the test
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        return _outer_connections.get(engine, engine)
+
+
+def _use_explicit_transactions(engine):
+    # pysqlite only emits BEGIN lazily before DML, which breaks SAVEPOINT
+    # nesting; take over transaction control so the outer rollback undoes
+    # everything. read_uncommitted lets other pooled connections (e.g. cached
+    # row counts) read the test's data instead of hitting shared-cache locks.
+    @event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute('PRAGMA read_uncommitted=1')
+
+    @event.listens_for(engine, 'begin')
+    def _begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+def get_test_app(seed=None):
+    """
+    Build this process's test app once: create the schema, run seed(app) to
+    add data every test starts from, and keep the database open
+    """
+    global _app, _keepalive
+    if _app is not None:
+        return _app
+
+    app = create_app(TEST_CONFIG)
+    # Subclass the app's session class so listeners registered on db.session
+    # (e.g. cached row counts) keep firing
+    session_class = type('TransactionalSession', (TransactionalSessionMixin, db.session.session_factory.class_), {})
+    db.session = db._make_scoped_session({
+        'class_': session_class,
+        'join_transaction_mode': 'create_savepoint',
+    })
+    with app.app_context():
+        _use_explicit_transactions(db.engine)
+        _keepalive = db.engine.connect()
+        db.create_all()
+        if seed is not None:
+            seed(app)
+        db.session.remove()
+    _app = app
+    return app
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Runs each test inside one database transaction that is rolled back
+    afterwards, so tests share a schema built once per process and never
+    see each other's data
+    """
+    app = None
+
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            engine = db.engine
+        self._connection = engine.connect()
+        self._transaction = self._connection.begin()
+        _outer_connections[engine] = self._connection
+        self.addCleanup(self._rollback, engine)
+        self.client = self.app.test_client()
+
+    def _rollback(self, engine):
+        from catalog_cache import reset_catalog_cache
+        from database_stats import reset_cache
+        from user_bookings import reset_bookings_cache
+        from pricing import reset_price_books
+        from analytics import reset_analytics_cache
+        with self.app.app_context():
+            db.session.remove()
+        _outer_connections.pop(engine, None)
+        self._transaction.rollback()
+        self._connection.close()
+        # Cached row counts, catalogs and booking pages may include rows that
+        # no longer exist
+        reset_cache()
+        reset_catalog_cache()
+        reset_bookings_cache()
+        reset_price_books()
+        reset_analytics_cache()
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, func, select, update
+from archival import union_with_archive
+from catalog_cache import catalog_version
+from database import db
+from models import Booking, Destination, Tour, TourDate, User
+
+# Each user's "my bookings" pages are cached per process as ready-to-send JSON
+# bytes. User.bookings_version is bumped in the same transaction as any change
+# to one of the user's bookings, and token_required has already loaded the
+# user row. Pages also show tour, destination and departure details, so a
+# cached page is only fresh while the 'tours' catalog version (bumped by any
+# change to those rows, see catalog_cache.py) is the one it was built at:
+# checking costs one primary-key lookup.
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+_lock = threading.Lock()
+# engine -> OrderedDict[(user_id, page, per_page, include_archived)] =
+#     ((bookings version, tours version), body, etag), in LRU order
+_entries = weakref.WeakKeyDictionary()
+
+
+def bump_bookings_version(*user_ids, connection=None):
+    """
+    Invalidate the users' cached booking pages in every worker. Runs in the
+    caller's transaction; call it after bulk statements that bypass the ORM.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    (connection or db.session.connection()).execute(
+        update(User).where(User.id.in_(user_ids)).values(bookings_version=User.bookings_version + 1)
+    )
+
+
+def build_bookings_page(user_id, page, per_page, include_archived=False):
+    """
+    One page of a user's bookings, newest first, from a single joined query
+    (the total comes along as a window count)
+    """
+    bookings = union_with_archive(Booking, include_archived)
+    rows = db.session.execute(
+        select(
+            bookings.c.id, bookings.c.number_of_participants, bookings.c.total_price,
+            bookings.c.booking_status, bookings.c.payment_status, bookings.c.special_requests,
+            bookings.c.created_at, bookings.c.archived,
+            Tour.id.label('tour_id'), Tour.name.label('tour_name'), Tour.image_url,
+            Destination.name.label('destination_name'), TourDate.departure_date,
+            func.count().over().label('total')
+        )
+        .join(Tour, bookings.c.tour_id == Tour.id)
+        .join(Destination, Tour.destination_id == Destination.id)
+        .join(TourDate, bookings.c.tour_date_id == TourDate.id)
+        .where(bookings.c.user_id == user_id)
+        .order_by(bookings.c.created_at.desc(), bookings.c.id.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    if rows:
+        total = rows[0].total
+    else:
+        # Past the last page the window count has no row to ride on
+        total = db.session.scalar(select(func.count()).select_from(bookings).where(bookings.c.user_id == user_id))
+    return {
+        'status': 'success',
+        'bookings': [{
+            'id': row.id,
+            'tour': {
+                'id': row.tour_id,
+                'name': row.tour_name,
+                'image_url': row.image_url,
+                'destination': row.destination_name
+            },
+            'departure_date': row.departure_date.isoformat(),
+            'number_of_participants': row.number_of_participants,
+            'total_price': row.total_price,
+            'booking_status': row.booking_status,
+            'payment_status': row.payment_status,
+            'special_requests': row.special_requests,
+            'created_at': row.created_at.isoformat(),
+            'archived': bool(row.archived)
+        } for row in rows],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+    }
+
+
+def get_bookings_page(user, page, per_page, include_archived=False):
+    """
+    Return (body, etag) for one page of the user's bookings, rebuilding it
+    only if the user's bookings or the tours they show changed since it was
+    cached
+    """
+    engine = db.engine
+    key = (user.id, page, per_page, include_archived)
+    tours_version = catalog_version('tours')
+    if tours_version is None:
+        # Catalog changes are not tracked, so a cached page could go stale
+        body = current_app.json.response(build_bookings_page(user.id, page, per_page, include_archived)).get_data()
+        return body, hashlib.sha1(body).hexdigest()
+    version = (user.bookings_version or 0, tours_version)
+    with _lock:
+        entries = _entries.setdefault(engine, OrderedDict())
+        entry = entries.get(key)
+        if entry is not None and entry[0] == version:
+            entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    body = current_app.json.response(build_bookings_page(user.id, page, per_page, include_archived)).get_data()
+    etag = hashlib.sha1(body).hexdigest()
+    with _lock:
+        entries = _entries.setdefault(engine, OrderedDict())
+        entries[key] = (version, body, etag)
+        entries.move_to_end(key)
+        while len(entries) > current_app.config.get('USER_BOOKINGS_CACHE_SIZE', 1024):
+            entries.popitem(last=False)
+    return body, etag
+
+
+def reset_bookings_cache():
+    with _lock:
+        _entries.clear()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_changed_bookings(session, flush_context):
+    user_ids = {
+        obj.user_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Booking)
+    }
+    if user_ids:
+        bump_bookings_version(*user_ids, connection=session.connection())
@@ -0,0 +1,203 @@
+from datetime import time, timedelta
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import VehicleBooking, VehicleLock, VehicleSlot
+
+# Approved vehicle bookings are indexed as one VehicleSlot row per vehicle and
+# day they touch, holding the minutes of that day they occupy. A conflict
+# check reads only the (vehicle, day) rows in its range, so several short
+# trips can share a vehicle on the same day and the check stays an index
+# lookup however many bookings accumulate.
+#
+# Writers lock the vehicles they touch (lock_vehicles) before reading the
+# bookings they check, and hold the lock until they commit, so two requests
+# or approvals can never both pass the check for overlapping windows.
+
+DAY_MINUTES = 24 * 60
+# Changes to these fields move a booking in or out of the index
+INDEXED_FIELDS = ('status', 'vehicle_id', 'from_date', 'to_date', 'start_time', 'end_time')
+# Slot rows per INSERT when rebuilding the index
+REBUILD_CHUNK = 10000
+
+
+def parse_time(value):
+    """
+    Parse 'HH:MM' (or 'HH:MM:SS') into a time; empty values mean no time
+    """
+    if not value:
+        return None
+    return time.fromisoformat(str(value)).replace(second=0, microsecond=0)
+
+
+def format_time(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def format_minute(minute):
+    return f'{minute // 60:02d}:{minute % 60:02d}'
+
+
+def _minute(value):
+    return value.hour * 60 + value.minute
+
+
+def booking_windows(from_date, to_date=None, start_time=None, end_time=None):
+    """
+    Return [(day, start_minute, end_minute)] for every day a booking covers:
+    from start_time (or midnight) on its first day to end_time (or the end
+    of the day) on its last
+    """
+    to_date = to_date or from_date
+    windows = []
+    day = from_date
+    while day <= to_date:
+        start = _minute(start_time) if start_time and day == from_date else 0
+        end = _minute(end_time) if end_time and day == to_date else DAY_MINUTES
+        windows.append((day, start, end))
+        day += timedelta(days=1)
+    return windows
+
+
+def validate_schedule(from_date, to_date=None, start_time=None, end_time=None):
+    """
+    Return an error message for an impossible booking window, else None
+    """
+    to_date = to_date or from_date
+    if to_date < from_date:
+        return 'To date cannot be before from date'
+    if to_date == from_date and start_time and end_time and end_time <= start_time:
+        return 'End time must be after start time'
+    return None
+
+
+def load_slots(vehicle_ids, first_day, last_day, exclude_booking_ids=()):
+    """
+    Approved slots of the vehicles between two days (inclusive), as
+    {(vehicle_id, day): [(start_minute, end_minute, booking_id)]}
+    """
+    query = db.session.query(
+        VehicleSlot.vehicle_id, VehicleSlot.day, VehicleSlot.start_minute,
+        VehicleSlot.end_minute, VehicleSlot.booking_id
+    ).filter(
+        VehicleSlot.vehicle_id.in_(set(vehicle_ids)),
+        VehicleSlot.day >= first_day,
+        VehicleSlot.day <= last_day
+    )
+    if exclude_booking_ids:
+        query = query.filter(VehicleSlot.booking_id.notin_(set(exclude_booking_ids)))
+    slots = {}
+    for vehicle_id, day, start, end, booking_id in query:
+        slots.setdefault((vehicle_id, day), []).append((start, end, booking_id))
+    return slots
+
+
+def find_conflict(slots, vehicle_id, windows, booking_id=None):
+    """
+    Return the id of a booking in slots overlapping any of the windows,
+    other than booking_id (the booking being checked)
+    """
+    for day, start, end in windows:
+        for other_start, other_end, other_id in slots.get((vehicle_id, day), ()):
+            if other_id != booking_id and other_start < end and other_end > start:
+                return other_id
+    return None
+
+
+def add_windows(slots, vehicle_id, windows, booking_id):
+    """
+    Make booking_id hold exactly the windows in slots. A booking's slots
+    always match its windows, so windows are also where any old entries are.
+    """
+    remove_booking(slots, vehicle_id, windows, booking_id)
+    for day, start, end in windows:
+        slots.setdefault((vehicle_id, day), []).append((start, end, booking_id))
+
+
+def remove_booking(slots, vehicle_id, windows, booking_id):
+    """
+    Drop booking_id's entries from slots, touching only the days of its
+    windows rather than every list
+    """
+    for day, _, _ in windows:
+        entries = slots.get((vehicle_id, day))
+        if entries:
+            slots[(vehicle_id, day)] = [entry for entry in entries if entry[2] != booking_id]
+
+
+def windows_for(booking):
+    return booking_windows(booking.from_date, booking.to_date, booking.start_time, booking.end_time)
+
+
+def check_availability(vehicle_id, windows, exclude_booking_ids=()):
+    """
+    Return the id of an approved booking of the vehicle overlapping the
+    windows, or None if the vehicle is free
+    """
+    slots = load_slots([vehicle_id], windows[0][0], windows[-1][0], exclude_booking_ids)
+    return find_conflict(slots, vehicle_id, windows)
+
+
+def lock_vehicles(vehicle_ids):
+    """
+    Lock the vehicles for the rest of the transaction. Call before reading
+    what an availability check depends on, and commit soon after.
+    """
+    # An upsert rather than SELECT ... FOR UPDATE, which SQLite lacks: its
+    # write opens the transaction and takes SQLite's write lock, so other
+    # writers wait for the commit. On databases with row locks, taking them
+    # in id order keeps two batches from deadlocking.
+    for vehicle_id in sorted(set(vehicle_ids)):
+        stmt = insert(VehicleLock).values(vehicle_id=vehicle_id, version=1)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['vehicle_id'], set_={'version': VehicleLock.version + 1}
+        ))
+
+
+def sync_booking_slots(booking):
+    """
+    Point the booking's index rows at its current window (none unless approved)
+    """
+    if booking.status != 'approved' or booking.from_date is None:
+        booking.slots = []
+        return
+    booking.slots = [
+        VehicleSlot(vehicle_id=booking.vehicle_id, day=day, start_minute=start, end_minute=end)
+        for day, start, end in windows_for(booking)
+    ]
+
+
+def rebuild_slots():
+    """
+    Recompute the whole index from the vehicle_booking table (backfill/repair)
+    """
+    db.session.query(VehicleSlot).delete()
+    # Plain rows rather than ORM objects: a backfill of a large table would
+    # otherwise load every booking and lazy-load its (empty) slots one by one
+    approved = db.session.execute(
+        select(VehicleBooking.id, VehicleBooking.vehicle_id, VehicleBooking.from_date, VehicleBooking.to_date,
+               VehicleBooking.start_time, VehicleBooking.end_time)
+        .where(VehicleBooking.status == 'approved', VehicleBooking.from_date.isnot(None))
+    ).all()
+    rows = []
+    for booking in approved:
+        for day, start, end in booking_windows(booking.from_date, booking.to_date, booking.start_time, booking.end_time):
+            rows.append({'booking_id': booking.id, 'vehicle_id': booking.vehicle_id, 'day': day,
+                         'start_minute': start, 'end_minute': end})
+        if len(rows) >= REBUILD_CHUNK:
+            db.session.execute(insert(VehicleSlot), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(VehicleSlot), rows)
+    db.session.commit()
+
+
+@event.listens_for(db.session, 'before_flush')
+def _index_changed_bookings(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, VehicleBooking):
+            continue
+        state = inspect(obj)
+        if state.pending or any(state.attrs[name].history.has_changes() for name in INDEXED_FIELDS):
+            with session.no_autoflush:
+                sync_booking_slots(obj)
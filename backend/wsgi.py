@@ -0,0 +1,14 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+With preload_app (see gunicorn.conf.py) this module is imported once in the
+gunicorn master: the read-mostly catalogs are built here, before workers
+fork, so every worker starts warm and shares those pages copy-on-write.
+"""
+from app import create_app
+from catalog_cache import warm_catalogs
+
+application = create_app()
+warm_catalogs(application)
@@ -0,0 +1,23 @@
+import api from './config';
+
+export const batchAPI = {
+  // requests: [{ id, method = 'GET', path: '/api/...', body }]. Resolves to
+  // { responses: [{ id, status, body }] } in the same order; each sub-request
+  // succeeds or fails on its own. parallel lets the server run GETs concurrently.
+  run: (requests, { parallel = false } = {}) => api.post('/batch', { requests, parallel }),
+
+  // The bodies of several GETs keyed by id, in one round trip; rejects with
+  // the first failed sub-response ({ id, status, body })
+  getAll: async (paths) => {
+    const ids = Object.keys(paths);
+    const response = await api.post('/batch', {
+      requests: ids.map((id) => ({ id, path: paths[id] })),
+      parallel: true
+    });
+    const failed = response.data.responses.find((r) => r.status >= 400);
+    if (failed) {
+      throw failed;
+    }
+    return Object.fromEntries(response.data.responses.map((r) => [r.id, r.body]));
+  }
+};
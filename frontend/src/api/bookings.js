@@ -1,10 +1,12 @@
 import api from './config';
 
 export const bookingsAPI = {
-  getUserBookings: () => api.get('/bookings'),
+  getUserBookings: (page = 1, perPage = 20, includeArchived = false) =>
+    api.get('/bookings', { params: { page, per_page: perPage, include_archived: includeArchived ? 1 : undefined } }),
   getBooking: (bookingId) => api.get(`/bookings/${bookingId}`),
   createBooking: (bookingData) => api.post('/bookings', bookingData),
   updateBooking: (bookingId, bookingData) => api.put(`/bookings/${bookingId}`, bookingData),
   cancelBooking: (bookingId) => api.post(`/bookings/${bookingId}/cancel`),
-  getAllBookings: () => api.get('/admin/bookings') // Admin only
+  getAllBookings: () => api.get('/admin/bookings'), // Admin only
+  getBookingSummary: (scope) => api.get('/bookings/admin/summary', { params: { scope } }) // Admin only
 }; 
\ No newline at end of file
@@ -0,0 +1,46 @@
+import api from './config';
+
+// Delay before reopening a stream the server refused (e.g. 503 when it has
+// too many open streams); dropped connections are retried by the browser
+const REOPEN_MS = 30000;
+
+export const eventsAPI = {
+  // Subscribe to booking lifecycle events ({ id, booking_type, booking_id,
+  // event, status, payment_status, created_at }) for the signed-in user, or
+  // for every booking when an admin. The stream resumes after the last event
+  // received, across reconnects. Returns an object; call close() on it to
+  // unsubscribe.
+  subscribe: (onEvent) => {
+    // EventSource cannot send headers, so the token goes in the query string
+    const token = encodeURIComponent(localStorage.getItem('token') || '');
+    let lastId = null;
+    let source = null;
+    let timer = null;
+
+    const open = () => {
+      const after = lastId === null ? '' : `&after=${lastId}`;
+      source = new EventSource(`${api.defaults.baseURL}/events/stream?token=${token}${after}`);
+      source.addEventListener('booking', (message) => {
+        lastId = message.lastEventId || lastId;
+        onEvent(JSON.parse(message.data));
+      });
+      source.onerror = () => {
+        // The browser gives up on an error response; try again later
+        if (source.readyState === EventSource.CLOSED) {
+          timer = setTimeout(open, REOPEN_MS);
+        }
+      };
+    };
+    open();
+
+    return {
+      close: () => {
+        clearTimeout(timer);
+        source.close();
+      }
+    };
+  },
+
+  // Polling fallback: events after the cursor, and the cursor to pass next time
+  getAfter: (after) => api.get('/events', { params: { after } })
+};
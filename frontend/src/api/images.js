@@ -0,0 +1,12 @@
+import api from './config';
+
+export const imagesAPI = {
+  // Returns { image: { id, url, status, variants } }; use image.url as a tour,
+  // destination or vehicle image_url. Resized variants are generated in the background.
+  uploadImage: (file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return api.post('/images', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+  },
+  getImage: (imageId) => api.get(`/images/${imageId}`)
+};
@@ -6,5 +6,7 @@ export const toursAPI = {
   createTour: (tourData) => api.post('/tours', tourData),
   updateTour: (tourId, tourData) => api.put(`/tours/${tourId}`, tourData),
   deleteTour: (tourId) => api.delete(`/tours/${tourId}`),
-  addReview: (tourId, reviewData) => api.post(`/tours/${tourId}/reviews`, reviewData)
+  addReview: (tourId, reviewData) => api.post(`/tours/${tourId}/reviews`, reviewData),
+  // quotes: [{ tour_date_id, participants }], priced in one request
+  getQuotes: (quotes) => api.post('/tours/quotes', { quotes })
 }; 
\ No newline at end of file
@@ -8,7 +8,10 @@ export const vehiclesAPI = {
   deleteVehicle: (vehicleId) => api.delete(`/vehicles/${vehicleId}`),
   getVehicleCalendar: (vehicleId) => api.get(`/vehicles/${vehicleId}/calendar`),
   requestVehicleBooking: (bookingData) => api.post('/vehicle-bookings', bookingData),
-  getAllVehicleBookings: () => api.get('/vehicle-bookings'), // Admin: all, User: own
+  getAllVehicleBookings: (includeArchived = false) =>
+    api.get('/vehicle-bookings', { params: { include_archived: includeArchived ? 1 : undefined } }), // Admin: all, User: own
   updateVehicleBookingStatus: (bookingId, status) => api.patch(`/vehicle-bookings/${bookingId}`, { status }),
   updateVehicleBooking: (bookingId, data) => api.patch(`/vehicle-bookings/${bookingId}`, data), // PATCH arbitrary fields
+  batchUpdateVehicleBookings: (updates) => api.patch('/vehicle-bookings/batch', { updates }), // Admin: [{ id, status }]
+  getFleetUtilization: (from, to, type) => api.get('/vehicles/utilization', { params: { from, to, type } }), // Admin
 }; 
\ No newline at end of file
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { vehiclesAPI } from '../api/vehicles';
+import { imagesAPI } from '../api/images';
 import { toast } from 'react-toastify';
 
 const VehicleManagement = () => {
@@ -31,6 +32,18 @@ const VehicleManagement = () => {
     setForm({ ...form, [e.target.name]: e.target.value });
   };
 
+  const handleImageUpload = async (e) => {
+    const file = e.target.files[0];
+    if (!file) return;
+    try {
+      const res = await imagesAPI.uploadImage(file);
+      setForm({ ...form, image_url: res.data.image.url });
+      toast.success('Image uploaded');
+    } catch (err) {
+      toast.error(err.response?.data?.message || 'Failed to upload image');
+    }
+  };
+
   const handleAdd = () => {
     setEditId(null);
     setForm({ name: '', type: '', description: '', image_url: '' });
@@ -83,7 +96,7 @@ const VehicleManagement = () => {
       <div style={{ display: 'grid', gap: 20 }}>
         {vehicles.map(vehicle => (
           <div key={vehicle.id} style={{ display: 'flex', alignItems: 'center', background: '#fff6f6', borderRadius: 8, padding: 20, boxShadow: '0 1px 4px rgba(0,0,0,0.04)' }}>
-            <img src={vehicle.image_url || 'https://via.placeholder.com/100x70?text=Vehicle'} alt={vehicle.name} style={{ width: 100, height: 70, objectFit: 'cover', borderRadius: 6, marginRight: 20 }} />
+            <img src={vehicle.thumbnail_url || 'https://via.placeholder.com/100x70?text=Vehicle'} alt={vehicle.name} style={{ width: 100, height: 70, objectFit: 'cover', borderRadius: 6, marginRight: 20 }} />
             <div style={{ flex: 1 }}>
               <h3 style={{ margin: 0 }}>{vehicle.name}</h3>
               <div style={{ color: '#888', fontSize: 14 }}>{vehicle.type}</div>
@@ -101,6 +114,7 @@ const VehicleManagement = () => {
             <input name="name" value={form.name} onChange={handleInputChange} placeholder="Vehicle Name" required style={{ padding: 8, borderRadius: 4, border: '1px solid #ccc' }} />
             <input name="type" value={form.type} onChange={handleInputChange} placeholder="Type (Car, Bus, etc.)" required style={{ padding: 8, borderRadius: 4, border: '1px solid #ccc' }} />
             <input name="image_url" value={form.image_url} onChange={handleInputChange} placeholder="Image URL (optional)" style={{ padding: 8, borderRadius: 4, border: '1px solid #ccc' }} />
+            <input type="file" accept="image/jpeg,image/png,image/webp,image/gif" onChange={handleImageUpload} />
             <textarea name="description" value={form.description} onChange={handleInputChange} placeholder="Description" rows={3} style={{ padding: 8, borderRadius: 4, border: '1px solid #ccc' }} />
             <div>
               <button type="submit" style={{ background: '#ff5e5b', color: '#fff', border: 'none', borderRadius: 4, padding: '0.5rem 1.5rem', fontWeight: 600, marginRight: 10 }}>{editId ? 'Update' : 'Add'}</button>
@@ -6,6 +6,7 @@ import '../components/AdminDashboardTabs.css';
 import VehicleManagement from '../components/VehicleManagement';
 import BookingApproval from '../components/BookingApproval';
 import UserList from '../components/UserList';
+import { batchAPI } from '../api/batch';
 
 const AdminDashboardPage = () => {
   const navigate = useNavigate();
@@ -28,35 +29,34 @@ const AdminDashboardPage = () => {
 
   const fetchData = async () => {
     try {
-      const [bookingsRes, destinationsRes, toursRes] = await Promise.all([
-        axios.get('/api/admin/bookings', {
-          headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
-        }),
-        axios.get('/api/destinations'),
-        axios.get('/api/tours')
-      ]);
+      // One round trip, authenticated once, instead of a request per list
+      const { bookings: bookingsData, destinations: destinationsData, tours: toursData } = await batchAPI.getAll({
+        bookings: '/api/bookings/admin/bookings',
+        destinations: '/api/destinations',
+        tours: '/api/tours'
+      });
 
-      setBookings(bookingsRes.data.bookings);
-      setDestinations(destinationsRes.data.destinations);
-      setTours(toursRes.data.tours);
+      setBookings(bookingsData.bookings);
+      setDestinations(destinationsData.destinations);
+      setTours(toursData.tours);
 
       // Calculate stats
-      const totalRevenue = bookingsRes.data.bookings
+      const totalRevenue = bookingsData.bookings
         .filter(b => b.payment_status === 'paid')
         .reduce((sum, b) => sum + b.total_price, 0);
 
       setStats({
-        totalBookings: bookingsRes.data.bookings.length,
+        totalBookings: bookingsData.bookings.length,
         totalRevenue,
-        totalDestinations: destinationsRes.data.destinations.length,
-        totalTours: toursRes.data.tours.length,
-        pendingBookings: bookingsRes.data.bookings.filter(b => b.booking_status === 'pending').length
+        totalDestinations: destinationsData.destinations.length,
+        totalTours: toursData.tours.length,
+        pendingBookings: bookingsData.bookings.filter(b => b.booking_status === 'pending').length
       });
 
       setError(null);
     } catch (err) {
       console.error('Error fetching admin data:', err);
-      if (err.response?.status === 401) {
+      if ((err.response?.status ?? err.status) === 401) {
         localStorage.removeItem('token');
         navigate('/login');
       } else {
@@ -170,7 +170,7 @@ const DestinationsPage = () => {
               height: '200px'
             }}>
               <img
-                src={destination.image_url || `https://source.unsplash.com/400x200/?${destination.name},travel`}
+                src={destination.card_url || `https://source.unsplash.com/400x200/?${destination.name},travel`}
                 alt={destination.name}
                 style={{
                   width: '100%',
@@ -130,7 +130,7 @@ const LandingPage = () => {
           onClick={() => navigate(`/tours/${tour.id}`)}
           >
             <img
-              src={tour.image_url || 'https://source.unsplash.com/300x200/?travel'}
+              src={tour.card_url || 'https://source.unsplash.com/300x200/?travel'}
               alt={tour.name}
               style={{ width: '100%', height: '200px', objectFit: 'cover' }}
             />
@@ -175,7 +175,7 @@ const LandingPage = () => {
           onClick={() => navigate(`/destinations/${dest.id}`)}
           >
             <img
-              src={dest.image_url || `https://source.unsplash.com/400x300/?${dest.name},travel`}
+              src={dest.card_url || `https://source.unsplash.com/400x300/?${dest.name},travel`}
               alt={dest.name}
               style={{
                 width: '100%',
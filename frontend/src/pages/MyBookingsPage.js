@@ -97,7 +97,8 @@ const MyBookingsPage = ({ user }) => {
       const patch = {
         from_date: newFromDate,
         to_date: rescheduleType === 'single' ? newFromDate : newToDate,
-        time: rescheduleType === 'single' ? newTime : null,
+        start_time: rescheduleType === 'single' ? newTime : null,
+        end_time: null,
         status: 'pending'
       };
       await vehiclesAPI.updateVehicleBooking(bookingId, patch);
@@ -310,7 +311,7 @@ const MyBookingsPage = ({ user }) => {
                 {isSingleDay ? (
                   <>
                         <div style={{ color: '#555', fontSize: 15 }}><b>Date:</b> {new Date(booking.from_date).toLocaleDateString()}</div>
-                        <div style={{ color: '#555', fontSize: 15 }}><b>Time:</b> {booking.time || '-'}</div>
+                        <div style={{ color: '#555', fontSize: 15 }}><b>Time:</b> {booking.start_time ? `${booking.start_time}${booking.end_time ? ` - ${booking.end_time}` : ''}` : (booking.time || '-')}</div>
                   </>
                 ) : (
                   <>
@@ -11,11 +11,31 @@ const TourDetailsPage = () => {
   const [selectedDate, setSelectedDate] = useState('');
   const [participants, setParticipants] = useState(1);
   const [isLoggedIn] = useState(!!localStorage.getItem('token'));
+  const [quotes, setQuotes] = useState({});
 
   useEffect(() => {
     fetchTourDetails();
   }, [tourId]);
 
+  useEffect(() => {
+    if (tour && tour.available_dates.length) {
+      fetchQuotes();
+    }
+  }, [tour, participants]);
+
+  // One request prices every departure for the chosen group size
+  const fetchQuotes = async () => {
+    try {
+      const response = await axios.post('/api/tours/quotes', {
+        quotes: tour.available_dates.map(date => ({ tour_date_id: date.id, participants }))
+      });
+      setQuotes(Object.fromEntries(response.data.quotes.map(quote => [quote.tour_date_id, quote])));
+    } catch (err) {
+      console.error('Error fetching price quotes:', err);
+      setQuotes({});
+    }
+  };
+
   const fetchTourDetails = async () => {
     try {
       const response = await axios.get(`/api/tours/${tourId}`);
@@ -250,7 +270,9 @@ const TourDetailsPage = () => {
                 <option key={date.id} value={date.id}>
                   {new Date(date.departure_date).toLocaleDateString()} - 
                   {date.available_seats} seats left - 
-                  ${date.price}
+                  {quotes[date.id]
+                    ? `$${quotes[date.id].total_price} for ${participants}`
+                    : `$${date.price}`}
                 </option>
               ))}
             </select>
@@ -172,7 +172,7 @@ const ToursPage = () => {
             onMouseOut={(e) => e.target.style.transform = 'translateY(0)'}
           >
             <img
-              src={tour.image_url || `https://source.unsplash.com/300x200/?${tour.destination.name},travel`}
+              src={tour.card_url || `https://source.unsplash.com/300x200/?${tour.destination.name},travel`}
               alt={tour.name}
               style={{
                 width: '100%',
@@ -114,6 +114,7 @@ const VehicleListPage = () => {
     if (type === 'single') {
       if (!sel.from) return toast.error('Please select a date.');
       if (!sel.time) return toast.error('Please select a time.');
+      if (sel.endTime && sel.endTime <= sel.time) return toast.error('End time must be after start time.');
     } else {
       if (!sel.from || !sel.to) return toast.error('Please select both From and To dates.');
       if (new Date(sel.from) > new Date(sel.to)) return toast.error('From date cannot be after To date.');
@@ -127,7 +128,8 @@ const VehicleListPage = () => {
         vehicle_id: vehicleId,
         from_date: sel.from,
         to_date: type === 'multi' ? sel.to : sel.from,
-        time: type === 'single' ? sel.time : undefined,
+        start_time: type === 'single' ? sel.time : undefined,
+        end_time: type === 'single' && sel.endTime ? sel.endTime : undefined,
         from_place,
         to_place,
         travel_details: description
@@ -136,8 +138,8 @@ const VehicleListPage = () => {
       setSelected({ ...selected, [vehicleId]: {} });
       setFromTo({ ...fromTo, [vehicleId]: { from_place: '', to_place: '', description: '' } });
       // Refresh calendar and pending (optional, not shown for brevity)
-    } catch {
-      toast.error('Failed to send booking request');
+    } catch (err) {
+      toast.error(err.response?.data?.message || 'Failed to send booking request');
     }
   };
 
@@ -146,6 +148,8 @@ const VehicleListPage = () => {
     const bookings = calendar[vehicleId] || [];
     let dates = [];
     bookings.forEach(b => {
+      // Timed single-day trips leave the rest of the day bookable
+      if (b.from_date === b.to_date && b.start_time) return;
       if (b.from_date && b.to_date) {
         dates = dates.concat(getDatesInRange(b.from_date, b.to_date));
       }
@@ -204,7 +208,7 @@ const VehicleListPage = () => {
               minWidth: 0
             }}>
               <div style={{ display: 'flex', flexDirection: 'column', alignItems: 'center', minWidth: 180 }}>
-                <img src={vehicle.image_url} alt={vehicle.name} style={{ width: 180, height: 120, objectFit: 'cover', borderRadius: 12, flexShrink: 0, marginRight: 24 }} />
+                <img src={vehicle.thumbnail_url || vehicle.image_url} alt={vehicle.name} style={{ width: 180, height: 120, objectFit: 'cover', borderRadius: 12, flexShrink: 0, marginRight: 24 }} />
               </div>
               <div style={{ flex: 1, display: 'flex', flexDirection: 'column', justifyContent: 'center', gap: 10 }}>
                 <div style={{ display: 'flex', alignItems: 'center', gap: 24, marginBottom: 8, flexWrap: 'wrap' }}>
@@ -252,6 +256,13 @@ const VehicleListPage = () => {
                         style={{ padding: '10px', borderRadius: 4, border: '1px solid #ccc', width: 110, fontSize: 15, height: 36, boxSizing: 'border-box' }}
                         placeholder="Time"
                       />
+                      <input
+                        type="time"
+                        value={sel.endTime || ''}
+                        onChange={e => setSelected(prev => ({ ...prev, [vehicle.id]: { ...prev[vehicle.id], endTime: e.target.value } }))}
+                        style={{ padding: '10px', borderRadius: 4, border: '1px solid #ccc', width: 110, fontSize: 15, height: 36, boxSizing: 'border-box' }}
+                        placeholder="Until"
+                      />
                     </>
                   ) : (
                     <>